@@ -1,8 +1,13 @@
 from argparse import ArgumentParser
 from datetime import datetime
-from itertools import product
 from sys import stdout
 from os import mkdir, path
+import sys
+
+# Sweep specs & packed config stores are shared with findr_reduce, in the directory above.
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), path.pardir))
+from findr_sample import SAMPLERS, sample
+from findr_sweep import SHARD_SIZE, generate, read_sweep
 
 # # # # USE INSTRUCTIONS  # # # # # # # # # # # # # # # # # # # # # # # # # # #
 #                                                                             #
@@ -10,6 +15,20 @@ from os import mkdir, path
 # output filename with '-o'.                                                  #
 # i.e. "python ConfigGenerator2.py -i example.cfg -o my_outputs"              #
 #                                                                             #
+# Configs are written to a single packed store (my_outputs.pack), which       #
+# findr_reduce takes in place of a config list. '--layout loose' writes one   #
+# file per config and my_outputs.list instead, in subdirectories of 1000     #
+# configs (my_outputs/000/output_1.cfg, ..., see '--shard-size').             #
+#                                                                             #
+# Configs are generated by a process per core ('--jobs' to limit them).       #
+#                                                                             #
+# CONSTRAINT lines of the configuration file prune invalid combinations of    #
+# parameter values before any config is generated.                            #
+#                                                                             #
+# '--sample' with '--budget N' writes only N configs drawn from the sweep, by #
+# uniform random, Latin hypercube (lhs) or Sobol sampling, reproducibly for a #
+# given '--seed'.                                                             #
+#                                                                             #
 # See example.cfg for an example and more instructions.                       #
 #                                                                             #
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -21,71 +40,57 @@ parser.add_argument('-i', type=str, required=True, help="Input configuration \
                     file (see example.cfg)")
 parser.add_argument('-o', type=str, default='configs', help="Output filename \
                     (default=config)")
+parser.add_argument('--layout', type=str, default='packed', choices=['packed', 'loose'],
+                    help="Write a single packed store (<output>.pack), or one file per config in an <output> directory "
+                         "with an <output>.list (default=packed)")
+parser.add_argument('--jobs', type=int, default=None,
+                    help="Processes generating configs (default=all cores)")
+parser.add_argument('--shard-size', type=int, default=SHARD_SIZE,
+                    help="Configs per subdirectory of a loose layout, 0 for a single directory (default=%d)"
+                         % SHARD_SIZE)
+parser.add_argument('--sample', type=str, default=None, choices=sorted(SAMPLERS.keys()),
+                    help="Draw --budget configs from the sweep by uniform random, Latin hypercube or Sobol sampling, "
+                         "rather than writing every config")
+parser.add_argument('--budget', type=int, default=None,
+                    help="Number of configs to draw with --sample")
+parser.add_argument('--seed', type=int, default=0,
+                    help="Random seed of --sample (default=0)")
 args = parser.parse_args()
+if (args.sample is None) != (args.budget is None):
+    parser.error("--sample and --budget must be given together")
 
-# Read configuration file & build parameter/value items.
-parameters = []
-values = []
-linked_parameters = {}
-linked_values = {}
-
-output_parameter = ''
-output_extension = ''
-with open(args.i, 'U') as cfg:
-    content = cfg.readlines()
-    for i in range(len(content)):
-        line = content[i].strip()
-        # Handle non-comment lines
-        if len(line) > 0 and line[0] != '#':
-            # Handle linked parameters
-            if line[0] == '|':
-                l_parts = map(str.strip, line.lstrip('|').split("=", 1))
-                p_parts = map(str.strip, content[i-1].strip().split("=", 1))
-
-                # iterate move up config file until unlinked field found.
-                j = 1
-                while p_parts[0][0] == '|':
-                    j += 1
-                    p_parts = map(str.strip, content[i-j].strip().split("=", 1))
-
-                # ensure linked/parent properties have same number of elements.
-                if len(eval(l_parts[1])) != len(eval(p_parts[1])):
-                    print("ERROR: Linked property %s has different number of "
-                          "elements than parent %s" % (l_parts[0], p_parts[0]))
-                    exit()
-
-                #
-                if p_parts[0] in linked_parameters:
-                    linked_parameters[p_parts[0]].append(l_parts[0])
-                    linked_values[l_parts[0]] = eval(l_parts[1])
-                else:
-                    linked_parameters[p_parts[0]] = [l_parts[0]]
-                    linked_values[l_parts[0]] = eval(l_parts[1])
+# Read configuration file & build the sweep over parameter/value items.
+try:
+    sweep = read_sweep(args.i)
+except ValueError as e:
+    print("ERROR: %s" % e)
+    exit()
+if sweep.pruned:
+    print("Pruned %s of %s configurations by constraints." % (sweep.pruned, sweep.pruned + len(sweep)))
 
-            # Handle unlinked parameters
-            else:
-                parts = map(str.strip, line.split("=", 1))
-                if parts[0] == 'OUTPUT_PARAMETER':
-                    output_parameter = parts[1]
-                elif parts[0] == 'OUTPUT_EXTENSION':
-                    output_extension = parts[1]
-                else:
-                    parameters.append(parts[0])
-                    values.append(eval(parts[1]))
+# Draw a sample of the sweep, if asked to.
+if args.sample is not None:
+    size = len(sweep)
+    try:
+        sweep = sample(sweep, args.sample, args.budget, args.seed)
+    except ValueError as e:
+        print("ERROR: %s" % e)
+        exit()
+    print("Sampled %s of %s configurations (%s, seed %s)." % (len(sweep), size, args.sample, args.seed))
 
-# Calculate total number of configs to be generated & all value combinations.
-total = reduce(lambda x,y: x*y, map(len, values))
-perm = product(*values)
+# Calculate total number of configs to be generated.
+total = len(sweep)
 
-# Create output directory, if already exists warn and exit.
-if not path.exists(args.o):
-    mkdir(args.o)
-else:
-    print("ERROR: Pre-existing configs directory '%s' identified. Please "
+# Create output directory (or store), if already exists warn and exit.
+output = args.o + ".pack" if args.layout == 'packed' else args.o
+if path.exists(output):
+    print("ERROR: Pre-existing configs %s '%s' identified. Please "
           "rename, move, or select a new output filename before running "
-          "config generator." % args.o)
+          "config generator." % ("store" if args.layout == 'packed' else "directory", output))
     print("Aborting...")
     exit()
+if args.layout == 'loose':
+    mkdir(args.o)
 
 # Write starting message.
 msg = "Writing %s configuration files..." % str(total)
@@ -93,36 +98,23 @@ print(msg)
 
 # Setup progress bar.
 toolbar_width = len(msg) - 2
-mark_width = float(total) / toolbar_width
-marks = [int(i*mark_width) for i in range(toolbar_width)]
+progress = {"marks": 0}
 
 stdout.write("[%s]" % (" " * toolbar_width))
 stdout.flush()
 stdout.write("\b" * (toolbar_width+1)) # return to start of line, after '['
 
-# Write configuration files & log file.
-log = open(args.o + ".list", 'w')
-for n, group in enumerate(perm):
-    # Extend progress bar at intervals.
-    if n in marks:
-        stdout.write("-")
+
+def extend_progress(done):
+    # Extend progress bar to the share of configs generated.
+    marks = toolbar_width * done // max(1, total)
+    if marks > progress["marks"]:
+        stdout.write("-" * (marks - progress["marks"]))
         stdout.flush()
-    # Write config file.
-    f = "output_%s" % (n+1)
-    fname = path.join(args.o, f + ".cfg")
-    log.write("%s %s\n" % (fname, f + output_extension))
-    ofile = open(fname, 'w')
-    for i in range(len(parameters)):
-        ofile.write("%s=%s\n" % (parameters[i], group[i]))
-        if parameters[i] in linked_parameters:
-            for j in range(len(linked_parameters[parameters[i]])):
-                link_param = linked_parameters[parameters[i]][j]
-                link_val = linked_values[link_param][values[i].index(group[i])]
-                ofile.write("%s=%s\n" % (link_param, link_val))
-    # Add expected output file name
-    ofile.write("%s=%s\n" % (output_parameter, f + output_extension))
-    ofile.close()
-log.close()
+        progress["marks"] = marks
+
+# Write configuration files & log file, or the packed store.
+generate(sweep, args.o, args.layout, args.jobs, args.shard_size, progress=extend_progress)
 
 # End progress bar and write total time elapsed.
 stdout.write("\n")
@@ -0,0 +1,199 @@
+from collections import deque
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+import os
+import subprocess
+import tarfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Archive codecs: {codec: (archive extension, default level, maximum level)}.
+CODECS = {"gzip": (".tar.gz", 9, 9),
+          "zstd": (".tar.zst", 3, 22)}
+
+# Uncompressed bytes per independently compressed gzip block.
+GZIP_BLOCK = 1 << 20
+
+
+def archive_extension(codec):
+    """Get the archive extension of a codec (e.g. ".tar.gz")."""
+    return CODECS[codec][0]
+
+
+def default_level(codec):
+    """Get the default compression level of a codec."""
+    return CODECS[codec][1]
+
+
+def check_codec(codec, level=None):
+    """Check a codec and level can be used.
+
+    Args:
+        codec (str): Codec name, "gzip" or "zstd".
+        level (int -or- None, optional): Compression level. Default = None (codec default).
+
+    Returns:
+        str -or- None: Reason the codec cannot be used, or None if it can.
+
+    """
+    if codec not in CODECS:
+        return "unknown codec '%s'" % codec
+    if level is not None and not 1 <= level <= CODECS[codec][2]:
+        return "%s compression level must be between 1 and %s" % (codec, CODECS[codec][2])
+    if codec == "zstd" and zstandard is None:
+        try:
+            with open(os.devnull, 'w') as null:
+                subprocess.call(["zstd", "--version"], stdout=null, stderr=subprocess.STDOUT)
+        except OSError:
+            return "zstd requires the zstandard python module or the zstd command"
+    return None
+
+
+def _gzip_block(data, level):
+    c = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
+
+
+class ParallelGzipWriter(object):
+    """ Multi-threaded gzip stream writer.
+
+    Splits the written stream into GZIP_BLOCK blocks and compresses them concurrently on a thread pool (zlib releases
+    the GIL), each as a complete gzip member, writing members in order. Concatenated members are a valid gzip file,
+    readable by gzip, tarfile and friends, at a slight cost in ratio over a single member.
+
+    Args:
+        fileobj (file): Open binary file to write the compressed stream to.
+        level (int, optional): gzip compression level, 1 (fastest) to 9 (smallest). Default = 9.
+        threads (int, optional): Compression threads. Default = 1.
+
+    """
+    def __init__(self, fileobj, level=9, threads=1):
+        self.fileobj = fileobj
+        self.level = level
+        self.threads = max(1, threads)
+        self._pool = ThreadPool(self.threads) if self.threads > 1 else None
+        self._buffer = []
+        self._buffered = 0
+        self._pending = deque()
+
+    def __repr__(self):
+        return '<ParallelGzipWriter level=%s threads=%s>' % (self.level, self.threads)
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= GZIP_BLOCK:
+            self._submit()
+
+    def _submit(self):
+        data = b"".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        if self._pool is None:
+            self.fileobj.write(_gzip_block(data, self.level))
+            return
+        self._pending.append(self._pool.apply_async(_gzip_block, (data, self.level)))
+        # Bound the blocks in flight, so memory stays flat however large the archive.
+        while len(self._pending) > 2 * self.threads:
+            self.fileobj.write(self._pending.popleft().get())
+
+    def close(self):
+        """Compress any buffered data, and write every outstanding block (the underlying file is left open)."""
+        if self._buffered or not self._pending:
+            self._submit()
+        while self._pending:
+            self.fileobj.write(self._pending.popleft().get())
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+
+
+class ZstdPipeWriter(object):
+    """ zstd stream writer piping through the zstd command, for when the zstandard module is not installed.
+
+    Args:
+        filename (str): Output filename.
+        level (int, optional): zstd compression level, 1 (fastest) to 22 (smallest). Default = 3.
+        threads (int, optional): Compression threads. Default = 1.
+
+    """
+    def __init__(self, filename, level=3, threads=1):
+        self.filename = filename
+        cmd = ["zstd", "-q", "-f", "-%d" % level, "-T%d" % max(1, threads), "-o", filename]
+        if level > 19:
+            cmd.insert(1, "--ultra")
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def __repr__(self):
+        return '<ZstdPipeWriter %s pid=%s>' % (self.filename, self._proc.pid)
+
+    def write(self, data):
+        self._proc.stdin.write(data)
+
+    def close(self):
+        """End the stream, wait for zstd to finish writing the output file, and sync the file to disk."""
+        self._proc.stdin.close()
+        if self._proc.wait() != 0:
+            raise IOError("zstd exited with status %s" % self._proc.returncode)
+        fd = os.open(self.filename, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class ArchiveWriter(object):
+    """ Streaming compressed tar archive.
+
+    Appends files to a tar stream as they are added, compressing on the fly with the chosen codec and threads, so
+    each file is read once (typically still in the page cache) and no uncompressed archive is staged on disk.
+
+    Args:
+        filename (str): Archive filename (see archive_extension()).
+        codec (str, optional): "gzip" or "zstd". Default = "gzip".
+        level (int -or- None, optional): Compression level. Default = None (codec default).
+        threads (int -or- None, optional): Compression threads. Default = None (all cores).
+
+    """
+    def __init__(self, filename, codec="gzip", level=None, threads=None):
+        self.filename = filename
+        self.codec = codec
+        self.level = default_level(codec) if level is None else level
+        self.threads = cpu_count() if threads is None else threads
+        self.members = []
+        self._file = None
+        if codec == "zstd" and zstandard is None:
+            self._stream = ZstdPipeWriter(filename, self.level, self.threads)
+        else:
+            self._file = open(filename, 'wb')
+            if codec == "zstd":
+                compressor = zstandard.ZstdCompressor(level=self.level, threads=self.threads)
+                self._stream = compressor.stream_writer(self._file)
+            else:
+                self._stream = ParallelGzipWriter(self._file, self.level, self.threads)
+        self._tar = tarfile.open(fileobj=self._stream, mode="w|")
+
+    def __repr__(self):
+        return '<ArchiveWriter %s members=%s>' % (self.filename, len(self.members))
+
+    def add(self, name, arcname=None):
+        """Append a file to the archive, as arcname if given."""
+        self._tar.add(name, arcname=arcname)
+        self.members.append(name if arcname is None else arcname)
+
+    def close(self):
+        """Finish the archive: end the tar stream, flush the compressor, and sync the file to disk."""
+        self._tar.close()
+        if self.codec == "zstd" and self._file is not None:
+            self._stream.flush(zstandard.FLUSH_FRAME)
+        else:
+            self._stream.close()
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
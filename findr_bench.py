@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+# The fake work_queue module is installed before any other Findr module imports work_queue.
+import findr_fakewq
+import sys
+sys.modules["work_queue"] = findr_fakewq
+
+from findr_reduce import build_parser, run_options, runFindr, write_message
+
+import argparse
+import json
+import os
+import resource
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+
+# # # # USE INSTRUCTIONS  # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                             #
+# Master throughput benchmark. Runs runFindr against an in-process fake of    #
+# the work_queue API (findr_fakewq.py) and a stub klipReduce, so it needs     #
+# neither cctools nor workers.                                                #
+# i.e. "python findr_bench.py -t 10000 100000 1000000 -n 100"                 #
+#                                                                             #
+# Each task count runs in its own process, and is reported by tasks/second    #
+# dispatched & ingested, master CPU per task and resident memory growth.      #
+#                                                                             #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# Default task counts.
+TASK_COUNTS = [10000, 100000, 1000000]
+
+
+def max_rss():
+    """Get this process's peak resident set size in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def cpu_seconds():
+    """Get this process's user & system CPU seconds (every thread)."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench(tasks, workers=100, task_time=0.0, output_size=2880, options="", keep=False):
+    """ Benchmark the master on a number of tasks.
+
+    Args:
+        tasks (int): Number of tasks (one config each).
+        workers (int, optional): Fake worker slots. Default = 100.
+        task_time (float, optional): Seconds each stub klipReduce task takes. Default = 0.0.
+        output_size (int, optional): Bytes of each stub output. Default = 2880.
+        options (str, optional): findr_reduce options to run with (e.g. "--window 1000 --batch-size 500").
+            Default = "".
+        keep (bool, optional): Keep the scratch directory (the run's logs & batches). Default = False.
+
+    Returns:
+        dict: Tasks, run seconds, tasks/second dispatched & ingested, master CPU per task (milliseconds, excluding the
+            stub's output writes) and peak resident memory before & after the run (MB).
+
+    """
+    findr_fakewq.WORKERS = workers
+    findr_fakewq.TASK_TIME = task_time
+    findr_fakewq.OUTPUT_SIZE = output_size
+
+    scratch = tempfile.mkdtemp(prefix="findr_bench.")
+    cwd = os.getcwd()
+    try:
+        os.chdir(scratch)
+        # Configs are never read by the fake queue, so only the list is written.
+        with open("bench.list", 'w') as l:
+            for i in range(tasks):
+                l.write("configs/bench_%d.cfg bench_%d.fits\n" % (i, i))
+        args = build_parser().parse_args(shlex.split(options) + ["bench.list"])
+        run = run_options(args)
+        run["executor"] = "workqueue"
+        run["port"] = 0
+
+        rss = max_rss()
+        cpu = cpu_seconds()
+        start = time.time()
+        with open("messages.log", 'w') as messages:
+            runFindr(configList="bench.list", logPrefix="bench", logfile=messages, **run)
+        elapsed = time.time() - start
+        cpu = cpu_seconds() - cpu
+    finally:
+        os.chdir(cwd)
+        if keep:
+            write_message("i", "Benchmark of %d tasks kept in %s." % (tasks, scratch))
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    q = findr_fakewq.QUEUES[-1]
+    dispatch = (q.last_submit - start) if q.last_submit else 0
+    ingest = (q.last_return - q.first_return) if q.first_return else 0
+    return {"tasks": tasks, "seconds": elapsed,
+            "dispatched_per_second": q.submitted / dispatch if dispatch > 0 else None,
+            "ingested_per_second": q.returned / ingest if ingest > 0 else None,
+            "cpu_ms_per_task": 1000.0 * (cpu - q.worker_cpu) / max(1, tasks),
+            "rss_start_mb": rss, "rss_peak_mb": max_rss()}
+
+
+def write_bench_report(results, destination=None):
+    """Write a table of benchmark results (see bench())."""
+    lines = ["%10s %10s %14s %14s %12s %10s %10s %10s" % ("Tasks", "Seconds", "Dispatched/s", "Ingested/s",
+                                                          "CPU ms/task", "RSS (MB)", "Peak (MB)", "Growth")]
+    for r in results:
+        lines.append("%10d %10.1f %14s %14s %12.3f %10.1f %10.1f %10.1f"
+                     % (r["tasks"], r["seconds"],
+                        "-" if r["dispatched_per_second"] is None else "%.0f" % r["dispatched_per_second"],
+                        "-" if r["ingested_per_second"] is None else "%.0f" % r["ingested_per_second"],
+                        r["cpu_ms_per_task"], r["rss_start_mb"], r["rss_peak_mb"],
+                        r["rss_peak_mb"] - r["rss_start_mb"]))
+    text = "\n".join(lines) + "\n"
+    if destination is None:
+        print(text)
+    else:
+        destination.write(text)
+    return 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # ... optional argument(s).
+    parser.add_argument("-t", "--tasks", type=int, nargs="+", default=TASK_COUNTS,
+                        help="Task counts to benchmark, each in its own process (default 10000 100000 1000000).")
+    parser.add_argument("-n", "--workers", type=int, default=100, help="Fake worker slots (default 100).")
+    parser.add_argument("--task-time", type=float, default=0.0,
+                        help="Seconds each stub klipReduce task takes (default 0).")
+    parser.add_argument("--output-size", type=int, default=2880,
+                        help="Bytes of each stub klipReduce output (default 2880).")
+    parser.add_argument("-p", "--options", type=str, default="",
+                        help="findr_reduce options to benchmark with (e.g. '--window 1000').")
+    parser.add_argument("--keep", action="store_true", help="Keep each run's logs & batches.")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # A single task count, reported to the parent as JSON.
+        print(json.dumps(bench(args.tasks[0], args.workers, args.task_time, args.output_size, args.options,
+                               args.keep)))
+        exit(0)
+
+    results = []
+    for n in args.tasks:
+        write_message("i", "Benchmarking %d tasks." % n)
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "-t", str(n), "-n", str(args.workers),
+               "--task-time", str(args.task_time), "--output-size", str(args.output_size), "--options=" + args.options]
+        if args.keep:
+            cmd.append("--keep")
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        out = p.communicate()[0]
+        if p.returncode != 0:
+            write_message("e", "Benchmark of %d tasks failed (exit status %s)." % (n, p.returncode))
+            continue
+        result = json.loads(out.strip().splitlines()[-1])
+        results.append(result)
+        if args.json:
+            print(json.dumps(result))
+    if not args.json:
+        write_bench_report(results)
@@ -0,0 +1,160 @@
+from findr_config import SHARED_INPUT_KEYS, read_config
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+# klipReduce config parameters naming a config's output, excluded from cache keys (matched case-insensitively).
+OUTPUT_KEYS = ["outputFile"]
+
+# Read size for content hashing.
+HASH_CHUNK = 1 << 20
+
+
+def file_digest(path):
+    """Get the SHA-1 hex digest of a file's content."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    """ Content-addressed cache of klipReduce outputs.
+
+    Keys each config by a canonical hash of its normalized parameters (sorted, whitespace stripped, output name
+    excluded) and the content of the inputs it references (see findr_config.SHARED_INPUT_KEYS), so the same effective
+    parameter set maps to the same key whatever output name a sweep gave it. Outputs are stored under the cache root as
+    <root>/<key[:2]>/<key>, hard linked where possible.
+
+    Input content digests are remembered in <root>/digests.log by (path, size, modification time), so unchanged
+    inputs (e.g. image directories shared by every point of a sweep) are only hashed once across runs.
+
+    Args:
+        root (str): Cache directory, created if missing.
+        salt (str, optional): Extra text hashed into every key (e.g. the klipReduce path), so results of different
+            programs are kept apart. Default = "".
+        input_keys (list, optional): Config parameters naming inputs. Default = SHARED_INPUT_KEYS.
+        output_keys (list, optional): Config parameters naming outputs. Default = OUTPUT_KEYS.
+
+    """
+    def __init__(self, root, salt="", input_keys=None, output_keys=None):
+        self.root = root
+        self.salt = salt
+        self.input_keys = [k.lower() for k in (SHARED_INPUT_KEYS if input_keys is None else input_keys)]
+        self.output_keys = [k.lower() for k in (OUTPUT_KEYS if output_keys is None else output_keys)]
+        self.hits = 0
+        self.stores = 0
+        self._inputs = {}
+        self._digests = {}
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        self._digest_log = os.path.join(root, "digests.log")
+        if os.path.isfile(self._digest_log):
+            with open(self._digest_log, 'r') as d:
+                for line in d:
+                    fields = line.rstrip("\n").split("\t")
+                    if line.endswith("\n") and len(fields) == 4:
+                        self._digests[(fields[0], fields[1], fields[2])] = fields[3]
+
+    def __repr__(self):
+        return '<ResultCache %s hits=%s stores=%s>' % (self.root, self.hits, self.stores)
+
+    def _file_digest(self, path):
+        st = os.stat(path)
+        sig = (path, str(st.st_size), repr(st.st_mtime))
+        if sig not in self._digests:
+            self._digests[sig] = file_digest(path)
+            with open(self._digest_log, 'a') as d:
+                d.write("%s\t%s\t%s\t%s\n" % (sig + (self._digests[sig],)))
+        return self._digests[sig]
+
+    def input_digest(self, path):
+        """Get the content digest of an input file or directory (every file within, by relative path).
+
+        Returns None for an input missing on the master, which is then keyed by name alone.
+
+        """
+        full = os.path.abspath(path)
+        if full not in self._inputs:
+            if os.path.isfile(full):
+                self._inputs[full] = self._file_digest(full)
+            elif os.path.isdir(full):
+                h = hashlib.sha1()
+                for dirpath, dirnames, filenames in os.walk(full):
+                    dirnames.sort()
+                    for name in sorted(filenames):
+                        f = os.path.join(dirpath, name)
+                        h.update(("%s\t%s\n" % (os.path.relpath(f, full), self._file_digest(f))).encode("utf-8"))
+                self._inputs[full] = h.hexdigest()
+            else:
+                self._inputs[full] = None
+        return self._inputs[full]
+
+    def key(self, cfgf):
+        """Get the cache key of a config.
+
+        Args:
+            cfgf (str): Path to configuration file.
+
+        Returns:
+            str: Hex digest identifying the config's effective parameters and inputs.
+
+        """
+        entries = []
+        for p, v in read_config(cfgf):
+            if v is None or p.lower() in self.output_keys:
+                continue
+            entry = "%s=%s" % (p, " ".join(v.split()))
+            if p.lower() in self.input_keys and v:
+                digest = self.input_digest(v)
+                if digest is not None:
+                    entry += "@" + digest
+            entries.append(entry)
+        h = hashlib.sha1(self.salt.encode("utf-8"))
+        h.update("\n".join(sorted(entries)).encode("utf-8"))
+        return h.hexdigest()
+
+    def path(self, key):
+        """Get the path of a cached output."""
+        return os.path.join(self.root, key[:2], key)
+
+    def fetch(self, key, outf):
+        """Link (or copy) a cached output to outf. Returns True on a hit, False on a miss."""
+        cached = self.path(key)
+        if not os.path.isfile(cached):
+            return False
+        if os.path.lexists(outf):
+            os.remove(outf)
+        try:
+            os.link(cached, outf)
+        except OSError:
+            shutil.copy2(cached, outf)
+        self.hits += 1
+        return True
+
+    def store(self, key, outf):
+        """Store a completed output under its key, atomically, so an interrupted store is never a hit."""
+        cached = self.path(key)
+        if os.path.isfile(cached):
+            return cached
+        if not os.path.isdir(os.path.dirname(cached)):
+            try:
+                os.makedirs(os.path.dirname(cached))
+            except OSError:
+                pass
+        fd, tmp = tempfile.mkstemp(prefix=".%s." % key, dir=os.path.dirname(cached))
+        os.close(fd)
+        os.remove(tmp)
+        try:
+            os.link(outf, tmp)
+        except OSError:
+            shutil.copy2(outf, tmp)
+        os.rename(tmp, cached)
+        self.stores += 1
+        return cached
@@ -0,0 +1,133 @@
+import hashlib
+import os
+
+# klipReduce config parameters naming inputs shared by every point of a sweep (image set, quality, mask & fake files).
+SHARED_INPUT_KEYS = ["directory", "qualityFile", "maskFile", "fakeFileName"]
+
+# klipReduce config parameters driving a task's cost (matched case-insensitively).
+COST_KEYS = ["Nmodes", "includeRefNum", "maxRadius"]
+
+
+def read_config(cfgf):
+    """Read a klipReduce config.
+
+    Args:
+        cfgf (str): Path to configuration file.
+
+    Returns:
+        list: Config lines as (parameter, value) pairs, in file order. Blank & comment lines are kept as (line, None).
+
+    """
+    pairs = []
+    with open(cfgf, 'U') as cfg:
+        for line in cfg:
+            line = line.rstrip("\n")
+            if "=" in line and not line.lstrip().startswith("#"):
+                parts = line.split("=", 1)
+                pairs.append((parts[0].strip(), parts[1].strip()))
+            else:
+                pairs.append((line, None))
+    return pairs
+
+
+def category_key(pairs, keys=None):
+    """Get a config's resource category.
+
+    Args:
+        pairs (list): Config (parameter, value) pairs, as returned by read_config().
+        keys (list, optional): Parameters driving cost, matched case-insensitively. Default = COST_KEYS.
+
+    Returns:
+        str: Category, e.g. "Nmodes=5,10;includeRefNum=100000;maxRadius=-" ("-" for a parameter not in the config).
+
+    """
+    values = dict([(p.lower(), v.replace(" ", "")) for p, v in pairs if v is not None])
+    return ";".join(["%s=%s" % (k, values.get(k.lower(), "-")) for k in (COST_KEYS if keys is None else keys)])
+
+
+def cost_proxy(pairs, keys=None):
+    """Get a config's parametric cost proxy.
+
+    A relative cost for configs with no measured wall times: the product, over cost parameters, of the sum of the
+    numbers in each value (e.g. "Nmodes=5,10,20" contributes 35), with parameters absent or non-numeric contributing 1.
+
+    Args:
+        pairs (list): Config (parameter, value) pairs, as returned by read_config().
+        keys (list, optional): Parameters driving cost, matched case-insensitively. Default = COST_KEYS.
+
+    Returns:
+        float: Relative cost, at least 1.
+
+    """
+    values = dict([(p.lower(), v) for p, v in pairs if v is not None])
+    cost = 1.0
+    for k in (COST_KEYS if keys is None else keys):
+        total = 0.0
+        for part in values.get(k.lower(), "").replace(",", " ").split():
+            try:
+                total += abs(float(part))
+            except ValueError:
+                continue
+        cost *= max(1.0, total)
+    return cost
+
+
+def write_config(pairs):
+    """Format (parameter, value) pairs, as returned by read_config(), back into klipReduce config text."""
+    return "".join(["%s\n" % p if v is None else "%s=%s\n" % (p, v) for p, v in pairs])
+
+
+class SharedInputs(object):
+    """ Shared inputs of klipReduce configs.
+
+    Finds the inputs named by SHARED_INPUT_KEYS parameters of a config (matched case-insensitively) which exist on the
+    master, and maps each to a stable remote name ("<basename>.<hash of absolute path>"), so the same input is
+    transferred to & cached by each worker once per run however many tasks reference it. Mappings are remembered for
+    the life of the object.
+
+    Args:
+        keys (list, optional): Config parameters naming shared inputs, matched case-insensitively.
+            Default = SHARED_INPUT_KEYS.
+
+    """
+    def __init__(self, keys=None):
+        self.keys = [k.lower() for k in (SHARED_INPUT_KEYS if keys is None else keys)]
+        self._remote = {}
+
+    def __repr__(self):
+        return '<SharedInputs inputs=%s>' % len(self._remote)
+
+    def remote_name(self, path):
+        """Get the (remote name, is directory) of a local input, or None if it does not exist on the master."""
+        if path not in self._remote:
+            if os.path.exists(path):
+                full = os.path.abspath(path)
+                digest = hashlib.md5(full.encode("utf-8")).hexdigest()[:12]
+                self._remote[path] = ("%s.%s" % (os.path.basename(full.rstrip(os.sep)), digest), os.path.isdir(full))
+            else:
+                self._remote[path] = None
+        return self._remote[path]
+
+    def localize(self, cfgf):
+        """Localize a config.
+
+        Rewrites a config's shared input parameters to their remote names.
+
+        Args:
+            cfgf (str): Path to configuration file.
+
+        Returns:
+            str: Rewritten config text.
+            list: Shared inputs as (local path, remote name, is directory) tuples.
+
+        """
+        pairs = []
+        inputs = []
+        for p, v in read_config(cfgf):
+            if v is not None and p.lower() in self.keys and v:
+                remote = self.remote_name(v)
+                if remote is not None:
+                    inputs.append((v, remote[0], remote[1]))
+                    v = remote[0]
+            pairs.append((p, v))
+        return write_config(pairs), inputs
@@ -0,0 +1,368 @@
+from collections import deque
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+# WorkQueue is only required by the WorkQueue executor; the local executor runs without cctools.
+try:
+    import work_queue
+except ImportError:
+    work_queue = None
+
+# File direction flags & default port, shared by both executors so task specifications are backend-agnostic.
+if work_queue is not None:
+    INPUT = work_queue.WORK_QUEUE_INPUT
+    OUTPUT = work_queue.WORK_QUEUE_OUTPUT
+    DEFAULT_PORT = work_queue.WORK_QUEUE_DEFAULT_PORT
+else:
+    INPUT = 0
+    OUTPUT = 1
+    DEFAULT_PORT = 9123
+
+
+def now_usecs():
+    """Current time in microseconds since the epoch (the unit WorkQueue uses for task timestamps)."""
+    return int(time.time() * 1000000)
+
+
+class WorkQueueExecutor(object):
+    """ Executor backed by a CCTools WorkQueue master.
+
+    Thin wrapper around work_queue::WorkQueue, exposing the queue interface used by runFindr (submit, wait, cancel,
+    empty, stats, port) plus new_task() for building backend-specific task objects.
+
+    """
+    name = "workqueue"
+    # Source of time for the master's scheduling.
+    clock = time
+
+    def __init__(self, port, logprefix):
+        if work_queue is None:
+            raise ImportError("work_queue module not found, is CCTools installed and on the PYTHONPATH?")
+        self.queue = work_queue.WorkQueue(port)
+        self.queue.specify_log(logprefix + "_wq.log")
+        self.monitoring = self.queue.enable_monitoring(logprefix + "_monitors")
+        # self.queue.specify_password_file()  # TODO: Give workers a password file
+
+    def __repr__(self):
+        return '<WorkQueueExecutor port=%s>' % self.port
+
+    @property
+    def port(self):
+        return self.queue.port
+
+    @property
+    def stats(self):
+        return self.queue.stats
+
+    @staticmethod
+    def new_task(cmd):
+        return work_queue.Task(cmd)
+
+    def submit(self, task):
+        return self.queue.submit(task)
+
+    def wait(self, timeout):
+        return self.queue.wait(timeout)
+
+    def cancel(self, taskid):
+        return self.queue.cancel_by_taskid(taskid)
+
+    def empty(self):
+        return self.queue.empty()
+
+    def shutdown(self):
+        return 1
+
+
+class LocalResources(object):
+    """ Measured resources of a locally executed task.
+
+    Mirrors the fields of work_queue::Task.resources_measured used by write_task_report(). Times are microseconds,
+    memory is MB. Bytes read/written are the sizes of the files staged into and out of the task sandbox.
+
+    """
+    def __init__(self, command):
+        self.command = command
+        self.start = 0
+        self.end = 0
+        self.exit_status = -1
+        self.cpu_time = 0
+        self.wall_time = 0
+        self.cores = 1
+        self.virtual_memory = 0
+        self.swap_memory = 0
+        self.total_processes = 1
+        self.max_concurrent_processes = 1
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+
+class LocalTask(object):
+    """ Task for the local executor.
+
+    Implements the subset of the work_queue::Task interface used by Findr (specify_tag, specify_file, specify_directory,
+    specify_buffer, specify_priority, specify_category, specify_cores, specify_memory, and the id, command, tag,
+    return_status, result, total_bytes_transferred & resources_measured attributes), so tasks can be specified
+    identically for either backend. Cache flags and resource requests are accepted but have no effect locally.
+
+    """
+    def __init__(self, command):
+        self.command = command
+        self.tag = None
+        self.id = None
+        self.return_status = None
+        self.result = None
+        self.priority = 0
+        self.category = None
+        self.cores = None
+        self.memory = None
+        self.hostname = "localhost"
+        self.input_files = []
+        self.input_buffers = []
+        self.output_files = []
+        self.total_bytes_transferred = 0
+        self.resources_measured = LocalResources(command)
+        self._process = None
+        self._cancelled = False
+
+    def __repr__(self):
+        return '<LocalTask id=%s command=%s>' % (self.id, self.command)
+
+    def specify_tag(self, tag):
+        self.tag = tag
+
+    def specify_priority(self, priority):
+        self.priority = priority
+
+    def specify_category(self, category):
+        self.category = category
+
+    def specify_cores(self, cores):
+        self.cores = cores
+
+    def specify_memory(self, memory):
+        self.memory = memory
+
+    def specify_file(self, local_name, remote_name, type=INPUT, cache=False):
+        if type == OUTPUT:
+            self.output_files.append((local_name, remote_name))
+        else:
+            self.input_files.append((local_name, remote_name))
+
+    def specify_directory(self, local_name, remote_name=None, type=INPUT, flags=None, cache=None, recursive=False):
+        self.specify_file(local_name, remote_name or os.path.basename(local_name), type, cache)
+
+    def specify_buffer(self, buffer, remote_name, flags=None, cache=None):
+        self.input_buffers.append((buffer, remote_name))
+
+
+class LocalStats(object):
+    """ Queue statistics for the local executor, mirroring the work_queue::WorkQueue.stats fields used by Findr."""
+    def __init__(self, workers):
+        self.total_workers_connected = workers
+        self.workers_busy = 0
+        self.workers_idle = workers
+        self.total_workers_removed = 0
+        self.tasks_complete = 0
+        self.tasks_running = 0
+        self.tasks_waiting = 0
+        self.total_execute_time = 0
+
+
+class LocalExecutor(object):
+    """ Executor running tasks on this machine.
+
+    A fixed pool of worker threads, each supervising one klipReduce subprocess at a time. Every task runs in its own
+    sandbox directory under <logprefix>_sandbox: inputs are linked in under their remote names, the command is run
+    through the shell (as a WorkQueue worker would), and outputs are moved back to their local names on completion.
+
+    """
+    name = "local"
+    clock = time
+
+    def __init__(self, port, logprefix, workers=None):
+        if workers is None or workers < 1:
+            try:
+                import multiprocessing
+                workers = multiprocessing.cpu_count()
+            except (ImportError, NotImplementedError):
+                workers = 1
+        self.port = 0
+        self.monitoring = True
+        self.workers = workers
+        self.sandbox_root = os.path.abspath(logprefix + "_sandbox")
+        if not os.path.isdir(self.sandbox_root):
+            os.makedirs(self.sandbox_root)
+        self.stats = LocalStats(workers)
+
+        self._next_id = 1
+        self._pending = deque()
+        self._running = {}
+        self._finished = deque()
+        self._closed = False
+        self._lock = threading.Condition()
+        self._threads = []
+        for i in range(workers):
+            th = threading.Thread(target=self._work, name="findr-local-%d" % i)
+            th.daemon = True
+            th.start()
+            self._threads.append(th)
+
+    def __repr__(self):
+        return '<LocalExecutor workers=%s>' % self.workers
+
+    @staticmethod
+    def new_task(cmd):
+        return LocalTask(cmd)
+
+    def submit(self, task):
+        with self._lock:
+            task.id = self._next_id
+            self._next_id += 1
+            # Prioritized tasks (e.g. retries) go to the front of the queue.
+            if task.priority > 0:
+                self._pending.appendleft(task)
+            else:
+                self._pending.append(task)
+            self.stats.tasks_waiting += 1
+            self._lock.notify_all()
+        return task.id
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        with self._lock:
+            while not self._finished:
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._idle():
+                    return None
+                self._lock.wait(remaining)
+            return self._finished.popleft()
+
+    def cancel(self, taskid):
+        """Cancel a waiting or running task, killing its processes. Returns the task, or None if not found."""
+        with self._lock:
+            for task in self._pending:
+                if task.id == taskid:
+                    self._pending.remove(task)
+                    self.stats.tasks_waiting -= 1
+                    self._lock.notify_all()
+                    return task
+            task = self._running.get(taskid)
+            if task is None:
+                return None
+            task._cancelled = True
+            self._kill(task)
+            return task
+
+    def empty(self):
+        with self._lock:
+            return self._idle() and not self._finished
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        for th in self._threads:
+            th.join()
+        # Remove the sandbox root if every task cleaned up after itself.
+        try:
+            os.rmdir(self.sandbox_root)
+        except OSError:
+            pass
+        return 1
+
+    def _idle(self):
+        return not self._pending and not self._running
+
+    @staticmethod
+    def _kill(task):
+        if task._process is not None:
+            try:
+                os.killpg(task._process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._lock.wait()
+                if self._closed:
+                    return
+                task = self._pending.popleft()
+                self._running[task.id] = task
+                self.stats.tasks_waiting -= 1
+                self.stats.tasks_running += 1
+                self.stats.workers_busy += 1
+                self.stats.workers_idle -= 1
+
+            self._execute(task)
+
+            with self._lock:
+                del self._running[task.id]
+                self.stats.tasks_running -= 1
+                self.stats.workers_busy -= 1
+                self.stats.workers_idle += 1
+                self.stats.tasks_complete += 1
+                self.stats.total_execute_time += task.resources_measured.wall_time
+                # Cancelled tasks are dropped, as WorkQueue does.
+                if not task._cancelled:
+                    self._finished.append(task)
+                self._lock.notify_all()
+
+    def _execute(self, task):
+        r = task.resources_measured
+        sandbox = tempfile.mkdtemp(prefix="t%s." % task.id, dir=self.sandbox_root)
+        try:
+            # Stage inputs.
+            for local, remote in task.input_files:
+                os.symlink(os.path.abspath(local), os.path.join(sandbox, remote))
+                r.bytes_read += os.path.getsize(local)
+            for buf, remote in task.input_buffers:
+                with open(os.path.join(sandbox, remote), 'w') as b:
+                    b.write(buf)
+                r.bytes_read += len(buf)
+
+            # Run command, collecting its resource usage from wait4().
+            r.start = now_usecs()
+            p = subprocess.Popen(task.command, shell=True, cwd=sandbox, preexec_fn=os.setsid)
+            with self._lock:
+                task._process = p
+                if task._cancelled:
+                    self._kill(task)
+            pid, status, usage = os.wait4(p.pid, 0)
+            r.end = now_usecs()
+            if os.WIFEXITED(status):
+                p.returncode = os.WEXITSTATUS(status)
+            else:
+                p.returncode = -os.WTERMSIG(status)
+            r.wall_time = r.end - r.start
+            r.cpu_time = int((usage.ru_utime + usage.ru_stime) * 1000000)
+            r.virtual_memory = usage.ru_maxrss // 1024
+            r.exit_status = p.returncode
+            task.return_status = p.returncode
+            task.result = 0
+
+            # Retrieve outputs.
+            for local, remote in ([] if task._cancelled else task.output_files):
+                produced = os.path.join(sandbox, remote)
+                if os.path.exists(produced):
+                    r.bytes_written += os.path.getsize(produced)
+                    shutil.move(produced, local)
+        except (OSError, IOError):
+            task.result = 1
+            if task.return_status is None:
+                task.return_status = -1
+        finally:
+            task.total_bytes_transferred = r.bytes_read + r.bytes_written
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+
+EXECUTORS = {WorkQueueExecutor.name: WorkQueueExecutor,
+             LocalExecutor.name: LocalExecutor}
@@ -0,0 +1,220 @@
+from collections import deque
+
+import heapq
+import time
+
+# # # # USE INSTRUCTIONS  # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                             #
+# In-process fake of the CCTools work_queue module, for benchmarking the      #
+# master without cctools or workers (see findr_bench.py). Install it before   #
+# findr_executors is imported: sys.modules["work_queue"] = findr_fakewq       #
+#                                                                             #
+# Tasks run on a fixed number of fake worker slots as a stub klipReduce:      #
+# each holds its slot for TASK_TIME seconds (real time), then writes every    #
+# output the task declared, OUTPUT_SIZE bytes each.                           #
+#                                                                             #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+WORK_QUEUE_INPUT = 0
+WORK_QUEUE_OUTPUT = 1
+WORK_QUEUE_DEFAULT_PORT = 9123
+
+# Stub klipReduce & fake worker pool settings, set before creating a WorkQueue.
+WORKERS = 100
+TASK_TIME = 0.0
+OUTPUT_SIZE = 2880
+
+# Every WorkQueue created, so their counters can be read after a run.
+QUEUES = []
+
+
+class Resources(object):
+    """ Measured resources of a fake task, with the fields of work_queue::Task.resources_measured used by Findr."""
+    def __init__(self, command):
+        self.command = command
+        self.start = 0
+        self.end = 0
+        self.exit_status = 0
+        self.cpu_time = 0
+        self.wall_time = 0
+        self.cores = 1
+        self.virtual_memory = 0
+        self.swap_memory = 0
+        self.total_processes = 1
+        self.max_concurrent_processes = 1
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+
+class Stats(object):
+    """ Fake work_queue::WorkQueue.stats."""
+    def __init__(self, workers):
+        self.total_workers_connected = workers
+        self.workers_busy = 0
+        self.workers_idle = workers
+        self.total_workers_removed = 0
+        self.tasks_complete = 0
+        self.tasks_running = 0
+        self.tasks_waiting = 0
+        self.total_execute_time = 0
+
+
+class Task(object):
+    """ Fake work_queue::Task."""
+    def __init__(self, command):
+        self.command = command
+        self.tag = None
+        self.id = None
+        self.return_status = None
+        self.result = None
+        self.priority = 0
+        self.hostname = "fake"
+        self.outputs = []
+        self.total_bytes_transferred = 0
+        self.resources_measured = Resources(command)
+
+    def __repr__(self):
+        return '<Task id=%s command=%s>' % (self.id, self.command)
+
+    def specify_tag(self, tag):
+        self.tag = tag
+
+    def specify_priority(self, priority):
+        self.priority = priority
+
+    def specify_category(self, category):
+        pass
+
+    def specify_cores(self, cores):
+        pass
+
+    def specify_memory(self, memory):
+        pass
+
+    def specify_file(self, local_name, remote_name, type=WORK_QUEUE_INPUT, cache=False):
+        if type == WORK_QUEUE_OUTPUT:
+            self.outputs.append(local_name)
+
+    def specify_directory(self, local_name, remote_name=None, type=WORK_QUEUE_INPUT, flags=None, cache=None,
+                          recursive=False):
+        self.specify_file(local_name, remote_name, type, cache)
+
+    def specify_buffer(self, buffer, remote_name, flags=None, cache=None):
+        pass
+
+
+class WorkQueue(object):
+    """ Fake work_queue::WorkQueue.
+
+    Dispatches tasks to WORKERS slots as they are submitted (prioritized tasks first), and returns them from wait()
+    once they have held their slot for TASK_TIME seconds. The CPU time spent writing outputs on behalf of the stub
+    klipReduce is counted in worker_cpu, so it can be told apart from the master's own.
+
+    """
+    def __init__(self, port=WORK_QUEUE_DEFAULT_PORT):
+        self.port = port or WORK_QUEUE_DEFAULT_PORT
+        self.stats = Stats(WORKERS)
+        self.worker_cpu = 0.0
+        self.submitted = 0
+        self.returned = 0
+        self.first_submit = None
+        self.last_submit = None
+        self.first_return = None
+        self.last_return = None
+        self._next_id = 1
+        self._pending = deque()
+        self._running = []
+        self._output = b"\0" * OUTPUT_SIZE
+        QUEUES.append(self)
+
+    def __repr__(self):
+        return '<WorkQueue (fake) workers=%s>' % WORKERS
+
+    def specify_log(self, logfile):
+        pass
+
+    def enable_monitoring(self, dirname=None):
+        return True
+
+    def submit(self, task):
+        task.id = self._next_id
+        self._next_id += 1
+        if task.priority > 0:
+            self._pending.appendleft(task)
+        else:
+            self._pending.append(task)
+        self.stats.tasks_waiting += 1
+        self.submitted += 1
+        self.last_submit = time.time()
+        if self.first_submit is None:
+            self.first_submit = self.last_submit
+        self._dispatch()
+        return task.id
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            now = time.time()
+            if self._running and self._running[0][0] <= now:
+                task = heapq.heappop(self._running)[2]
+                self._complete(task, now)
+                self._dispatch()
+                return task
+            if not self._running or now >= deadline:
+                return None
+            time.sleep(max(0.0, min(deadline, self._running[0][0]) - now))
+
+    def cancel_by_taskid(self, taskid):
+        for task in self._pending:
+            if task.id == taskid:
+                self._pending.remove(task)
+                self.stats.tasks_waiting -= 1
+                return task
+        for i, (due, tid, task) in enumerate(self._running):
+            if tid == taskid:
+                self._running.pop(i)
+                heapq.heapify(self._running)
+                self.stats.tasks_running -= 1
+                self.stats.workers_busy -= 1
+                self.stats.workers_idle += 1
+                self._dispatch()
+                return task
+        return None
+
+    def empty(self):
+        return not self._pending and not self._running
+
+    def _dispatch(self):
+        now = time.time()
+        while self._pending and len(self._running) < WORKERS:
+            task = self._pending.popleft()
+            task.resources_measured.start = int(now * 1000000)
+            heapq.heappush(self._running, (now + TASK_TIME, task.id, task))
+            self.stats.tasks_waiting -= 1
+            self.stats.tasks_running += 1
+            self.stats.workers_busy += 1
+            self.stats.workers_idle -= 1
+
+    def _complete(self, task, now):
+        # The stub klipReduce's work: write the task's outputs.
+        cpu = time.clock()
+        for local in task.outputs:
+            with open(local, 'wb') as o:
+                o.write(self._output)
+        self.worker_cpu += time.clock() - cpu
+        r = task.resources_measured
+        r.end = int(now * 1000000)
+        r.wall_time = r.end - r.start
+        r.bytes_written = OUTPUT_SIZE * len(task.outputs)
+        task.return_status = 0
+        task.result = 0
+        task.total_bytes_transferred = r.bytes_written
+        self.stats.tasks_running -= 1
+        self.stats.workers_busy -= 1
+        self.stats.workers_idle += 1
+        self.stats.tasks_complete += 1
+        self.stats.total_execute_time += r.wall_time
+        self.returned += 1
+        self.last_return = now
+        if self.first_return is None:
+            self.first_return = now
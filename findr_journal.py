@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+# Journal events. Each journal line is "<time>\t<event>\t<output>\t<detail>".
+SUBMITTED = "submitted"   # detail: attempt number
+COMPLETE = "complete"     # detail: task tag
+FAILED = "failed"         # detail: attempt number
+ARCHIVED = "archived"     # detail: archive filename
+
+
+class Journal(object):
+    """ Append-only task state journal.
+
+    Records each task's state transitions (submitted, complete, failed) and archive membership, so a run can be resumed
+    after a crash from a single file. Records are buffered and written with group commits (one write, flush and fsync
+    per commit) every commit_records records or commit_interval seconds, whichever comes first, rather than flushing
+    each line. Thread-safe, so the archiver can record archive membership from its own thread.
+
+    Args:
+        filename (str): Journal path. Appended to if it already exists.
+        commit_records (int, optional): Maximum records buffered before a commit. Default = 1000.
+        commit_interval (float, optional): Maximum seconds between commits while records are arriving. Default = 1.0.
+
+    """
+    def __init__(self, filename, commit_records=1000, commit_interval=1.0):
+        self.filename = filename
+        self.commit_records = commit_records
+        self.commit_interval = commit_interval
+        self._buffer = []
+        self._last_commit = time.time()
+        self._lock = threading.Lock()
+        self._file = open(filename, 'a')
+        # Terminate a partial final line left by a crash mid-commit, so new records start on a line of their own.
+        if self._file.tell() > 0:
+            with open(filename, 'rb') as j:
+                j.seek(-1, os.SEEK_END)
+                if j.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def __repr__(self):
+        return '<Journal %s buffered=%s>' % (self.filename, len(self._buffer))
+
+    def record(self, event, output, detail=""):
+        """Buffer a journal record, committing if the group commit size or interval is reached."""
+        with self._lock:
+            self._buffer.append("%.6f\t%s\t%s\t%s\n" % (time.time(), event, output, detail))
+            if len(self._buffer) >= self.commit_records or time.time() - self._last_commit >= self.commit_interval:
+                self._commit()
+
+    def commit(self):
+        """Write, flush and fsync all buffered records."""
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        """Commit any buffered records and close the journal."""
+        with self._lock:
+            self._commit()
+            self._file.close()
+
+    def _commit(self):
+        self._last_commit = time.time()
+        if not self._buffer:
+            return
+        self._file.write("".join(self._buffer))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer = []
+
+
+class JournalState(object):
+    """ Task state rebuilt from a journal by replay_journal().
+
+    Attributes:
+        complete (set): Outputs of tasks that completed successfully.
+        unarchived (set): Completed outputs not yet recorded in an archive (orphaned if the run crashed).
+        interrupted (set): Outputs of tasks submitted but neither completed nor failed when the journal ended.
+        archives (set): Archive filenames recorded in the journal.
+
+    """
+    def __init__(self):
+        self.complete = set()
+        self.unarchived = set()
+        self.interrupted = set()
+        self.archives = set()
+
+    def __repr__(self):
+        return '<JournalState complete=%s unarchived=%s interrupted=%s>' % (len(self.complete), len(self.unarchived),
+                                                                           len(self.interrupted))
+
+    def next_batch(self, batch_root):
+        """Get the number of the first batch after every recorded <batch_root><n>.tar.* archive."""
+        count = 0
+        for archive in self.archives:
+            name = os.path.basename(archive)
+            if name.startswith(batch_root) and ".tar" in name:
+                try:
+                    count = max(count, int(name[len(batch_root):name.index(".tar")]) + 1)
+                except ValueError:
+                    continue
+        return count
+
+
+def replay_journal(filename):
+    """Replay a journal.
+
+    Rebuilds task state from a journal written by Journal, in a single pass. Memory and time are proportional to the
+    journaled (i.e. submitted) tasks, not the full config list. Partially written lines (e.g. from a crash mid-commit)
+    are ignored.
+
+    Args:
+        filename (str): Journal path.
+
+    Returns:
+        JournalState: Rebuilt task state.
+
+    """
+    state = JournalState()
+    with open(filename, 'r') as j:
+        for line in j:
+            fields = line.rstrip("\n").split("\t")
+            if not line.endswith("\n") or len(fields) != 4:
+                continue
+            event, output, detail = fields[1], fields[2], fields[3]
+            if event == SUBMITTED:
+                state.interrupted.add(output)
+            elif event == COMPLETE:
+                state.interrupted.discard(output)
+                state.complete.add(output)
+                state.unarchived.add(output)
+            elif event == FAILED:
+                state.interrupted.discard(output)
+            elif event == ARCHIVED:
+                state.unarchived.discard(output)
+                state.archives.add(detail)
+    return state
@@ -0,0 +1,151 @@
+from datetime import datetime
+from json.encoder import encode_basestring_ascii
+
+import json
+import threading
+import time
+
+# Message levels, by write_message() message type.
+LEVELS = {"i": "INFO", "info": "INFO", "w": "WARNING", "warning": "WARNING", "e": "ERROR", "error": "ERROR"}
+
+# Event of records of general (non-task) messages.
+MESSAGE_EVENT = "message"
+
+
+def message_level(message_type):
+    """Get the level of a message type ("i"/"info", "w"/"warning", "e"/"error"), or "MESSAGE" if unrecognized."""
+    return LEVELS.get(message_type.lower(), "MESSAGE")
+
+
+def format_message(level, message):
+    """Format a Findr-styled message line (without a newline), e.g. "[Findr] <time> - INFO - <message>"."""
+    return "[Findr] %s - %s - %s" % (datetime.now(), level, message)
+
+
+def json_float(value):
+    """Encode a float as JSON (non-finite floats as null, which JSON has no numbers for)."""
+    return repr(value) if value - value == 0 else "null"
+
+
+# JSON encoders of record field types; other types are encoded with json.dumps(). Encoding the usual field types
+# directly is several times faster than json.dumps() for small records.
+JSON_ENCODERS = {str: encode_basestring_ascii, unicode: encode_basestring_ascii, int: str, long: str,
+                 float: json_float}
+
+
+def json_record(when, level, event, fields):
+    """Encode a record as a JSON line: {"time": <seconds since the epoch>, "level": ..., "event": ..., <fields>}."""
+    return '{"time": %.6f, "level": "%s", "event": "%s"%s}\n' % (
+        when, level, event, "".join([', "%s": %s' % (k, JSON_ENCODERS.get(type(v), json.dumps)(v))
+                                     for k, v in fields.items()]))
+
+
+class Logger(object):
+    """ Buffered structured message log.
+
+    Every message is recorded as a JSON-lines record ({"time", "level", "event", ...}) in a buffer, written every
+    buffer_size records or on flush(), rather than formatted and written line by line. General messages are also
+    written as Findr-styled lines to the console as they happen (as write_message() does), but per-task events (see
+    task()) are only counted, and reported by a periodic summary(), unless task_lines is set. Per-task warnings are
+    always written. Errors flush the records immediately, as they are usually followed by an exit. Thread-safe, so the
+    archiver can log from its own thread.
+
+    Args:
+        destination (file -or- None, optional): Open file to write console lines to, or None for stdout.
+            Default = None.
+        records (str -or- None, optional): JSON-lines records path, appended to if it already exists, or None to keep
+            no records. Default = None.
+        task_lines (bool, optional): Also write a console line for every per-task INFO event. Default = False.
+        buffer_size (int, optional): Maximum records buffered before they are written. Default = 1000.
+
+    """
+    def __init__(self, destination=None, records=None, task_lines=False, buffer_size=1000):
+        self.destination = destination
+        self.records = records
+        self.task_lines = task_lines
+        self.buffer_size = buffer_size
+        self.counts = {}
+        self._buffer = []
+        self._last_summary = time.time()
+        self._lock = threading.Lock()
+        self._file = open(records, 'a') if records is not None else None
+
+    def __repr__(self):
+        return '<Logger %s buffered=%s>' % (self.records, len(self._buffer))
+
+    def message(self, message_type, message):
+        """Write & record a general message (see write_message()). Returns 1."""
+        level = message_level(message_type)
+        with self._lock:
+            self._write(level, message)
+            self._record((time.time(), level, MESSAGE_EVENT, {"message": str(message)}))
+            if level == "ERROR":
+                self._flush()
+        return 1
+
+    def task(self, message_type, event, text, **fields):
+        """Record a per-task event.
+
+        Args:
+            message_type (str): Type of message - "i"/"info", "w"/"warning", "e"/"error".
+            event (str): Event name (e.g. "complete"), counted for summary().
+            text (str): Console line, a %-format string over fields, only formatted if the line is written.
+            **fields: Record fields (e.g. task=<id>, output=<expected output>).
+
+        Returns:
+            int: Always returns 1.
+
+        """
+        level = message_level(message_type)
+        with self._lock:
+            self.counts[event] = self.counts.get(event, 0) + 1
+            if level != "INFO" or self.task_lines:
+                self._write(level, text % fields)
+            self._record((time.time(), level, event, fields))
+        return 1
+
+    def summary(self):
+        """Write a console line summarizing the per-task events since the last summary, if there were any. Returns 1."""
+        with self._lock:
+            now = time.time()
+            if self.counts:
+                self._write("INFO", "Task events in the last %.0fs: %s." % (now - self._last_summary, ", ".join(
+                    ["%s(%d)" % (e, n) for e, n in sorted(self.counts.items())])))
+                self.counts = {}
+            self._last_summary = now
+        return 1
+
+    def flush(self):
+        """Write all buffered records."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Write a final summary & all buffered records, and close the records file."""
+        self.summary()
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, level, message):
+        s = format_message(level, message)
+        if self.destination is None:
+            print(s)
+        else:
+            self.destination.write(s + "\n")
+
+    def _record(self, record):
+        if self._file is None:
+            return
+        self._buffer.append(record)
+        if len(self._buffer) >= self.buffer_size:
+            self._flush()
+
+    def _flush(self):
+        if self._file is None or not self._buffer:
+            return
+        self._file.write("".join([json_record(*r) for r in self._buffer]))
+        self._file.flush()
+        self._buffer = []
@@ -0,0 +1,146 @@
+from collections import deque
+from findr_usage import WallTimeHistogram
+
+import BaseHTTPServer
+import json
+import os
+import threading
+import time
+
+# Seconds of completions used to compute the completion rate.
+RATE_WINDOW = 300.0
+
+
+class Metrics(object):
+    """ Live run metrics.
+
+    Accumulates task throughput & wall time statistics incrementally as tasks return (constant work per task, memory
+    bounded by the rate window and histogram size), and combines them with queue stats into a snapshot for reporting.
+    Wall time quantiles come from a findr_usage.WallTimeHistogram.
+
+    Args:
+        total (int -or- None, optional): Total configs in the run, for the ETA. Default = None (unknown).
+        done (int, optional): Configs already complete when the run started (e.g. resumed). Default = 0.
+        clock (module -or- object, optional): Source of time, with a time() function. Default = time (wall-clock).
+
+    """
+    def __init__(self, total=None, done=0, clock=time):
+        self.clock = clock
+        self.start = clock.time()
+        self.total = total
+        self.done = done
+        self.done_this_run = 0
+        self.failed = 0
+        self.tasks = 0
+        self.wall_times = WallTimeHistogram()
+        self.bytes_transferred = 0
+        self._completions = deque()
+        self._snapshot = {}
+
+    def __repr__(self):
+        return '<Metrics done=%s failed=%s>' % (self.done, self.failed)
+
+    def add_task(self, task):
+        """Add a returned task, counting its transferred bytes."""
+        self.tasks += 1
+        self.bytes_transferred += getattr(task, "total_bytes_transferred", 0) or 0
+
+    def add_wall_time(self, wall_time):
+        """Add a measured config wall time in microseconds (ignored if unmeasured)."""
+        self.wall_times.add(wall_time)
+
+    def add_complete(self, count=1):
+        """Add completed configs."""
+        now = self.clock.time()
+        self.done += count
+        self.done_this_run += count
+        for i in range(count):
+            self._completions.append(now)
+
+    def add_failed(self, count=1):
+        """Add failed config attempts."""
+        self.failed += count
+
+    def rate(self):
+        """Get configs completed per minute, over the last RATE_WINDOW seconds (or the run so far, if shorter)."""
+        now = self.clock.time()
+        while self._completions and self._completions[0] < now - RATE_WINDOW:
+            self._completions.popleft()
+        window = min(RATE_WINDOW, now - self.start)
+        if window <= 0:
+            return 0.0
+        return len(self._completions) * 60.0 / window
+
+    def update(self, queue):
+        """Rebuild the snapshot from these metrics and the queue's stats. Returns the snapshot."""
+        s = queue.stats
+        rate = self.rate()
+        eta = None
+        if self.total is not None and rate > 0:
+            eta = max(0, self.total - self.done) * 60.0 / rate
+        self._snapshot = {
+            "time": self.clock.time(),
+            "elapsed": self.clock.time() - self.start,
+            "workers": {"connected": s.total_workers_connected, "busy": s.workers_busy, "idle": s.workers_idle,
+                        "lost": s.total_workers_removed},
+            "tasks": {"waiting": s.tasks_waiting, "running": s.tasks_running, "returned": self.tasks,
+                      "done": self.done, "failed": self.failed, "total": self.total},
+            "completions_per_minute": rate,
+            "wall_time": {"mean": self.wall_times.mean(), "p95": self.wall_times.quantile(0.95)},
+            "bytes_transferred": self.bytes_transferred,
+            "eta_seconds": eta,
+        }
+        return self._snapshot
+
+    def snapshot(self):
+        """Get the latest snapshot (safe to call from other threads)."""
+        return self._snapshot
+
+
+def write_metrics_file(filename, snapshot):
+    """Atomically rewrite a JSON metrics file, so readers never see a partial file."""
+    tmp = filename + ".tmp"
+    with open(tmp, 'w') as m:
+        json.dump(snapshot, m, indent=2, sort_keys=True)
+    os.rename(tmp, filename)
+    return 1
+
+
+class MetricsServer(threading.Thread):
+    """ Local HTTP metrics endpoint.
+
+    Serves the latest Metrics snapshot as JSON on every GET, from a background thread. Binds to localhost only.
+
+    Args:
+        metrics (Metrics): Metrics to serve.
+        port (int): Port to listen on.
+
+    """
+    def __init__(self, metrics, port):
+        threading.Thread.__init__(self, name="findr-metrics")
+        self.daemon = True
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(metrics.snapshot(), indent=2, sort_keys=True)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", port), Handler)
+        self.port = self.server.server_address[1]
+
+    def __repr__(self):
+        return '<MetricsServer port=%s>' % self.port
+
+    def run(self):
+        self.server.serve_forever()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
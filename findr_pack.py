@@ -0,0 +1,163 @@
+import os
+import shutil
+import struct
+import tempfile
+
+# # # # PACKED CONFIG STORE # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                             #
+# A packed store holds every config of a sweep in one file, instead of one    #
+# .cfg file per sweep point:                                                  #
+#                                                                             #
+#   PACK_MAGIC                                                                #
+#   entry 0, entry 1, ...   each "<config name> <expected output>\n<config>"  #
+#   index                   count + 1 little-endian uint64 entry offsets      #
+#   footer                  index offset & entry count, little-endian uint64  #
+#                                                                             #
+# so entry i is read with two seeks, without reading the rest of the store.   #
+#                                                                             #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+PACK_MAGIC = b"FINDRPACK1\n"
+FOOTER = struct.Struct("<QQ")
+OFFSET = struct.Struct("<Q")
+
+# Offsets read (or written) per index chunk when iterating (or adding blocks to) a store.
+INDEX_CHUNK = 65536
+
+
+def is_pack(filename):
+    """Check whether a file is a packed config store (rather than a config list)."""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(PACK_MAGIC)) == PACK_MAGIC
+    except (IOError, OSError):
+        return False
+
+
+class PackWriter(object):
+    """ Writer of a packed config store.
+
+    Entry offsets are spooled to a temporary file as entries are added, and appended as the index on close(), so
+    memory use does not grow with the number of configs.
+
+    Args:
+        filename (str): Store path, overwritten if it exists.
+
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.count = 0
+        self._file = open(filename, 'wb')
+        self._file.write(PACK_MAGIC)
+        self._index = tempfile.TemporaryFile(prefix="findr_pack.")
+        self._index.write(OFFSET.pack(len(PACK_MAGIC)))
+
+    def __repr__(self):
+        return '<PackWriter %s entries=%s>' % (self.filename, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, name, output, text):
+        """Add a config.
+
+        Args:
+            name (str): Config file name (e.g. "output_1.cfg"), used when the config is materialized.
+            output (str): Expected output of the config.
+            text (str): Config file contents.
+
+        """
+        self._file.write("%s %s\n%s" % (name, output, text))
+        self._index.write(OFFSET.pack(self._file.tell()))
+        self.count += 1
+
+    def add_block(self, data, sizes):
+        """Add consecutive entries already rendered as "<name> <output>\\n<config>" and joined into data.
+
+        Args:
+            data (str): Joined entries.
+            sizes (list): Length of each entry in data.
+
+        """
+        offset = self._file.tell()
+        self._file.write(data)
+        for i in range(0, len(sizes), INDEX_CHUNK):
+            ends = []
+            for size in sizes[i:i + INDEX_CHUNK]:
+                offset += size
+                ends.append(offset)
+            self._index.write(struct.pack("<%dQ" % len(ends), *ends))
+        self.count += len(sizes)
+
+    def close(self):
+        """Write the index & footer, and close the store. Returns the number of configs."""
+        index = self._file.tell()
+        self._index.seek(0)
+        shutil.copyfileobj(self._index, self._file)
+        self._index.close()
+        self._file.write(FOOTER.pack(index, self.count))
+        self._file.close()
+        return self.count
+
+
+class PackedConfigs(object):
+    """ Reader of a packed config store, by index or in order.
+
+    Args:
+        filename (str): Store path.
+
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        if self._file.read(len(PACK_MAGIC)) != PACK_MAGIC:
+            raise ValueError("%s is not a packed config store" % filename)
+        self._file.seek(-FOOTER.size, os.SEEK_END)
+        self.index, self.count = FOOTER.unpack(self._file.read(FOOTER.size))
+
+    def __repr__(self):
+        return '<PackedConfigs %s entries=%s>' % (self.filename, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        """Get entry i as (config name, expected output, config text)."""
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("config index %s out of range" % i)
+        self._file.seek(self.index + i * OFFSET.size)
+        start, end = struct.unpack("<QQ", self._file.read(2 * OFFSET.size))
+        self._file.seek(start)
+        return self._entry(self._file.read(end - start))
+
+    def __iter__(self):
+        """Iterate over entries in order, reading the index a chunk at a time (entries may be read by index between
+        steps)."""
+        for first in range(0, self.count, INDEX_CHUNK):
+            n = min(INDEX_CHUNK, self.count - first)
+            self._file.seek(self.index + first * OFFSET.size)
+            offsets = struct.unpack("<%dQ" % (n + 1), self._file.read((n + 1) * OFFSET.size))
+            for k in range(n):
+                self._file.seek(offsets[k])
+                yield self._entry(self._file.read(offsets[k + 1] - offsets[k]))
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def _entry(data):
+        header, text = data.split("\n", 1)
+        name, output = header.split(" ", 1)
+        return name, output, text
+
+
+def materialize(name, text, directory):
+    """Write a config of a packed store to a file in directory (created if needed). Returns the file path."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, name)
+    with open(path, 'w') as cfg:
+        cfg.write(text)
+    return path
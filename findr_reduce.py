@@ -2,12 +2,64 @@
 # CCTOOLS_PYTHON_VERSION 2.7 2.6
 
 from datetime import datetime
-from work_queue import *
-
+from findr_archive import CODECS, ArchiveWriter, archive_extension, check_codec
+from findr_cache import ResultCache
+from findr_config import SharedInputs, category_key, cost_proxy, read_config
+from findr_executors import DEFAULT_PORT, EXECUTORS, INPUT, OUTPUT
+from findr_journal import ARCHIVED, COMPLETE, FAILED, SUBMITTED, Journal, replay_journal
+from findr_log import Logger, format_message, message_level
+from findr_metrics import Metrics, MetricsServer, write_metrics_file
+from findr_pack import materialize
+from findr_sweep import count_entries, sweep_entries
+from findr_shard import (MergedMetrics, shard_arguments, shard_list, shard_metrics, shard_prefix,
+                         split_config_list)
+from findr_usage import BUNDLE_MARKER, CostModel, ResourceModel, WallTimeHistogram, WallTimeStats, read_wall_times
+from findr_worker import VALIDATION_FAILED
+
+import Queue
 import argparse
+import heapq
+import itertools
+import math
 import os
 import socket
+import subprocess
+import sys
 import tarfile
+import threading
+import time
+
+
+# Automatic submission window: AUTO_WINDOW_FACTOR tasks per connected worker, never fewer than AUTO_WINDOW_MIN.
+AUTO_WINDOW_MIN = 100
+AUTO_WINDOW_FACTOR = 2
+
+# Automatic bundling: aim for bundles running about BUNDLE_TARGET_SECONDS, of at most BUNDLE_MAX configs.
+BUNDLE_TARGET_SECONDS = 60.0
+BUNDLE_MAX = 100
+
+# Master loop schedule: seconds between submission top-ups and between text log flushes.
+TOP_UP_INTERVAL = 1.0
+LOG_FLUSH_INTERVAL = 5.0
+
+# Speculative re-execution: seconds between straggler checks, and wall times measured before a distribution is used.
+SPECULATE_INTERVAL = 5.0
+SPECULATE_MIN_SAMPLES = 10
+
+# Suffix of the local output of a speculative duplicate, renamed to the expected output if the duplicate wins.
+SPECULATIVE_SUFFIX = ".speculative"
+
+# Submission orders: as listed in the config list, longest predicted first, or round-robin over resource categories.
+ORDER_POLICIES = ["listed", "longest", "round-robin"]
+
+# Configs read & ordered at a time by a non-listed submission order when submitting through a window.
+ORDER_LOOKAHEAD = 10000
+
+# Worker-side bundle driver, shipped to workers with each bundle task.
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "findr_worker.py")
+
+# Start time for status reports, reset when run as a script.
+stime = datetime.now()
 
 
 def write_message(message_type, message, destination=None):
@@ -20,21 +72,18 @@ def write_message(message_type, message, destination=None):
     Args:
         message_type (str): Type of message - "i"/"info", "w"/"warning", "e"/"error".
         message (str): Text to accompany message.
-        destination (file -or- None, optional): Open file to write messages. Default = None (write to stdout).
+        destination (file -or- findr_log.Logger -or- None, optional): Open file to write messages, or a Logger to write
+            & record them. Default = None (write to stdout).
 
     Returns:
         int: Always returns 1.
 
     """
+    if isinstance(destination, Logger):
+        return destination.message(message_type, message)
+
     # Set message.
-    if message_type.lower() == "e" or message_type.lower() == "error":
-        s = "[Findr] %s - ERROR - %s" % (datetime.now(), message)
-    elif message_type.lower() == "w" or message_type.lower() == "warning":
-        s = "[Findr] %s - WARNING - %s" % (datetime.now(), message)
-    elif message_type.lower() == "i" or message_type.lower() == "info":
-        s = "[Findr] %s - INFO - %s" % (datetime.now(), message)
-    else:
-        s = "[Findr] %s - MESSAGE - %s" % (datetime.now(), message)
+    s = format_message(message_level(message_type), message)
 
     # Write to destination.
     if destination is None:
@@ -49,15 +98,18 @@ def get_ip():
     """Get IP address.
 
     Opens a socket to 8.8.8.8 to obtains a best-guess IP address for the machine. Sometimes returns a local IP, so care
-    should be taken.
+    should be taken. Falls back to the loopback address on machines without a network route.
 
     Returns:
         str: Best-guess IP address for the machine
 
     """
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.connect(("8.8.8.8", 80))
-    ip = s.getsockname()[0]
+    try:
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+    except socket.error:
+        ip = "127.0.0.1"
     s.close()
     return ip
 
@@ -84,32 +136,181 @@ def print_info(port, ip):
     return 1
 
 
-def compress_remove(filelist, targzname, logfile):
+def compress_remove(filelist, targzname, logfile, compresslevel=9, journal=None, codec="gzip", threads=None):
     """Compress file list, remove uncompressed versions.
 
     Compresses all files named in a list (filelist) to a tarball (targzname). Writes any warnings using write_message().
+    If a journal is given, archive membership is committed to it before any uncompressed file is removed.
 
     Args:
         filelist (list): List of filenames/paths to compress
-        targzname (str): Name of tarball to output. Should always end in ".tar.gz".
+        targzname (str): Name of tarball to output. Should end in the codec's extension (".tar.gz" or ".tar.zst").
         logfile (str -or- None): Open log file for write_message(), or None for stdout.
+        compresslevel (int -or- None, optional): Compression level, 1 (fastest) to 9 (smallest) for gzip or 22 for
+            zstd. Default = 9.
+        journal (findr_journal.Journal -or- None, optional): Task state journal. Default = None.
+        codec (str, optional): Compression codec, "gzip" or "zstd". Default = "gzip".
+        threads (int -or- None, optional): Compression threads. Default = None (all cores).
 
     Returns:
         str: Output tarball filename.
 
     """
     # Compress files.
-    tar = tarfile.open(targzname, "w:gz")
+    archive = ArchiveWriter(targzname, codec, compresslevel, threads)
     for f in filelist:
-        tar.add(f)
-    tar.close()
+        archive.add(f)
+    archive.close()
+    remove_archived(filelist, targzname, logfile, journal)
+    return targzname
+
+
+def remove_archived(filelist, targzname, logfile, journal=None, paths=None):
+    """Record archive membership in the journal (if given), then remove the archived files (from paths, if given)."""
+    # Record archive membership.
+    if journal is not None:
+        for f in filelist:
+            journal.record(ARCHIVED, f, targzname)
+        journal.commit()
     # Remove uncompressed versions.
-    for f in filelist:
+    for f in (filelist if paths is None else paths):
         try:
             os.remove(f)
         except OSError:
             write_message("w", "File not found (%s): skipping delete" % str(f), logfile)
-    return targzname
+    return 1
+
+
+class Archiver(threading.Thread):
+    """ Background archiver for completed outputs.
+
+    Streams completed outputs into the current <batch_root><n> archive as they arrive (while they are likely still in
+    the page cache), compressing on multiple threads, on its own thread so result intake never waits on compression.
+    Every batch_size outputs the archive is finished, its membership committed to the journal, and only then are the
+    archived outputs removed. Outputs still queued when the archiver is closed finish a final, partial batch.
+
+    Args:
+        batch_root (str): Root of batch tarball names.
+        batch_count (int): Number of the first batch to write.
+        batch_size (int, optional): Number of outputs per batch. Default = 100.
+        compresslevel (int -or- None, optional): Compression level, 1 (fastest) to 9 (smallest) for gzip or 22 for
+            zstd. Default = 9.
+        logfile (file -or- None, optional): Open file object to write messages, or None for stdout. Default = None.
+        journal (findr_journal.Journal -or- None, optional): Task state journal to record archive membership.
+            Default = None.
+        codec (str, optional): Compression codec, "gzip" or "zstd". Default = "gzip".
+        threads (int -or- None, optional): Compression threads. Default = None (all cores).
+
+    """
+    def __init__(self, batch_root, batch_count, batch_size=100, compresslevel=9, logfile=None, journal=None,
+                 codec="gzip", threads=None):
+        threading.Thread.__init__(self, name="findr-archiver")
+        self.daemon = True
+        self.batch_root = batch_root
+        self.batch_count = batch_count
+        self.batch_size = batch_size
+        self.compresslevel = compresslevel
+        self.logfile = logfile
+        self.journal = journal
+        self.codec = codec
+        self.threads = threads
+        self.outputs = Queue.Queue()
+
+    def __repr__(self):
+        return '<Archiver batch=%s%s>' % (self.batch_root, self.batch_count)
+
+    def add(self, filename, path=None):
+        """Queue a completed output for archiving (read from path, if it is not at filename). Never blocks."""
+        self.outputs.put((filename, filename if path is None else path))
+
+    def close(self):
+        """Archive any remaining outputs and wait for the archiver to finish."""
+        self.outputs.put(None)
+        self.join()
+
+    def run(self):
+        archive = None
+        batch = []
+        paths = []
+        while True:
+            f = self.outputs.get()
+            if f is not None:
+                batch.append(f[0])
+                paths.append(f[1])
+                archive = self._append(archive, f[0], f[1])
+            if len(batch) >= self.batch_size or (f is None and len(batch) > 0):
+                self._finish(archive, batch, paths)
+                archive = None
+                batch = []
+                paths = []
+            if f is None:
+                break
+
+    def _append(self, archive, f, path):
+        # A failed archive is replaced by a placeholder (False), and its batch left uncompressed.
+        try:
+            if archive is None:
+                name = "%s%s%s" % (self.batch_root, str(self.batch_count), archive_extension(self.codec))
+                self.batch_count += 1
+                archive = ArchiveWriter(name, self.codec, self.compresslevel, self.threads)
+            if archive:
+                archive.add(path, f)
+        except (IOError, OSError, tarfile.TarError) as e:
+            write_message("w", "Compression of batch %s%s failed (%s): outputs left uncompressed"
+                          % (self.batch_root, str(self.batch_count - 1), str(e)), self.logfile)
+            return False
+        return archive
+
+    def _finish(self, archive, batch, paths):
+        if not archive:
+            return
+        try:
+            archive.close()
+        except (IOError, OSError, tarfile.TarError) as e:
+            write_message("w", "Compression of %s failed (%s): outputs left uncompressed" % (archive.filename, str(e)),
+                          self.logfile)
+            return
+        remove_archived(batch, archive.filename, self.logfile, self.journal, paths)
+
+
+class EventSchedule(object):
+    """ Timer-driven schedule of periodic master actions.
+
+    Each action runs every 'interval' seconds of the clock's time (wall-clock time, unless simulated), independent of
+    how many results the master loop takes in between, so reporting, flushing and top-ups keep a steady cadence at any
+    completion rate.
+
+    Args:
+        clock (module -or- object, optional): Source of time, with a time() function. Default = time (wall-clock).
+
+    """
+    def __init__(self, clock=time):
+        self.clock = clock
+        self._events = []
+        self._count = 0
+
+    def __repr__(self):
+        return '<EventSchedule events=%s>' % len(self._events)
+
+    def every(self, interval, action):
+        """Run action() every interval seconds, starting interval seconds from now."""
+        heapq.heappush(self._events, (self.clock.time() + interval, self._count, interval, action))
+        self._count += 1
+
+    def time_to_next(self):
+        """Seconds until the next action is due (0 if overdue)."""
+        if not self._events:
+            return float(TOP_UP_INTERVAL)
+        return max(0.0, self._events[0][0] - self.clock.time())
+
+    def run_due(self):
+        """Run every action that is due, then reschedule it. Overdue actions run once, not once per missed interval."""
+        now = self.clock.time()
+        while self._events and self._events[0][0] <= now:
+            due, count, interval, action = heapq.heappop(self._events)
+            action()
+            due += interval
+            heapq.heappush(self._events, (due if due > now else now + interval, count, interval, action))
 
 
 def write_worker_report(queue, logfile):
@@ -138,18 +339,21 @@ def write_worker_report(queue, logfile):
     return 1
 
 
-def write_task_report(task, queue):
+def write_task_report(task, queue, category=None, speculative=False):
     """Generate task usage report entry.
 
     Generates a report of task computational usage, including task ID, executed command, start time, end time, exit
     status, CPU time, wall time, cores used, virtual memory used, swap memory used, total processes executed, max
     concurrent processes, bytes read, bytes written, number of workeres connected at completion, workers busy at
     completion, workers idle at completion, workers lost at completion, number of tasks complete, number of tasks
-    running, number of tasks waiting, and the total Findr execution time.
+    running, number of tasks waiting, the total Findr execution time, the task's resource category, and whether the
+    task was a speculative duplicate (1) or not (0).
 
     Args:
         task (work_queue::Task): Completed task, which has had resource monitoring enabled.
         queue (work_queue::WorkQueue): Active queue.
+        category (str -or- None, optional): Task resource category, or None for uncategorized ("-"). Default = None.
+        speculative (bool, optional): Task was a speculative duplicate of a straggler. Default = False.
 
     Returns:
         str: Tab-separated usage values.
@@ -161,63 +365,293 @@ def write_task_report(task, queue):
           r.cpu_time, r.wall_time, r.cores, r.virtual_memory, r.swap_memory,
           r.total_processes, r.max_concurrent_processes, r.bytes_read, r.bytes_written,
           s.total_workers_connected, s.workers_busy, s.workers_idle, s.total_workers_removed,
-          s.tasks_complete, s.tasks_running, s.tasks_waiting, s.total_execute_time]
+          s.tasks_complete, s.tasks_running, s.tasks_waiting, s.total_execute_time,
+          "-" if category is None else category, 1 if speculative else 0]
     return "\t".join([str(l) for l in rl]) + "\n"
 
 
-def spawn_queue(port, logprefix, logfile):
+def spawn_queue(port, logprefix, logfile, executor="workqueue", workers=None):
     """ Spawn a job queue.
 
-    Launch a job queue listening on a given port. Writes warnings using write_message().
+    Launch a job queue using the selected execution backend (see findr_executors.EXECUTORS). The "workqueue" backend
+    listens for workers on a given port; the "local" backend runs tasks on a pool of local processes. Writes warnings
+    using write_message().
 
     Args:
-        port (int -or- str): Port which queue should listen for workers.
+        port (int -or- str): Port which queue should listen for workers (ignored by the local backend).
         logprefix (str): Prefix for queue log.
         logfile (str -or- None): Open log file for write_message(), or None for stdout.
+        executor (str, optional): Execution backend, "workqueue" or "local". Default = "workqueue".
+        workers (int -or- None, optional): Number of local processes (local backend only). Default = None (all cores).
 
     Returns:
-        work_queue::WorkQueue: Queue object.
+        findr_executors.WorkQueueExecutor -or- findr_executors.LocalExecutor: Queue object.
         bool: Status of enabling compute monitoring. True for success, False for failure.
 
     """
-    queue = WorkQueue(port)
-    queue.specify_log(logprefix + "_wq.log")
-    monitor_status = queue.enable_monitoring(logprefix + "_monitors")
+    if executor == "local":
+        queue = EXECUTORS[executor](port, logprefix, workers=workers)
+    else:
+        queue = EXECUTORS[executor](port, logprefix)
+    monitor_status = queue.monitoring
     if not monitor_status:
         write_message("w", "Monitoring failed to initialize.", logfile)
-    # queue.specify_password_file()  # TODO: Give workers a password file
-    write_message("i", "Workqueue launched on port %s." % str(port), logfile)
+    if executor == "local":
+        write_message("i", "Local executor launched with %s workers." % str(queue.workers), logfile)
+    else:
+        write_message("i", "Workqueue launched on port %s." % str(port), logfile)
     return queue, monitor_status
 
 
-def create_task(cmd, cfgf, outpf):
+def specify_config(task, cfgf, shared=None, specified=None):
+    """ Specify a config input.
+
+    Adds a klipReduce config to a task's inputs. With shared inputs enabled, the config's shared inputs (image
+    directory, quality, mask & fake files) are added as cached inputs, and the config is sent rewritten to reference
+    them by their remote names.
+
+    Args:
+        task (work_queue::Task -or- findr_executors.LocalTask): Task to specify inputs of.
+        cfgf (str): Path to configuration file.
+        shared (findr_config.SharedInputs -or- None, optional): Shared input mapping, or None to send the config
+            as is and rely on a shared filesystem. Default = None.
+        specified (set -or- None, optional): Remote names already specified for this task, updated in place, so
+            inputs shared by several configs of a bundle are only specified once. Default = None.
+
+    Returns:
+        int: Always returns 1.
+
+    """
+    if shared is None:
+        task.specify_file(cfgf, os.path.basename(cfgf), INPUT, cache=False)
+        return 1
+    if specified is None:
+        specified = set()
+    text, inputs = shared.localize(cfgf)
+    for local, remote, isdir in inputs:
+        if remote in specified:
+            continue
+        specified.add(remote)
+        if isdir:
+            task.specify_directory(local, remote, INPUT, recursive=True, cache=True)
+        else:
+            task.specify_file(local, remote, INPUT, cache=True)
+    task.specify_buffer(text, os.path.basename(cfgf), cache=False)
+    return 1
+
+
+def specify_resources(task, category=None, resources=None):
+    """ Specify task resources.
+
+    Labels a task with its resource category and requests predicted resources, so workers can be packed densely
+    without oversubscribing memory.
+
+    Args:
+        task (work_queue::Task -or- findr_executors.LocalTask): Task to label.
+        category (str -or- None, optional): Resource category, or None. Default = None.
+        resources (tuple -or- None, optional): Predicted (cores, memory in MB), or None for no request. Default = None.
+
+    Returns:
+        int: Always returns 1.
+
+    """
+    if category is not None:
+        task.specify_category(category)
+    if resources is not None:
+        task.specify_cores(resources[0])
+        task.specify_memory(resources[1])
+    return 1
+
+
+def create_task(queue, cmd, cfgf, outpf, priority=0, shared=None, local_output=None, statusf=None, store=None):
     """ Create a task.
 
     Create a klipReduce task, to be submitted to the queue.
 
     Args:
+        queue (findr_executors.WorkQueueExecutor -or- findr_executors.LocalExecutor): Queue the task is built for.
         cmd (str): Command-line text for task execution (e.g. 'klipReduce -c my_config.cfg')
         cfgf (str): Path to configuration file.
         outpf (str): Expected output.
+        priority (int, optional): Task priority, higher priority tasks are dispatched first. Default = 0.
+        shared (findr_config.SharedInputs -or- None, optional): Shared input mapping to cache the config's shared
+            inputs on workers (see specify_config()), or None. Default = None.
+        local_output (str -or- None, optional): Local path to retrieve the output to, if not outpf (e.g. for a
+            speculative duplicate). Default = None.
+        statusf (str -or- None, optional): Local path to retrieve the status file to, for a command running the config
+            with the worker-side driver (see worker_command()), or None. Default = None.
+        store (str -or- None, optional): Store directory the driver publishes the output to, in which case only the
+            status file is returned. Default = None.
 
     Returns:
-        work_queue::Task: Task object.
+        work_queue::Task -or- findr_executors.LocalTask: Task object.
 
     """
     # Build task.
-    t = Task(cmd)
+    t = queue.new_task(cmd)
     t.specify_tag(cmd)
-    t.specify_file(cfgf, os.path.basename(cfgf), WORK_QUEUE_INPUT, cache=False)
-    t.specify_file(outpf, os.path.basename(outpf), WORK_QUEUE_OUTPUT, cache=False)
+    if priority:
+        t.specify_priority(priority)
+    specify_config(t, cfgf, shared)
+    if store is None:
+        t.specify_file(outpf if local_output is None else local_output, os.path.basename(outpf), OUTPUT, cache=False)
+    if statusf is not None:
+        t.specify_file(WORKER_SCRIPT, os.path.basename(WORKER_SCRIPT), INPUT, cache=True)
+        t.specify_file(statusf, status_name(outpf), OUTPUT, cache=False)
     # Add other file specifications as needed here.
     return t
 
 
+def status_name(outpf):
+    """Get the name of the status file the worker-side driver writes for a single config (e.g. "a.fits.status")."""
+    return os.path.basename(outpf) + ".status"
+
+
+def stored_path(store, outpf):
+    """Get the path an output is published to in a store directory (see findr_worker.store_output())."""
+    return os.path.join(store, os.path.basename(outpf))
+
+
+def worker_command(klipReduce, members, statusf, jobs=1, archive=None, validate=False, store=None):
+    """ Build a worker-side driver (findr_worker.py) command.
+
+    Args:
+        klipReduce (str): klipReduce path on the workers.
+        members (list): Task details ([expected output, config, ...]) of each config the driver runs.
+        statusf (str): Status file the driver writes.
+        jobs (int, optional): Number of configs the driver runs concurrently. Default = 1 (sequential).
+        archive (str -or- None, optional): Archive the driver packs outputs into, or None to leave them as they are.
+            Default = None.
+        validate (bool, optional): Validate each output's FITS structure on the worker. Default = False.
+        store (str -or- None, optional): Store directory to publish outputs to, or None. Default = None.
+
+    Returns:
+        str: Command-line text.
+
+    """
+    pairs = " ".join(["%s %s" % (os.path.basename(m[1]), os.path.basename(m[0])) for m in members])
+    return "python %s -k %s -j %d%s%s%s -s %s%s%s" % (os.path.basename(WORKER_SCRIPT), klipReduce, jobs,
+                                                      "" if archive is None else " -a %s" % archive,
+                                                      " --validate" if validate else "",
+                                                      "" if store is None else " --store %s" % store,
+                                                      statusf, BUNDLE_MARKER, pairs)
+
+
+def create_bundle_task(queue, klipReduce, members, jobs=1, shared=None, validate=False, store=None):
+    """ Create a bundle task.
+
+    Create a task running several klipReduce configs with the worker-side driver (findr_worker.py), which returns every
+    output in a single archive along with a status file of per-config return codes and wall times.
+
+    Args:
+        queue (findr_executors.WorkQueueExecutor -or- findr_executors.LocalExecutor): Queue the task is built for.
+        klipReduce (str): klipReduce path on the workers.
+        members (list): Task details ([expected output, config, command, attempts, category, cache key]) of each
+            config in the bundle.
+        jobs (int, optional): Number of configs the driver runs concurrently. Default = 1 (sequential).
+        shared (findr_config.SharedInputs -or- None, optional): Shared input mapping to cache the configs' shared
+            inputs on workers (see specify_config()), or None. Default = None.
+        validate (bool, optional): Validate each output's FITS structure on the worker. Default = False.
+        store (str -or- None, optional): Store directory the driver publishes outputs to, in which case only the status
+            file is returned. Default = None.
+
+    Returns:
+        work_queue::Task -or- findr_executors.LocalTask: Task object.
+        str -or- None: Expected archive (None with a store).
+        str: Expected status file.
+
+    """
+    name = "bundle_%s" % os.path.basename(members[0][0])
+    archive = name + ".tar" if store is None else None
+    statusf = name + ".status"
+    cmd = worker_command(klipReduce, members, statusf, jobs, archive, validate, store)
+
+    # Build task.
+    t = queue.new_task(cmd)
+    t.specify_tag(cmd)
+    t.specify_file(WORKER_SCRIPT, os.path.basename(WORKER_SCRIPT), INPUT, cache=True)
+    specified = set()
+    for m in members:
+        specify_config(t, m[1], shared, specified)
+    if archive is not None:
+        t.specify_file(archive, archive, OUTPUT, cache=False)
+    t.specify_file(statusf, statusf, OUTPUT, cache=False)
+    return t, archive, statusf
+
+
+def read_status(statusf, outputs):
+    """Read a worker-side driver status file.
+
+    Args:
+        statusf (str): Returned status file.
+        outputs (list): Expected outputs of the configs the driver ran.
+
+    Returns:
+        dict: {expected output: (return code, wall time in microseconds, output SHA-1, output size, stored location)}
+            for each config the driver reported on. The last three are None where not reported.
+
+    """
+    results = {}
+    expected = dict([(os.path.basename(o), o) for o in outputs])
+    with open(statusf, 'r') as s:
+        for line in s:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 3 and fields[0] in expected:
+                # Older drivers did not return checksums, sizes or locations.
+                fields += ["-"] * (6 - len(fields))
+                digest, size, location = [None if f == "-" else f for f in fields[3:6]]
+                results[expected[fields[0]]] = (int(fields[1]), int(fields[2]), digest,
+                                                None if size is None else int(size), location)
+    return results
+
+
+def unpack_bundle(members, archive, statusf, logfile):
+    """Unpack a returned bundle.
+
+    Reads a bundle's status file, extracts its outputs from the returned archive to their expected paths, then removes
+    the archive and status file.
+
+    Args:
+        members (list): Task details ([expected output, config, command, attempts, category, cache key]) of each
+            config in the bundle.
+        archive (str -or- None): Returned archive, or None if outputs were stored rather than returned.
+        statusf (str): Returned status file.
+        logfile (str -or- None): Open log file for write_message(), or None for stdout.
+
+    Returns:
+        dict: {expected output: (return code, wall time in microseconds, output SHA-1, output size, stored location)}
+            for each config the driver reported on (see read_status()).
+
+    """
+    results = {}
+    expected = dict([(os.path.basename(m[0]), m[0]) for m in members])
+    try:
+        results = read_status(statusf, [m[0] for m in members])
+        if archive is not None:
+            tar = tarfile.open(archive, "r")
+            for member in tar.getmembers():
+                if member.name in expected:
+                    src = tar.extractfile(member)
+                    with open(expected[member.name], 'wb') as dst:
+                        dst.write(src.read())
+            tar.close()
+    except (IOError, OSError, ValueError, tarfile.TarError) as e:
+        write_message("w", "Bundle %s could not be unpacked (%s)." % (archive or statusf, str(e)), logfile)
+    for f in [archive, statusf]:
+        if f is None:
+            continue
+        try:
+            os.remove(f)
+        except OSError:
+            pass
+    return results
+
+
 def check_logs(prefix):
     """Check logs.
 
     Checks for existing Findr logs. Currently checks for <prefix>_all.log", <prefix>_complete.log",
-    <prefix>_failed.log", <prefix>_usage.log".
+    <prefix>_failed.log", <prefix>_usage.log", <prefix>_journal.log", <prefix>_messages.jsonl".
 
     Args:
         prefix (str): Logfile prefix.
@@ -226,39 +660,348 @@ def check_logs(prefix):
         list: List of found and missing log files [[found, logs], [missing, logs]].
 
     """
-    l = [prefix + "_all.log", prefix + "_complete.log", prefix + "_failed.log", prefix + "_usage.log"]
+    l = [prefix + "_all.log", prefix + "_complete.log", prefix + "_failed.log", prefix + "_usage.log",
+         prefix + "_journal.log", prefix + "_messages.jsonl"]
     f = [os.path.isfile(x) for x in l]
 
     # Return [[found], [missing]]
     return [[l[i] for i in range(len(f)) if f[i]], [l[i] for i in range(len(f)) if not f[i]]]
 
 
-def runFindr(configList, klipReduce, logPrefix, resume=False, retry=0, logfile=None):
+def staging_directory(configList):
+    """Get the default directory configs of a packed store or sweep spec are materialized in (e.g. configs.pack ->
+    configs_staged)."""
+    return configList.rsplit(".", 1)[0] + "_staged"
+
+
+def read_config_list(configList, skip=None, stage=None):
+    """Read configuration list.
+
+    Lazily reads a configuration/outputs list (see examples/configs.list), one line at a time, so arbitrarily long lists
+    can be scheduled without holding them in memory. Packed config stores (see findr_pack) are read one entry at a
+    time, and sweep specs (see findr_sweep) generate one config at a time, and each config is only written to a file
+    in the staging directory as it is yielded.
+
+    Args:
+        configList (str): Path to config list, packed config store or sweep spec.
+        skip (set -or- None, optional): Expected outputs to skip (e.g. already complete), removed from the set as they
+            are skipped, so it shrinks as the list is read. Default = None.
+        stage (str -or- None, optional): Directory configs of a packed store or sweep spec are materialized in.
+            Default = None (see staging_directory()).
+
+    Yields:
+        tuple: (config file path, expected output) for each non-empty, non-skipped line or config.
+
+    """
+    entries = sweep_entries(configList)
+    if entries is not None:
+        stage = staging_directory(configList) if stage is None else stage
+        for name, outf, text in entries:
+            if skip is not None and outf in skip:
+                skip.discard(outf)
+                continue
+            yield materialize(name, text, stage), outf
+        return
+
+    with open(configList, 'U') as cfgin:
+        for line in cfgin:
+            contents = line.rstrip().split()
+            if len(contents) < 2:
+                continue
+            if skip is not None and contents[1] in skip:
+                skip.discard(contents[1])
+                continue
+            yield contents[0], contents[1]
+
+
+def config_directories(configList, stage=None):
+    """Get the directories configs named in usage logs are looked for in (see findr_usage.row_category()): the staging
+    directory of a packed store or sweep spec, or the directory of a config list's first config, then the current
+    directory.
+
+    Args:
+        configList (str): Path to config list, packed config store or sweep spec.
+        stage (str -or- None, optional): Staging directory of a packed store or sweep spec, or None for a config list.
+            Default = None.
+
+    Returns:
+        list: Directories, in the order searched.
+
+    """
+    if stage is not None:
+        return [stage, "."]
+    first = next(read_config_list(configList), None)
+    return ([] if first is None else [os.path.dirname(first[0]) or "."]) + ["."]
+
+
+def count_configs(configList):
+    """Count the configs of a config list, packed config store (from its index) or sweep spec (from its size)."""
+    count = count_entries(configList)
+    if count is not None:
+        return count
+    with open(configList, 'U') as cfgin:
+        return sum(1 for line in cfgin if len(line.split()) >= 2)
+
+
+def order_configs(configs, policy, cost_model=None, keys=None, lookahead=0):
+    """Order configs for submission.
+
+    The "listed" policy passes configs through lazily, in config list order. The other policies read configs before
+    submitting them: "longest" submits the longest predicted first, so expensive configs do not start last and set the
+    makespan, and "round-robin" interleaves resource categories, so no category is left to run alone at the end.
+    Predictions are the mean wall time measured for a config's category (see findr_usage.CostModel); configs of
+    unmeasured categories are submitted before all measured ones, ranked by findr_config.cost_proxy(), as they may be
+    the longest of all.
+
+    With a lookahead, configs are read & ordered lazily, lookahead configs at a time, so memory (and the configs of a
+    packed store or sweep spec staged ahead of submission) is bounded by the lookahead rather than the config list.
+    Each chunk is ordered on its own, so the order is only global within a chunk.
+
+    Args:
+        configs (iterable): (config file path, expected output) pairs, as yielded by read_config_list().
+        policy (str): Ordering policy, one of ORDER_POLICIES.
+        cost_model (findr_usage.CostModel -or- None, optional): Measured category costs. Default = None.
+        keys (list -or- None, optional): Config parameters defining categories. Default = None
+            (findr_config.COST_KEYS).
+        lookahead (int, optional): Configs ordered at a time, 0 to read and order every config first. Default = 0.
+
+    Returns:
+        iterator: (config file path, expected output) pairs in submission order.
+
+    """
+    if policy == "listed":
+        return iter(configs)
+    if lookahead <= 0:
+        return iter(order_chunk(configs, policy, cost_model, keys))
+    return order_chunks(iter(configs), policy, cost_model, keys, lookahead)
+
+
+def order_chunks(configs, policy, cost_model, keys, lookahead):
+    """Order consecutive chunks of lookahead configs lazily (see order_configs())."""
+    while True:
+        chunk = list(itertools.islice(configs, lookahead))
+        if not chunk:
+            return
+        for entry in order_chunk(chunk, policy, cost_model, keys):
+            yield entry
+
+
+def order_chunk(configs, policy, cost_model=None, keys=None):
+    """Order configs by a "longest" or "round-robin" policy (see order_configs()). Returns a list of (config file path,
+    expected output) pairs."""
+    if policy == "round-robin":
+        groups = {}
+        order = []
+        for cfg, outf in configs:
+            category = category_key(read_config(cfg), keys)
+            if category not in groups:
+                groups[category] = []
+                order.append(category)
+            groups[category].append((cfg, outf))
+        ordered = []
+        for i in range(max([len(g) for g in groups.values()] or [0])):
+            ordered.extend([groups[c][i] for c in order if i < len(groups[c])])
+        return ordered
+    ranked = []
+    for cfg, outf in configs:
+        pairs = read_config(cfg)
+        predicted = cost_model.predict(category_key(pairs, keys)) if cost_model is not None else None
+        if predicted is None:
+            ranked.append((0, -cost_proxy(pairs, keys), cfg, outf))
+        else:
+            ranked.append((1, -predicted, cfg, outf))
+    ranked.sort(key=lambda r: r[:2])
+    return [(cfg, outf) for rank, cost, cfg, outf in ranked]
+
+
+def window_size(window, queue):
+    """Get submission window size.
+
+    Maximum number of tasks to keep in flight. A fixed window is returned as is; an automatic window is sized from the
+    workers currently connected to the queue, so each worker has a task queued behind the one it is running.
+
+    Args:
+        window (int): Window setting: positive for a fixed window, 0 for unbounded, negative for automatic sizing.
+        queue (findr_executors.WorkQueueExecutor -or- findr_executors.LocalExecutor): Active queue.
+
+    Returns:
+        int -or- None: Window size, or None for unbounded.
+
+    """
+    if window > 0:
+        return window
+    elif window == 0:
+        return None
+    return max(AUTO_WINDOW_MIN, AUTO_WINDOW_FACTOR * queue.stats.total_workers_connected)
+
+
+def parse_window(value):
+    """Parse the --window command line argument ("auto" or a non-negative integer) to a window_size() setting."""
+    if value == "auto":
+        return -1
+    try:
+        window = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("window must be 'auto' or an integer (got '%s')" % value)
+    if window < 0:
+        raise argparse.ArgumentTypeError("window must be 'auto' or a non-negative integer (got '%s')" % value)
+    return window
+
+
+def bundle_size(bundle, wall_stats):
+    """Get bundle size.
+
+    Number of configs to pack into each task. A fixed size is returned as is; an automatic size packs enough configs to
+    run about BUNDLE_TARGET_SECONDS, from the mean measured wall time per config, and is 1 until a measurement exists.
+
+    Args:
+        bundle (int): Bundle setting: positive for a fixed size (1 disables bundling), negative for automatic sizing.
+        wall_stats (findr_usage.WallTimeStats): Measured wall times.
+
+    Returns:
+        int: Configs per task.
+
+    """
+    if bundle > 0:
+        return bundle
+    mean = wall_stats.mean()
+    if mean is None:
+        return 1
+    return max(1, min(BUNDLE_MAX, int(BUNDLE_TARGET_SECONDS / max(mean, 0.001))))
+
+
+def parse_bundle(value):
+    """Parse the --bundle command line argument ("auto" or a positive integer) to a bundle_size() setting."""
+    if value == "auto":
+        return -1
+    try:
+        bundle = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("bundle must be 'auto' or an integer (got '%s')" % value)
+    if bundle < 1:
+        raise argparse.ArgumentTypeError("bundle must be 'auto' or a positive integer (got '%s')" % value)
+    return bundle
+
+
+def parse_percentile(value):
+    """Parse the --speculate command line argument (a percentile strictly between 0 and 100)."""
+    try:
+        percentile = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("percentile must be a number (got '%s')" % value)
+    if not 0 < percentile < 100:
+        raise argparse.ArgumentTypeError("percentile must be between 0 and 100 (got '%s')" % value)
+    return percentile
+
+
+def retry_delay(attempt, backoff, backoff_max):
+    """Get retry delay.
+
+    Exponential backoff: the first retry waits 'backoff' seconds, and each further retry doubles the wait, up to
+    'backoff_max' seconds.
+
+    Args:
+        attempt (int): Number of failed attempts so far (1 for the first failure).
+        backoff (float): Base delay in seconds.
+        backoff_max (float): Maximum delay in seconds.
+
+    Returns:
+        float: Seconds to wait before resubmitting.
+
+    """
+    return min(backoff * 2 ** (attempt - 1), backoff_max)
+
+
+def runFindr(configList, klipReduce, logPrefix, resume=False, retry=0, logfile=None, executor="workqueue",
+             workers=None, window=0, retry_backoff=10.0, retry_backoff_max=300.0, batch_size=100, compresslevel=9,
+             bundle=1, bundle_jobs=1, history=None, cache_inputs=False, categories=False, category_keys=None,
+             report_interval=60.0, metrics_file=None, metrics_port=None, metrics_interval=10.0, result_cache=None,
+             codec="gzip", compress_threads=None, speculate=None, order="listed", port=None, batch_root="batch",
+             validate=False, store=None, task_log=False, queue=None):
     """ Run Findr.
 
     Handles major operations of Findr.
 
     Args:
-        configList (str): Path to config file (see examples/configs.list).
+        configList (str): Path to config file (see examples/configs.list), packed config store (see findr_pack) or sweep
+            spec (see findr_sweep). Configs of a packed store or sweep spec are materialized in <prefix>_staged as they
+            are submitted, and removed once complete.
         klipReduce (str): klipReduce path, if klipReduce is in path this can just be 'klipReduce' .
         logPrefix (str): Prefix for log files. This is usually the base of configList (e.g. configs.list -> configs)
-        resume (bool, optional): Resume previous run, requires existing log files with given prefix. Default = False.
-        retry (int, optional): [NOT IMPLEMENTED] Number of times to retry failed tasks. Default = 0.
+        resume (bool, optional): Resume previous run, requires existing log files with given prefix. State is rebuilt
+            from the <prefix>_journal.log journal, or from <prefix>_complete.log for runs without one. Default = False.
+        retry (int, optional): Number of times to retry failed tasks (non-zero return code or missing output) within
+            this run. Retries are resubmitted after a backoff, ahead of any waiting tasks. Default = 0.
         logfile (file -or- None, optional): Open file object to write messages, or None for stdout. Default = None.
+        executor (str, optional): Execution backend, "workqueue" or "local". Default = "workqueue".
+        workers (int -or- None, optional): Number of local processes for the local backend. Default = None (all cores).
+        window (int, optional): Maximum tasks in flight, read lazily from configList and topped up as tasks complete.
+            0 submits every task up front, negative values size the window from connected workers. Default = 0.
+        retry_backoff (float, optional): Seconds to wait before the first retry, doubling for each further retry.
+            Default = 10.0.
+        retry_backoff_max (float, optional): Maximum seconds to wait before a retry. Default = 300.0.
+        batch_size (int, optional): Completed outputs per compressed batch. Default = 100.
+        compresslevel (int -or- None, optional): Compression level of batches, 1 (fastest) to 9 (smallest) for gzip or
+            22 for zstd, or None for the codec default. Default = 9.
+        bundle (int, optional): Configs packed into each task, negative to size bundles from measured per-config wall
+            times. Each config is still tracked individually in the logs. Default = 1 (no bundling).
+        bundle_jobs (int, optional): Configs each bundle runs concurrently on its worker. Default = 1.
+        history (list -or- None, optional): Usage logs of earlier runs to seed measured wall times and resource
+            categories. Default = None.
+        cache_inputs (bool, optional): Send the shared inputs named in each config (image directory, quality, mask &
+            fake files) to workers as cached inputs, rather than relying on a shared filesystem. Default = False.
+        categories (bool, optional): Label tasks with resource categories keyed on the config parameters in
+            category_keys, and request the cores & memory measured for each category in earlier runs. Default = False.
+        category_keys (list -or- None, optional): Config parameters defining categories. Default = None
+            (findr_config.COST_KEYS).
+        report_interval (float, optional): Seconds between queue status reports. Default = 60.0.
+        metrics_file (str -or- None, optional): JSON file rewritten with live run metrics (see findr_metrics.Metrics)
+            every metrics_interval seconds, or None. Default = None.
+        metrics_port (int -or- None, optional): Local port serving live run metrics as JSON over HTTP, or None.
+            Default = None.
+        metrics_interval (float, optional): Seconds between metrics updates. Default = 10.0.
+        result_cache (str -or- None, optional): Result cache directory (see findr_cache.ResultCache). Configs whose
+            effective parameters & inputs match an earlier result are completed from the cache instead of being
+            submitted, and new results are added to it. Default = None (no cache).
+        codec (str, optional): Batch compression codec, "gzip" (.tar.gz) or "zstd" (.tar.zst). Default = "gzip".
+        compress_threads (int -or- None, optional): Threads compressing each batch. Default = None (all cores).
+        speculate (float -or- None, optional): Once every config is submitted and no tasks are waiting, submit a
+            speculative duplicate of any single-config task running longer than this percentile of wall times of
+            similar configs (same category_keys parameters), keep whichever copy finishes first and cancel the other.
+            Default = None (no speculation).
+        order (str, optional): Submission order, one of ORDER_POLICIES (see order_configs()). Costs are learned from
+            history usage logs (see findr_usage.CostModel). With a window, configs are ordered ORDER_LOOKAHEAD at a
+            time, otherwise every config is read & ordered before the first submission. Default = "listed".
+        port (int -or- None, optional): Port the queue listens for workers on. Default = None (WorkQueue default).
+        batch_root (str, optional): Root of batch archive names (<batch_root><n>.tar.gz). Default = "batch".
+        validate (bool, optional): Run every config with the worker-side driver, which checks each output's FITS
+            structure before it is returned, failing configs with invalid outputs on the worker, and returns its
+            SHA-1 checksum, recorded in the complete task log. Default = False.
+        store (str -or- None, optional): Shared store directory (on a filesystem mounted by the master and workers)
+            that workers publish outputs to, rather than returning them through the master. Only each output's
+            checksum, size and location are returned, and recorded in the complete task log; outputs stay in the
+            store rather than being archived into batches. Default = None (outputs are returned).
+        task_log (bool, optional): Write a message line for every task returned, completed or cached. Otherwise these
+            are only recorded in <prefix>_messages.jsonl, and counted in a summary line with each status report.
+            Warnings & errors are always written. Default = False.
+        queue (object -or- None, optional): Queue to run on, with the executor interface (e.g. a
+            findr_simulate.SimulatedExecutor), instead of spawning one. Its clock times every scheduling decision.
+            Default = None.
 
     Return:
         int: Always returns 1.
 
     """
+    # Messages are recorded as structured records, with per-task lines only written if asked for.
+    log = Logger(logfile, logPrefix + "_messages.jsonl", task_log)
+
     # Print welcoming message.
     if resume:
-        write_message("i", "Resuming previous analysis from '%s'." % configList, logfile)
+        write_message("i", "Resuming previous analysis from '%s'." % configList, log)
     else:
-        write_message("i", "Launching a new analysis from '%s'." % configList, logfile)
+        write_message("i", "Launching a new analysis from '%s'." % configList, log)
 
-    # Set number of files completed that will trigger compression, the root and starting iterator of batch names.
-    compress_threshold = 100
-    batch_root = "batch"
+    # Set the starting iterator of batch names.
     batch_count = 0
 
     # Define log file names.
@@ -266,24 +1009,53 @@ def runFindr(configList, klipReduce, logPrefix, resume=False, retry=0, logfile=N
     completetlog = logPrefix + "_complete.log"
     failedtlog = logPrefix + "_failed.log"
     usagelog = logPrefix + "_usage.log"
+    journallog = logPrefix + "_journal.log"
 
-    # Build task list.
-    all_tasks = {}
-    done = []
-    with open(configList, 'U') as cfgin:
-        for line in cfgin:
-            contents = line.rstrip().split()
-            all_tasks[contents[1]] = [contents[0], "read", 0]
+    # Outputs published to a store are tracked by their expected names, and stay in the store (their recorded location).
+    if store is not None:
+        store = os.path.abspath(store)
+        if not os.path.isdir(store):
+            os.makedirs(store)
+
+    # Track outputs completed by earlier runs (dropped as the config list is read past them, outputs completed by this
+    # run are only counted, so memory does not grow with the sweep), and completed outputs left unarchived by an
+    # earlier run (with their paths).
+    done = set()
+    orphans = []
 
     # If resuming, check for already complete tasks.
-    if resume:
-        # Generate a list of files already in directory (for clean up into tar.gz in case of crash).
-        # TODO: Fix this thing!
+    if resume and os.path.isfile(journallog):
+        # Rebuild state from the journal.
+        state = replay_journal(journallog)
+        done = state.complete
+        batch_count = state.next_batch(batch_root)
+        # Completed but unarchived outputs are archived with this run (stored outputs are left in the store), or rerun
+        # if they have gone missing.
+        for outf in state.unarchived:
+            path = outf if store is None else stored_path(store, outf)
+            if not os.path.exists(path):
+                write_message("w", "Completed output '%s' is missing and was never archived: rerunning." % outf,
+                              log)
+                done.discard(outf)
+            elif store is None:
+                orphans.append((outf, path))
+        if len(orphans) > 0:
+            write_message("i", "%s completed outputs from previous run(s) will be archived." % str(len(orphans)),
+                          log)
+        # Outputs of tasks in flight at the crash may be incomplete, so their tasks are rerun.
+        for outf in state.interrupted:
+            if os.path.exists(outf):
+                write_message("w", "Output '%s' of an interrupted task found: rerunning." % outf, log)
+    elif resume:
+        # No journal (run predates it), fall back to batch names and the complete task log.
         currents = [f for f in os.listdir('.')]
-        current_batches = [f for f in currents if batch_root in f]
+        current_batches = [f for f in currents if f.startswith(batch_root) and ".tar" in f]
         if len(current_batches) > 0:
             for batch in current_batches:
-                count = int(batch.split('batch')[1].split('.tar.gz')[0])
+                try:
+                    count = int(batch[len(batch_root):].split('.tar')[0])
+                except ValueError:
+                    continue
                 if count >= batch_count:
                     batch_count = count + 1
 
@@ -291,163 +1063,777 @@ def runFindr(configList, klipReduce, logPrefix, resume=False, retry=0, logfile=N
         with open(completetlog, 'r') as c:
             for line in c:
                 details = line.strip().split('\t')
-                all_tasks[details[0]][1] = "complete"
+                done.add(details[0])
 
     # Create the tasks queue using the default port. If this port is already
     # been used by another program, you can try setting port = 0 to use an
     # available port, or specify a port directly.
-    port = WORK_QUEUE_DEFAULT_PORT
+    port = DEFAULT_PORT if port is None else port
     # Launch work queue
     try:
-        q, monitoring = spawn_queue(port, logPrefix, logfile)
+        if queue is not None:
+            q, monitoring = queue, queue.monitoring
+        else:
+            q, monitoring = spawn_queue(port, logPrefix, log, executor, workers)
+    except ImportError as e:
+        write_message("e", "Instantiation of %s executor failed!" % executor, log)
+        write_message("e", e, log)
+        exit(1)
     except:
-        write_message("w", "Failed to launch on default WorkQueue port. Trying to find an available port...", logfile)
+        write_message("w", "Failed to launch on default WorkQueue port. Trying to find an available port...", log)
         try:
             port = 0
-            q, monitoring = spawn_queue(port, logPrefix, logfile)
+            q, monitoring = spawn_queue(port, logPrefix, log, executor, workers)
         except Exception as e:
-            write_message("e", "Instantiation of Work Queue failed!", logfile)
-            write_message("e", e, logfile)
+            write_message("e", "Instantiation of Work Queue failed!", log)
+            write_message("e", e, log)
             exit(1)
 
-    # Generate tasks & submit to queue, record dictionary of taskid:expected output.
+    # Scheduling runs on the queue's clock (wall-clock time, unless simulated).
+    clock = q.clock
+
+    # Open the task state journal, start the background archiver.
+    journal = Journal(journallog)
+    archiver = Archiver(batch_root, batch_count, batch_size, compresslevel, log, journal, codec, compress_threads)
+    archiver.start()
+    for outf, path in orphans:
+        archiver.add(outf, path)
+
+    # Generate tasks & submit to queue, record dictionary of
+    # taskid:[expected output, config, command, attempts, resource category (or None), cache key (or None)], and
+    # of bundle taskid:[archive, status file, [details of each config]]. Status files of single-config tasks run with
+    # the worker-side driver are recorded by taskid.
+    # Failed tasks awaiting resubmission are held in a heap of (resubmit time, expected output, details).
+    staged = sweep_entries(configList) is not None
+    already = len(done)
+    pending = read_config_list(configList, skip=done, stage=logPrefix + "_staged")
     submit_count = 0
-    complete_count = 0
     task_details = {}
-    with open(alltlog, 'a+', 1) as allt, open(completetlog, 'a+', 1) as completet, open(failedtlog, 'a+', 1) as failedt:
-        for outf, details in all_tasks.iteritems():
-            if details[1] != "complete":
-                # Specify command.
-                cfg = details[0]
-                command = "%s -c %s" % (klipReduce, os.path.basename(cfg))
-
-                # Build task.
-                t = create_task(command, cfg, outf)
-
-                # If not resuming, add job to _all.log.
-                if not resume:
-                    allt.write("%s\t%s\n" % (outf, command))
-
-                # Submit task to queue.
-                taskid = q.submit(t)
-                all_tasks[outf][1] = "wait"
-                task_details[taskid] = [outf, cfg, command]
-                submit_count += 1
+    bundles = {}
+    statuses = {}
+    retries = []
+    shared = SharedInputs() if cache_inputs else None
+    cache = ResultCache(result_cache, salt=klipReduce) if result_cache is not None else None
+
+    # Track live run metrics, counting the config list for the ETA only if metrics are published.
+    publish = metrics_file is not None or metrics_port is not None
+    metrics = Metrics(total=count_configs(configList) if publish else None, done=already, clock=clock)
+    server = None
+    if metrics_port is not None:
+        try:
+            server = MetricsServer(metrics, metrics_port)
+            server.start()
+            write_message("i", "Serving metrics @ http://127.0.0.1:%s/." % str(server.port), log)
+        except socket.error as e:
+            write_message("w", "Metrics endpoint failed to start on port %s (%s)." % (str(metrics_port), str(e)),
+                          log)
+
+    # Seed per-config wall times (for bundle sizing) and per-category resources from earlier runs.
+    wall_stats = WallTimeStats()
+    resource_model = ResourceModel()
+    # Straggler detection compares running tasks against wall times of similar configs, and of all configs.
+    # Running tasks are tracked by submission time, and speculative duplicates by their local output.
+    all_walls = WallTimeHistogram()
+    similar_walls = {}
+    similar = {}
+    submitted_at = {}
+    duplicates = {}
+    twins = {}
+    cancelled = {}
+    speculation = {"exhausted": False, "drained": None}
+    cost_model = CostModel()
+    # Rows of logs written without categories get theirs from the configs they ran, looked for next to the log and
+    # where this run reads its configs from.
+    directories = config_directories(configList, logPrefix + "_staged" if staged else None)
+    for h in (history or []) + ([usagelog] if resume and os.path.isfile(usagelog) else []):
+        wall_stats.add_usage_log(h)
+        searched = [os.path.dirname(h) or "."] + directories
+        if categories:
+            resource_model.add_usage_log(h, searched, category_keys)
+        if order == "longest":
+            cost_model.add_usage_log(h, searched, category_keys)
+        if speculate is not None:
+            for category, wall in read_wall_times(h, searched, category_keys):
+                all_walls.add(wall)
+                if category is not None:
+                    similar_walls.setdefault(category, WallTimeHistogram()).add(wall)
+
+    # Order submission: every config up front without a window, otherwise ORDER_LOOKAHEAD configs at a time.
+    if order != "listed":
+        lookahead = ORDER_LOOKAHEAD if window != 0 else 0
+        write_message("i", "Ordering tasks for submission (%s%s)." % (
+            order, ", %d configs at a time" % lookahead if lookahead else ""), log)
+        pending = order_configs(pending, order, cost_model, category_keys, lookahead)
+
+    # Task state is committed to the journal, so the all-task log is block (rather than line) buffered. The complete &
+    # failed logs are line buffered, so they agree with the journal if the master is killed.
+    with open(alltlog, 'a+') as allt, open(completetlog, 'a+', 1) as completet, open(failedtlog, 'a+', 1) as failedt:
+
+        def fail(details, tag):
+            """Record a failed task, and schedule its resubmission if under the retry limit."""
+            details[3] += 1
+            metrics.add_failed()
+            journal.record(FAILED, details[0], details[3])
+            failedt.write("%s\t%s\t%s\n" % (details[0], tag, str(details[3])))
+            if details[3] <= retry:
+                delay = retry_delay(details[3], retry_backoff, retry_backoff_max)
+                log.task("w", "retry", "... retrying %(output)s in %(delay)ss (retry %(attempt)s of %(retry)s).",
+                         output=details[0], delay=delay, attempt=details[3], retry=retry)
+                heapq.heappush(retries, (clock.time() + delay, details[0], details))
+
+        def finish(details, return_status, checksum=None, size=None, location=None):
+            """Check a returned config's status & output (in the store, if storing), and record it (with any checksum,
+            size & stored location) as complete or failed."""
+            expect = details[0]
+            tag = details[2]
+            produced = expect if store is None else location
+            if validate and return_status == VALIDATION_FAILED:
+                log.task("w", "invalid", "... failure (output %(output)s failed validation).", output=expect)
+                fail(details, tag)
+            elif return_status != 0:
+                # Task failed. Write to failed task log, retry if under retry limit.
+                log.task("w", "failed", "... failure (return code %(status)s): %(output)s.", output=expect,
+                         status=return_status)
+                fail(details, tag)
+            elif produced is not None and os.path.exists(produced):
+                # Task succeeded & output exists. Write to complete task log.
+                log.task("i", "complete", "... success: %(output)s.", output=expect)
+                if location is not None:
+                    completet.write("%s\t%s\t%s\t%s\t%s\n" % (expect, tag, checksum, size, location))
+                elif checksum is not None:
+                    completet.write("%s\t%s\t%s\n" % (expect, tag, checksum))
+                else:
+                    completet.write("%s\t%s\n" % (expect, tag))
+                metrics.add_complete()
+                journal.record(COMPLETE, expect, tag)
+                unstage(details)
+                # Cache before archiving, the archiver removes the output. Stored outputs stay at their location.
+                if cache is not None and details[5] is not None:
+                    try:
+                        cache.store(details[5], produced)
+                    except (IOError, OSError) as e:
+                        write_message("w", "Output '%s' could not be cached (%s)." % (expect, str(e)), log)
+                if store is None:
+                    archiver.add(expect, produced)
+            else:
+                # Output is missing, alert user and write to failed tasks.
+                log.task("w", "missing", "... failure. (missing output %(output)s).", output=expect)
+                fail(details, tag)
+
+        def reuse(details):
+            """Record a config completed from the result cache (fetched into the store, if storing)."""
+            log.task("i", "cached", "Task complete from cache: %(command)s", output=details[0], command=details[2])
+            if store is None:
+                completet.write("%s\t%s\n" % (details[0], details[2]))
+            else:
+                location = stored_path(store, details[0])
+                completet.write("%s\t%s\t-\t%s\t%s\n" % (details[0], details[2], os.path.getsize(location), location))
+            metrics.add_complete()
+            journal.record(COMPLETE, details[0], "cache:%s" % details[5])
+            if store is None:
+                archiver.add(details[0])
+            unstage(details)
+
+        def unstage(details):
+            """Remove a completed config materialized from a packed store or sweep spec."""
+            if staged and os.path.exists(details[1]):
+                os.remove(details[1])
+
+        def submit_single(details, priority=0, local_output=None):
+            """Build a task for one config (through the worker-side driver, if validating or storing) and submit it."""
+            cmd = details[2]
+            statusf = None
+            if validate or store is not None:
+                cmd = worker_command(klipReduce, [details], status_name(details[0]), validate=validate, store=store)
+                statusf = (details[0] if local_output is None else local_output) + ".status"
+            t = create_task(q, cmd, details[1], details[0], priority=priority, shared=shared,
+                            local_output=local_output, statusf=statusf, store=store)
+            specify_resources(t, details[4], resource_model.predict(details[4]) if details[4] is not None else None)
+            taskid = q.submit(t)
+            task_details[taskid] = details
+            if statusf is not None:
+                statuses[taskid] = statusf
+            return taskid
+
+        def submit(members, priority=0):
+            """Build a task, or a bundle task, for one or more configs and submit it to the queue."""
+            if len(members) == 1:
+                taskid = submit_single(members[0], priority)
+                if speculate is not None:
+                    submitted_at[taskid] = clock.time()
             else:
-                complete_count += 1
+                predicted = [resource_model.predict(m[4]) for m in members if m[4] is not None]
+                t, archive, statusf = create_bundle_task(q, klipReduce, members, bundle_jobs, shared, validate,
+                                                         store)
+                # Concurrently running configs of a bundle need the resources of the largest, each.
+                if categories and None not in predicted:
+                    scale = min(bundle_jobs, len(members))
+                    predicted = (scale * max([p[0] for p in predicted]), scale * max([p[1] for p in predicted]))
+                    specify_resources(t, "bundle", predicted)
+                bundles[q.submit(t)] = [archive, statusf, members]
+            for m in members:
+                journal.record(SUBMITTED, m[0], m[3])
+
+        def in_flight():
+            """Tasks counted against the submission window."""
+            return len(task_details) + len(bundles) + len(retries)
+
+        def top_up():
+            """Resubmit retries that are due, then submit tasks from the config list until the window is full."""
+            submitted = 0
+            # Retries jump the queue, so a late failure does not set the run's tail.
+            while retries and retries[0][0] <= clock.time():
+                details = heapq.heappop(retries)[2]
+                submit([details], priority=details[3])
+                submitted += 1
+
+            limit = window_size(window, q)
+            size = bundle_size(bundle, wall_stats)
+            while limit is None or in_flight() < limit:
+                # Read the next task, or bundle of tasks, from the config list.
+                members = []
+                for cfg, outf in pending:
+                    # Specify command.
+                    command = "%s -c %s" % (klipReduce, os.path.basename(cfg))
+                    category = category_key(read_config(cfg), category_keys) if categories else None
+                    details = [outf, cfg, command, 0, category, None]
+
+                    # If not resuming, add job to _all.log.
+                    if not resume:
+                        allt.write("%s\t%s\n" % (outf, command))
+
+                    # Complete from the result cache if an identical config was run before.
+                    if cache is not None:
+                        details[5] = cache.key(cfg)
+                        if cache.fetch(details[5], outf if store is None else stored_path(store, outf)):
+                            reuse(details)
+                            continue
+                    members.append(details)
+                    if len(members) >= size:
+                        break
+                if len(members) == 0:
+                    speculation["exhausted"] = True
+                    break
+
+                # Build & submit task.
+                submit(members)
+                submitted += len(members)
+            return submitted
+
+        submit_count += top_up()
 
         # Write successful launch information.
-        write_message("i", "Findr launched successfully!", logfile)
-        print_info(str(q.port), str(get_ip()))
-        write_message("i", "%s tasks submitted to queue." % str(submit_count), logfile)
+        write_message("i", "Findr launched successfully!", log)
+        if executor == "workqueue":
+            print_info(str(q.port), str(get_ip()))
+        if window == 0:
+            write_message("i", "%s tasks submitted to queue." % str(submit_count), log)
+        else:
+            write_message("i", "%s tasks submitted to queue, remaining tasks will be streamed as tasks complete."
+                          % str(submit_count), log)
         if resume:
-            write_message("i", "%s tasks already complete." % str(complete_count), logfile)
-
-        # Monitor queue, alert user to status, compress and remove files at specified threshold.
-        if monitoring and not resume:
+            write_message("i", "%s tasks already complete." % str(already), log)
+        if cache is not None:
+            write_message("i", "%s tasks complete from cache so far." % str(cache.hits), log)
+
+        # Monitor queue, alert user to status, hand completed outputs to the archiver.
+        # The usage log is line buffered, and its header is written to a new (or empty) log even when resuming, so the
+        # log of a run killed before it wrote anything is still readable.
+        if monitoring:
             use_log = open(usagelog, 'a+', 1)
+            use_log.seek(0, os.SEEK_END)
+        if monitoring and use_log.tell() == 0:
             use_log.write("TaskID\tCommand\tStart\tEnd\tExitStatus\t"
                           "CPUTime\tWallTime\tCores\tVirtualMemory\tSwapMemory\t"
                           "TotalProcesses\tMaxConcurrentProcesses\tBytesRead\tBytesWritten\t"
                           "WorkersConnected\tWorkersBusy\tWorkersIdle\tWorkersRemoved\t"
-                          "TasksComplete\tTasksRunning\tTasksWaiting\tTotalExecuteTime\n")
-
-        write_worker_report(q, logfile)
-        tries = 0
-        while not q.empty():
-            tries += 1
-            t = q.wait(6)
-            # Write report of worker conditions
-            if not tries % 10:
-                write_worker_report(q, logfile)
-            # If tasks have returned.
-            if t:
-                # Print return message.
-                write_message("i", "Task (id# %d) complete: %s (return code %d)" % (t.id, t.command, t.return_status),
-                              logfile)
-                if monitoring:
-                    use_log.write(write_task_report(t, q))
-
-                # Check that task is actually complete.
-                expect = task_details[t.id][0]
-                if t.return_status != 0:
-                    # Task failed. Write to failed task log.
-                    write_message("w", "... failure (return code %s)." % str(t.return_status), logfile)
-                    all_tasks[expect][1] = "failed"
-                    all_tasks[expect][2] += 1
-                    if all_tasks[expect][2] <= retry:
-                        # Todo: Resubmit task to queue, if under retry limit.
-                        failedt.write("%s\t%s\t%s\n" % (expect, t.tag, str(all_tasks[expect][2])))
-                    else:
-                        failedt.write("%s\t%s\t%s\n" % (expect, t.tag, str(all_tasks[expect][2])))
-                else:
-                    # Task succeeded. Check for valid output.
-                    if os.path.exists(expect):
-                        # Task succeeded & output exists. Write to complete task log.
-                        write_message("i", "... success.", logfile)
-                        completet.write("%s\t%s\n" % (expect, t.tag))
-                        all_tasks[expect][1] = "complete"
-                        if expect not in done:
-                            done.append(expect)
-                        else:
-                            write_message("w", "Task %s complete, but '%s' already existed." % (str(t.id), expect),
-                                          logfile)
+                          "TasksComplete\tTasksRunning\tTasksWaiting\tTotalExecuteTime\tCategory\tSpeculative\n")
+
+        def similar_key(details):
+            """Get the key grouping a config with similar configs for straggler detection (its resource category)."""
+            if details[4] is not None:
+                return details[4]
+            if details[0] not in similar:
+                similar[details[0]] = category_key(read_config(details[1]), category_keys)
+            return similar[details[0]]
+
+        def discard(local):
+            """Remove a speculative duplicate's local output (or a status file), if it was retrieved."""
+            if local is not None and os.path.exists(local):
+                os.remove(local)
+
+        def speculate_stragglers():
+            """Submit speculative duplicates of straggling tasks, once every config is submitted and none wait."""
+            if not speculation["exhausted"] or retries or q.stats.tasks_waiting > 0:
+                speculation["drained"] = None
+                return
+            now = clock.time()
+            if speculation["drained"] is None:
+                speculation["drained"] = now
+            budget = q.stats.workers_idle
+            for taskid, submitted in submitted_at.items():
+                if budget <= 0:
+                    break
+                if taskid in twins:
+                    continue
+                details = task_details[taskid]
+                walls = similar_walls.get(similar_key(details))
+                if walls is None or walls.count < SPECULATE_MIN_SAMPLES:
+                    walls = all_walls
+                if walls.count < SPECULATE_MIN_SAMPLES:
+                    continue
+                # Start times are unknown, but a task has run at least since it was submitted and the queue drained.
+                elapsed = now - max(submitted, speculation["drained"])
+                limit = walls.quantile(speculate / 100.0)
+                if elapsed <= limit:
+                    continue
+                local = details[0] + SPECULATIVE_SUFFIX
+                duplicate = submit_single(details, priority=1, local_output=local)
+                duplicates[duplicate] = local
+                twins[duplicate] = taskid
+                twins[taskid] = duplicate
+                budget -= 1
+                log.task("w", "speculated", "Task (id# %(task)d) straggling (%(elapsed).1fs, p%(percentile)s of "
+                         "similar configs is %(limit).1fs): speculative copy (id# %(copy)d) submitted.", task=taskid,
+                         output=details[0], elapsed=elapsed, percentile=speculate, limit=limit, copy=duplicate)
+
+        def intake(t):
+            """Take in a returned task: log its usage, and check each config it ran is actually complete."""
+            # A copy cancelled after it had already finished, its twin has completed the config.
+            if t.id in cancelled:
+                discard(cancelled.pop(t.id))
+                return
+
+            # Record return.
+            log.task("i", "returned", "Task (id# %(task)d) complete: %(command)s (return code %(status)d)", task=t.id,
+                     command=t.command, status=t.return_status)
+            if monitoring:
+                use_log.write(write_task_report(t, q, None if t.id in bundles else task_details[t.id][4],
+                                                t.id in duplicates))
+            metrics.add_task(t)
+
+            if t.id in bundles:
+                archive, statusf, members = bundles.pop(t.id)
+                results = unpack_bundle(members, archive, statusf, log)
+                for m in members:
+                    # Configs the driver did not report on failed with the bundle.
+                    unreported = (t.return_status or -1, 0, None, None, None)
+                    status, wall, checksum, size, location = results.get(m[0], unreported)
+                    wall_stats.add(wall)
+                    metrics.add_wall_time(wall)
+                    finish(m, status, checksum, size, location)
+            else:
+                details = task_details.pop(t.id)
+                submitted_at.pop(t.id, None)
+                local = duplicates.pop(t.id, None)
+                twin = twins.pop(t.id, None)
+                result = (t.return_status, 0, None, None, None)
+                statusf = statuses.pop(t.id, None)
+                if statusf is not None:
+                    try:
+                        result = read_status(statusf, [details[0]]).get(details[0], result)
+                    except (IOError, OSError, ValueError):
+                        pass
+                    discard(statusf)
+                checksum, size, location = result[2:]
+                produced = location if store is not None else (details[0] if local is None else local)
+                if monitoring and t.return_status == 0:
+                    wall_stats.add(t.resources_measured.wall_time)
+                    metrics.add_wall_time(t.resources_measured.wall_time)
+                    if details[4] is not None:
+                        resource_model.add(details[4], t.resources_measured.cores,
+                                           t.resources_measured.virtual_memory)
+                    if speculate is not None:
+                        all_walls.add(t.resources_measured.wall_time)
+                        similar_walls.setdefault(similar_key(details), WallTimeHistogram()).add(
+                            t.resources_measured.wall_time)
+
+                # Of a straggler & its speculative copy, the first to succeed wins and the other is cancelled.
+                if twin is not None:
+                    twins.pop(twin, None)
+                    if t.return_status != 0 or produced is None or not os.path.exists(produced):
+                        log.task("w", "failed", "... failure (return code %(status)s): %(output)s, copy (id# %(copy)d) "
+                                 "still running.", output=details[0], status=t.return_status, copy=twin)
+                        discard(local)
+                        return
+                    q.cancel(twin)
+                    task_details.pop(twin, None)
+                    submitted_at.pop(twin, None)
+                    cancelled[twin] = duplicates.pop(twin, None)
+                    discard(cancelled[twin])
+                    discard(statuses.pop(twin, None))
+                    log.task("i", "cancelled", "... %(winner)s copy finished first, copy (id# %(copy)d) cancelled.",
+                             output=details[0], winner="speculative" if local is not None else "original", copy=twin)
+                if local is not None and os.path.exists(local):
+                    if t.return_status == 0:
+                        os.rename(local, details[0])
                     else:
-                        # Output is missing, alert user and write to failed tasks.
-                        write_message("w", "... failure. (missing output %s)." % str(t.expect), logfile)
-                        all_tasks[expect][1] = "failed"
-                        all_tasks[expect][2] += 1
-                        if all_tasks[expect][2] <= retry:
-                            # Todo: Resubmit task to queue, if under retry limit.
-                            failedt.write("%s\t%s\t%s\n" % (expect, t.tag, str(all_tasks[expect][2])))
-                        else:
-                            failedt.write("%s\t%s\t%s\n" % (expect, t.tag, str(all_tasks[expect][2])))
-
-                # Check if compression threshold is met, if true gzip & tar then remove uncompressed versions.
-                if len(done) >= compress_threshold:
-                    compress_remove(done, "%s%s.tar.gz" % (batch_root, str(batch_count)), logfile)
-                    batch_count += 1
-                    done = []
+                        discard(local)
+                similar.pop(details[0], None)
+                finish(details, t.return_status, checksum, size, location)
+
+        def flush_logs():
+            """Flush the text logs & message records."""
+            for f in [allt, completet, failedt] + ([use_log] if monitoring else []):
+                f.flush()
+            log.flush()
+
+        def report():
+            """Summarize task events since the last report, and report on the queue."""
+            log.summary()
+            write_worker_report(q, log)
+
+        def publish_metrics():
+            """Update the live metrics snapshot, and rewrite the metrics file."""
+            snapshot = metrics.update(q)
+            if metrics_file is not None:
+                try:
+                    write_metrics_file(metrics_file, snapshot)
+                except (IOError, OSError) as e:
+                    write_message("w", "Metrics file could not be written (%s)." % str(e), log)
+
+        # Schedule periodic actions; result intake runs in between, as results arrive.
+        schedule = EventSchedule(clock)
+        if publish:
+            publish_metrics()
+            schedule.every(metrics_interval, publish_metrics)
+        schedule.every(report_interval, report)
+        schedule.every(journal.commit_interval, journal.commit)
+        schedule.every(LOG_FLUSH_INTERVAL, flush_logs)
+        schedule.every(TOP_UP_INTERVAL, top_up)
+        if speculate is not None:
+            schedule.every(SPECULATE_INTERVAL, speculate_stragglers)
+
+        write_worker_report(q, log)
+        while not q.empty() or retries:
+            if q.empty():
+                # Only backed-off retries remain, sleep until the next one is due.
+                clock.sleep(min(schedule.time_to_next(), max(0, retries[0][0] - clock.time())))
+            else:
+                # Take in results as a burst, until none are waiting or a scheduled action is due.
+                t = q.wait(int(math.ceil(schedule.time_to_next())))
+                if t:
+                    while t:
+                        intake(t)
+                        t = q.wait(0) if schedule.time_to_next() > 0 else None
+                    # Refill the submission window as soon as a burst frees slots.
+                    top_up()
+            schedule.run_due()
         # Compress any remaining outputs.
-        if len(done) > 0:
-            compress_remove(done, "%s%s.tar.gz" % (batch_root, str(batch_count)), logfile)
+        archiver.close()
+        if publish:
+            publish_metrics()
 
+    journal.close()
     if monitoring:
         use_log.close()
-    write_message("i", "All tasks complete!", logfile)
+    if server is not None:
+        server.close()
+    q.shutdown()
+    write_message("i", "All tasks complete!", log)
+    log.close()
     return 1
 
 
-if __name__ == "__main__":
-    # Record start time.
-    stime = datetime.now()
+def write_merged_report(snapshot, logfile):
+    """Write merged status report.
 
-    # Parse command line arguments.
+    Writes a summary of a sharded run from its merged metrics (see findr_shard.merge_metrics()), including worker stats
+    (connected, busy, idle, and lost) and tasks (done, failed, running, waiting) over all shards, and the progress of
+    each shard. Writes using write_message().
+
+    Args:
+        snapshot (dict): Merged metrics snapshot, empty (nothing is written) if no metrics have been merged yet.
+        logfile (str -or- None): Open log file for write_message(), or None for stdout.
+
+    Return:
+        int: Always returns 1.
+
+    """
+    if not snapshot:
+        return 1
+    w = snapshot["workers"]
+    t = snapshot["tasks"]
+    eta = snapshot["eta_seconds"]
+    write_message("i", "Sharded Status Report (time elapsed %ss):" % str(int(snapshot["elapsed"])), logfile)
+    write_message("i", "... Workers: connected(%s), busy(%s), idle(%s), lost(%s)."
+                  % (w["connected"], w["busy"], w["idle"], w["lost"]), logfile)
+    write_message("i", "... Tasks: done(%s/%s), failed(%s), running(%s), waiting(%s)."
+                  % (t["done"], t["total"] if t["total"] is not None else "?", t["failed"], t["running"],
+                     t["waiting"]), logfile)
+    write_message("i", "... Throughput: %.1f/min, ETA %s." % (snapshot["completions_per_minute"],
+                                                            "%ss" % int(eta) if eta is not None else "unknown"),
+                  logfile)
+    for shard in snapshot["shards"]:
+        if shard["reporting"]:
+            write_message("i", "... Shard %s: done(%s/%s), failed(%s), running(%s)."
+                          % (shard["shard"], shard["done"], shard["total"], shard["failed"], shard["running"]),
+                          logfile)
+        else:
+            write_message("i", "... Shard %s: not reporting." % shard["shard"], logfile)
+    return 1
+
+
+def runShards(configList, logPrefix, shards, argv, resume=False, port=None, logfile=None, report_interval=60.0,
+              metrics_file=None, metrics_port=None, metrics_interval=10.0):
+    """ Run Findr sharded.
+
+    Splits a config list across several findr_reduce master processes ("shards"), each listening for workers on its
+    own port (port + shard number) with its own logs, journal and batch archives (<prefix>_shard<n>*), so result
+    intake, output transfers and logging are spread over processes. Shards publish metrics files, merged into a single
+    status report and metrics file. Resuming resumes every shard from its own journal.
+
+    Args:
+        configList (str): Path to config file (see examples/configs.list).
+        logPrefix (str): Prefix for shard config lists and logs.
+        shards (int): Number of shards.
+        argv (list): Command line arguments, passed through to each shard (see findr_shard.shard_arguments()).
+        resume (bool, optional): Resume every shard of a previous sharded run. Default = False.
+        port (int -or- None, optional): Port of the first shard, 0 for any available ports. Default = None
+            (WorkQueue default).
+        logfile (file -or- None, optional): Open file object to write messages, or None for stdout. Default = None.
+        report_interval (float, optional): Seconds between merged status reports. Default = 60.0.
+        metrics_file (str -or- None, optional): JSON file rewritten with merged metrics, or None. Default = None.
+        metrics_port (int -or- None, optional): Local port serving merged metrics over HTTP, or None. Default = None.
+        metrics_interval (float, optional): Seconds between metrics updates, of shards and merged. Default = 10.0.
+
+    Return:
+        int: Number of shards that exited with errors.
+
+    """
+    port = DEFAULT_PORT if port is None else port
+    if resume:
+        write_message("i", "Resuming %s shards of '%s'." % (str(shards), configList), logfile)
+    else:
+        counts = split_config_list(configList, logPrefix, shards)
+        write_message("i", "Split '%s' into %s shards of %s configs." % (configList, str(shards),
+                                                                      "/".join([str(c) for c in counts])), logfile)
+
+    # Launch shards, each writing its messages to <prefix>_shard<n>_messages.log. If the coordinator fails, the shards
+    # still running are terminated rather than left running unwatched.
+    passed = shard_arguments(argv, configList)
+    procs = []
+    merged = MergedMetrics(logPrefix, shards)
+    server = None
+    try:
+        for k in range(shards):
+            cmd = [sys.executable, os.path.abspath(__file__), shard_list(logPrefix, k)] + passed + \
+                  ["--port", str(port + k if port else 0), "--batch-root", shard_prefix(logPrefix, k) + "_batch",
+                   "--metrics", shard_metrics(logPrefix, k), "--metrics-interval", str(metrics_interval)]
+            messages = shard_prefix(logPrefix, k) + "_messages.log"
+            with open(messages, 'a') as m:
+                procs.append(subprocess.Popen(cmd, stdout=m, stderr=subprocess.STDOUT))
+            write_message("i", "Shard %s launched (pid %s) on port %s, messages in %s."
+                          % (str(k), str(procs[-1].pid), str(port + k if port else "any"), messages), logfile)
+
+        # Merge shard metrics into status reports, the metrics file and endpoint.
+        if metrics_port is not None:
+            try:
+                server = MetricsServer(merged, metrics_port)
+                server.start()
+                write_message("i", "Serving merged metrics @ http://127.0.0.1:%s/." % str(server.port), logfile)
+            except socket.error as e:
+                write_message("w", "Metrics endpoint failed to start on port %s (%s)." % (str(metrics_port), str(e)),
+                              logfile)
+
+        def publish_metrics():
+            """Merge shard metrics, and rewrite the merged metrics file."""
+            snapshot = merged.update()
+            if metrics_file is not None:
+                try:
+                    write_metrics_file(metrics_file, snapshot)
+                except (IOError, OSError) as e:
+                    write_message("w", "Metrics file could not be written (%s)." % str(e), logfile)
+
+        def report():
+            """Merge the latest shard metrics, and write a merged status report."""
+            write_merged_report(merged.update(), logfile)
+
+        # Merge once up front, so the metrics file & endpoint have a snapshot before the first metrics interval.
+        publish_metrics()
+        schedule = EventSchedule()
+        schedule.every(metrics_interval, publish_metrics)
+        schedule.every(report_interval, report)
+        while any([p.poll() is None for p in procs]):
+            time.sleep(min(schedule.time_to_next(), 1.0))
+            schedule.run_due()
+
+        publish_metrics()
+        write_merged_report(merged.snapshot(), logfile)
+    finally:
+        running = [k for k, p in enumerate(procs) if p.poll() is None]
+        if running:
+            write_message("e", "Coordinator failed, terminating shard(s) %s." % ", ".join([str(k) for k in running]),
+                          logfile)
+            for k in running:
+                procs[k].terminate()
+            for k in running:
+                procs[k].wait()
+        if server is not None:
+            server.close()
+    failed = [str(k) for k, p in enumerate(procs) if p.returncode != 0]
+    if len(failed) > 0:
+        write_message("w", "Shard(s) %s exited with errors, see their message logs. Resume with -r to continue."
+                      % ", ".join(failed), logfile)
+    else:
+        write_message("i", "All shards complete!", logfile)
+    return len(failed)
+
+
+def build_parser():
+    """Build the findr_reduce command line argument parser."""
     parser = argparse.ArgumentParser()
     # ... required argument(s).
-    parser.add_argument("config", type=str, help="Configuration/outputs list (e.g. configs.list).")
+    parser.add_argument("config", type=str,
+                        help="Configuration/outputs list (e.g. configs.list), packed config store (e.g. configs.pack) "
+                             "or sweep spec (e.g. example.cfg).")
     # ... optional argument(s).
     parser.add_argument("-k", "--klip", type=str, default="klipReduce", help="klipReduce path.")
     parser.add_argument("-r", "--resume", action="store_true", help="Resume an already partially complete job.")
     parser.add_argument("--retry-failed", type=int, default=0, help="Number of times to retry failed/incomplete jobs.")
+    parser.add_argument("--retry-backoff", type=float, default=10.0,
+                        help="Seconds before the first retry of a failed job, doubling per retry (default 10).")
+    parser.add_argument("--retry-backoff-max", type=float, default=300.0,
+                        help="Maximum seconds between retries of a failed job (default 300).")
+    parser.add_argument("--bundle", type=parse_bundle, default=1,
+                        help="Configs packed into each task: an integer, or 'auto' to size bundles from measured "
+                             "per-config wall times (default 1, no bundling).")
+    parser.add_argument("--bundle-jobs", type=int, default=1,
+                        help="Configs each bundle runs concurrently on its worker (default 1).")
+    parser.add_argument("--history", type=str, nargs="+", default=None,
+                        help="Usage logs of earlier runs (<prefix>_usage.log), used to size bundles.")
+    parser.add_argument("--cache-inputs", action="store_true",
+                        help="Send the shared inputs named in configs (directory, qualityFile, maskFile, fakeFileName) "
+                             "to workers as cached inputs, instead of relying on a shared filesystem.")
+    parser.add_argument("--categories", action="store_true",
+                        help="Label tasks with resource categories, and request the cores & memory measured for each "
+                             "category in --history usage logs.")
+    parser.add_argument("--category-keys", type=str, nargs="+", default=None,
+                        help="Config parameters defining resource categories (default Nmodes includeRefNum "
+                             "maxRadius).")
+    parser.add_argument("--report-interval", type=float, default=60.0,
+                        help="Seconds between queue status reports (default 60).")
+    parser.add_argument("--metrics", type=str, default=None,
+                        help="JSON file rewritten with live run metrics (workers, tasks, throughput, wall times, ETA).")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve live run metrics as JSON over HTTP on this local port.")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="Seconds between metrics updates (default 10).")
+    parser.add_argument("--result-cache", type=str, default=None,
+                        help="Result cache directory: configs matching an earlier result (same parameters, excluding "
+                             "the output name, and same input content) reuse it instead of running.")
+    parser.add_argument("--speculate", type=parse_percentile, default=None,
+                        help="Once all tasks are submitted, duplicate tasks running longer than this percentile "
+                             "(e.g. 95) of wall times of similar configs, keeping whichever copy finishes first.")
+    parser.add_argument("--order", type=str, default="listed", choices=ORDER_POLICIES,
+                        help="Submission order: as listed, longest predicted first (from --history usage logs), or "
+                             "round-robin over resource categories (default listed). Orders other than listed read "
+                             "every config into memory before submitting, or with --window, %d configs at a time."
+                             % ORDER_LOOKAHEAD)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="Port to listen for workers on, 0 for any available port (default %d)." % DEFAULT_PORT)
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split the config list across this many master processes, listening on consecutive "
+                             "ports from --port, each with its own logs, journal and batches (default 1).")
+    parser.add_argument("--status", action="store_true",
+                        help="Print the merged status of a sharded run (with --shards) and exit.")
+    parser.add_argument("--batch-root", type=str, default="batch",
+                        help="Root of batch archive names (default batch).")
+    parser.add_argument("--validate", action="store_true",
+                        help="Validate outputs' FITS structure on the worker and log their checksums.")
+    parser.add_argument("--store", type=str, default=None,
+                        help="Shared store directory workers publish outputs to, instead of returning them.")
+    parser.add_argument("--task-log", action="store_true",
+                        help="Write a message line for every task returned, completed or cached (default: only "
+                             "warnings, and a summary with each status report).")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="Number of completed outputs per compressed batch (default 100).")
+    parser.add_argument("--compress-level", type=int, default=None,
+                        help="Compression level of batches, 1 (fastest) to 9 (smallest) for gzip or 22 for zstd "
+                             "(default 9 for gzip, 3 for zstd).")
+    parser.add_argument("--codec", type=str, default="gzip", choices=sorted(CODECS.keys()),
+                        help="Compression codec of batches (default gzip).")
+    parser.add_argument("--compress-threads", type=int, default=None,
+                        help="Threads compressing each batch (default all cores).")
     parser.add_argument("-o", "--output", type=str, default=None, help="Write output to file (default stdout).")
-    # ... parse args.
-    args = parser.parse_args()
+    parser.add_argument("-e", "--executor", type=str, default="workqueue", choices=sorted(EXECUTORS.keys()),
+                        help="Execution backend (default workqueue).")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Number of local processes for the local executor (default all cores).")
+    parser.add_argument("--window", type=parse_window, default=0,
+                        help="Maximum tasks in flight, streamed from the config list as tasks complete: an integer, "
+                             "or 'auto' to size from connected workers (default 0, submit all tasks up front).")
+    return parser
+
+
+def run_options(args):
+    """Get the runFindr() options (other than the config list, log prefix & log file) of parsed arguments."""
+    return dict(klipReduce=args.klip, resume=args.resume, retry=args.retry_failed, executor=args.executor,
+                workers=args.workers, window=args.window, retry_backoff=args.retry_backoff,
+                retry_backoff_max=args.retry_backoff_max, batch_size=args.batch_size,
+                compresslevel=args.compress_level, bundle=args.bundle, bundle_jobs=args.bundle_jobs,
+                history=args.history, cache_inputs=args.cache_inputs, categories=args.categories,
+                category_keys=args.category_keys, report_interval=args.report_interval, metrics_file=args.metrics,
+                metrics_port=args.metrics_port, metrics_interval=args.metrics_interval,
+                result_cache=args.result_cache, codec=args.codec, compress_threads=args.compress_threads,
+                speculate=args.speculate, order=args.order, port=args.port, batch_root=args.batch_root,
+                validate=args.validate, store=args.store, task_log=args.task_log)
+
+
+if __name__ == "__main__":
+    # Record start time.
+    stime = datetime.now()
+
+    # Parse command line arguments.
+    args = build_parser().parse_args()
 
     # Print first message.
     write_message("i", "Findr starting.")
 
+    # Confirm the compression codec is usable.
+    codec_error = check_codec(args.codec, args.compress_level)
+    if codec_error is not None:
+        write_message("e", "Compression codec unavailable: %s." % codec_error)
+        exit(1)
+
     # Confirm config file exists.
     if not os.path.isfile(args.config):
         write_message("e", "Config file does not exist.")
         exit(1)
 
+    # Confirm a sweep spec can be read (evaluating its constraints).
+    try:
+        count_entries(args.config)
+    except ValueError as e:
+        write_message("e", "Invalid sweep spec: %s." % e)
+        exit(1)
+
     # Define log prefix, check for existing log files.
     log_prefix = args.config.rsplit(".", 1)[0]
     log_status = check_logs(log_prefix)
-    if args.resume:
-        if len(log_status[1]) > 0:
-            write_message("e", "Existing log file(s) could not be found: %s." % ", ".join(log_status[1]))
+    if args.shards > 1:
+        # Shards check their own logs, the coordinator only needs the shard config lists (or their absence).
+        lists = [shard_list(log_prefix, k) for k in range(args.shards)]
+        if args.status:
+            write_merged_report(MergedMetrics(log_prefix, args.shards).update(), None)
+            exit(0)
+        if args.resume and not all([os.path.isfile(l) for l in lists]):
+            write_message("e", "Shard config list(s) could not be found: %s."
+                          % ", ".join([l for l in lists if not os.path.isfile(l)]))
+            exit(1)
+        if not args.resume and any([os.path.isfile(l) for l in lists]):
+            write_message("e", "Existing shard config lists exist. Please move or remove: %s."
+                          % ", ".join([l for l in lists if os.path.isfile(l)]))
+            exit(1)
+    elif args.status:
+        write_message("e", "--status reports on sharded runs, please give the number of --shards.")
+        exit(1)
+    elif args.resume:
+        # The journal & message records are optional when resuming, runs predating the journal resume from the
+        # complete task log.
+        missing = [l for l in log_status[1] if not l.endswith(("_journal.log", "_messages.jsonl"))]
+        if len(missing) > 0:
+            write_message("e", "Existing log file(s) could not be found: %s." % ", ".join(missing))
             exit(1)
     else:
         if len(log_status[0]) > 0:
@@ -461,9 +1847,15 @@ if __name__ == "__main__":
     else:
         log_out = None
 
-    # Run Findr.
-    runFindr(configList=args.config, klipReduce=args.klip, logPrefix=log_prefix,
-             resume=args.resume, retry=args.retry_failed, logfile=log_out)
+    # Run Findr, sharded or in this process.
+    if args.shards > 1:
+        shard_errors = runShards(configList=args.config, logPrefix=log_prefix, shards=args.shards,
+                                 argv=sys.argv[1:], resume=args.resume, port=args.port, logfile=log_out,
+                                 report_interval=args.report_interval, metrics_file=args.metrics,
+                                 metrics_port=args.metrics_port, metrics_interval=args.metrics_interval)
+    else:
+        shard_errors = 0
+        runFindr(configList=args.config, logPrefix=log_prefix, logfile=log_out, **run_options(args))
 
     # Print concluding message.
     write_message("i", "Findr complete!", log_out)
@@ -476,3 +1868,5 @@ if __name__ == "__main__":
 
     # Print final message.
     write_message("i", "Done.")
+    if shard_errors > 0:
+        exit(1)
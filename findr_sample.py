@@ -0,0 +1,194 @@
+from findr_sweep import GENERATE_CHUNK
+
+import random
+
+# # # # SWEEP SAMPLING  # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                             #
+# Rather than every point of a sweep, a budget of N points can be drawn from  #
+# it by uniform random, Latin hypercube or Sobol sampling. Each block of the  #
+# sweep (a parameter, with its linked parameters, or a group of parameters    #
+# joined by constraints, see findr_sweep.prune()) is one dimension of the     #
+# unit hypercube, split evenly between its valid values or combinations, so   #
+# linked parameters stay linked and constraints still hold.                   #
+#                                                                             #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# Sobol direction numbers of dimensions 2, 3, ... (Joe & Kuo, new-joe-kuo-6.21201): (degree s, polynomial
+# coefficients a, initial direction numbers m). Dimension 1 is the van der Corput sequence.
+SOBOL_DIRECTIONS = [
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)),
+    (6, 22, (1, 3, 1, 15, 13, 25)),
+    (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)),
+    (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+]
+
+# Bits of precision of Sobol points (so at most 2 ** SOBOL_BITS points).
+SOBOL_BITS = 32
+
+
+def uniform_points(n, dimensions, rng):
+    """Draw n uniform random points of the unit hypercube."""
+    return [[rng.random() for _ in range(dimensions)] for _ in range(n)]
+
+
+def latin_hypercube_points(n, dimensions, rng):
+    """Draw n points of the unit hypercube by Latin hypercube sampling: each dimension is split into n equal strata,
+    and each stratum holds exactly one point (at a random position within it)."""
+    columns = []
+    for _ in range(dimensions):
+        strata = list(range(n))
+        rng.shuffle(strata)
+        columns.append([(s + rng.random()) / n for s in strata])
+    return [list(point) for point in zip(*columns)]
+
+
+def sobol_directions(dimension):
+    """Get the SOBOL_BITS direction integers of a Sobol sequence dimension (0-based)."""
+    if dimension == 0:
+        return [1 << (SOBOL_BITS - 1 - k) for k in range(SOBOL_BITS)]
+    s, a, m = SOBOL_DIRECTIONS[dimension - 1]
+    v = [m[k] << (SOBOL_BITS - 1 - k) for k in range(min(s, SOBOL_BITS))]
+    for k in range(s, SOBOL_BITS):
+        d = v[k - s] ^ (v[k - s] >> s)
+        for j in range(1, s):
+            if (a >> (s - 1 - j)) & 1:
+                d ^= v[k - j]
+        v.append(d)
+    return v
+
+
+def sobol_points(n, dimensions, rng):
+    """Draw the first n points of a Sobol sequence of the unit hypercube, randomized by a random digital shift (so
+    different seeds give different, equally well spread, points).
+
+    Raises:
+        ValueError: If there are more dimensions than SOBOL_DIRECTIONS has direction numbers for, or n exceeds
+            2 ** SOBOL_BITS.
+
+    """
+    if dimensions > len(SOBOL_DIRECTIONS) + 1:
+        raise ValueError("Sobol sampling supports at most %d varying parameters (or linked/constrained groups), not %d"
+                         % (len(SOBOL_DIRECTIONS) + 1, dimensions))
+    if n > 1 << SOBOL_BITS:
+        raise ValueError("Sobol sampling supports at most %d points" % (1 << SOBOL_BITS))
+    directions = [sobol_directions(d) for d in range(dimensions)]
+    shifts = [rng.getrandbits(SOBOL_BITS) for _ in range(dimensions)]
+    scale = float(1 << SOBOL_BITS)
+    x = [0] * dimensions
+    points = []
+    for i in range(n):
+        if i > 0:
+            # Gray code order: flip the direction of the lowest zero bit of i - 1.
+            c = 0
+            while (i - 1) >> c & 1:
+                c += 1
+            for d in range(dimensions):
+                x[d] ^= directions[d][c]
+        points.append([(x[d] ^ shifts[d]) / scale for d in range(dimensions)])
+    return points
+
+
+# Point generators of each sampling method: f(n, dimensions, rng) -> n points of the unit hypercube.
+SAMPLERS = {"random": uniform_points, "lhs": latin_hypercube_points, "sobol": sobol_points}
+
+
+def sample(sweep, method, budget, seed=0):
+    """Draw a budget of distinct points from a sweep.
+
+    Each unit hypercube point is mapped to the sweep point whose block positions are its coordinates scaled to the
+    blocks' sizes. Points drawn more than once (likely when the budget is a large share of the sweep) are replaced by
+    uniform random points not drawn yet, so exactly min(budget, len(sweep)) points are drawn.
+
+    Args:
+        sweep (Sweep): Sweep to sample.
+        method (str): Sampling method, "random", "lhs" (Latin hypercube) or "sobol".
+        budget (int): Number of points to draw.
+        seed (int, optional): Random seed, so a sample can be redrawn exactly. Default = 0.
+
+    Returns:
+        SweepSample: The sampled points, in the order drawn.
+
+    Raises:
+        ValueError: If the method is unknown, or Sobol sampling is asked of too many dimensions (see sobol_points()).
+
+    """
+    if method not in SAMPLERS:
+        raise ValueError("unknown sampling method %s (choose from %s)" % (method, ", ".join(sorted(SAMPLERS))))
+    rng = random.Random(seed)
+    budget = max(0, min(budget, sweep.total))
+    if budget == sweep.total:
+        return SweepSample(sweep, [sweep.digits(i) for i in range(sweep.total)], method, seed)
+
+    # Blocks of a single value or combination are the same at every point, so are not sampled.
+    varying = [b for b, size in enumerate(sweep.sizes) if size > 1]
+    points = []
+    drawn = set()
+    if method != "random":
+        positions = [0] * len(sweep.sizes)
+        for point in SAMPLERS[method](budget, len(varying), rng):
+            for b, u in zip(varying, point):
+                positions[b] = min(int(u * sweep.sizes[b]), sweep.sizes[b] - 1)
+            digits = sweep.block_digits(positions)
+            if tuple(digits) not in drawn:
+                drawn.add(tuple(digits))
+                points.append(digits)
+    while len(points) < budget:
+        digits = sweep.digits(rng.randrange(sweep.total))
+        if tuple(digits) not in drawn:
+            drawn.add(tuple(digits))
+            points.append(digits)
+    return SweepSample(sweep, points, method, seed)
+
+
+class SweepSample(object):
+    """ Points drawn from a sweep (see sample()), generated like a sweep (see findr_sweep.generate()).
+
+    Sampled configs are numbered in the order drawn (output_1.cfg, output_1.fits, ...), rather than by their sweep
+    point.
+
+    Args:
+        sweep (Sweep): Sampled sweep.
+        points (list): Index of each parameter's value (see Sweep.digits()) of each sample.
+        method (str): Sampling method.
+        seed (int): Random seed.
+
+    """
+    def __init__(self, sweep, points, method, seed):
+        self.sweep = sweep
+        self.points = points
+        self.method = method
+        self.seed = seed
+        self.total = len(points)
+
+    def __repr__(self):
+        return '<SweepSample method=%s seed=%s total=%s of=%s>' % (self.method, self.seed, self.total,
+                                                                  self.sweep.total)
+
+    def __len__(self):
+        return self.total
+
+    def configs(self, start, stop):
+        """Get samples [start, stop) as a list of (config name, expected output, config text)."""
+        return [self.sweep.config(j, self.points[j]) for j in range(start, min(stop, self.total))]
+
+    def __iter__(self):
+        """Iterate over samples in order, as (config name, expected output, config text)."""
+        for start in range(0, self.total, GENERATE_CHUNK):
+            for config in self.configs(start, start + GENERATE_CHUNK):
+                yield config
@@ -0,0 +1,177 @@
+from findr_pack import PackWriter
+from findr_sweep import sweep_entries
+
+import json
+
+# Options findr_reduce sets per shard, so they are not passed through from the coordinator: {option: takes a value}.
+SHARD_OPTIONS = {"--shards": True, "--port": True, "--metrics": True, "--metrics-port": True, "-o": True,
+                 "--output": True, "--status": False}
+
+
+def shard_prefix(prefix, shard):
+    """Get the log prefix of a shard (e.g. "configs" -> "configs_shard0")."""
+    return "%s_shard%d" % (prefix, shard)
+
+
+def shard_list(prefix, shard):
+    """Get the config list of a shard (e.g. "configs" -> "configs_shard0.list")."""
+    return shard_prefix(prefix, shard) + ".list"
+
+
+def shard_metrics(prefix, shard):
+    """Get the metrics file of a shard (e.g. "configs" -> "configs_shard0_metrics.json")."""
+    return shard_prefix(prefix, shard) + "_metrics.json"
+
+
+def split_config_list(configList, prefix, shards):
+    """Split a config list across shards.
+
+    Deals config list lines to shard lists round-robin, in a single pass, so each shard gets an even share of every
+    part of the sweep (and so of its costs). Packed config stores and sweep specs are dealt into packed shard stores
+    (under the shard list names).
+
+    Args:
+        configList (str): Path to config list, packed config store or sweep spec.
+        prefix (str): Log prefix of the sharded run.
+        shards (int): Number of shards.
+
+    Returns:
+        list: Number of configs in each shard.
+
+    """
+    entries = sweep_entries(configList)
+    if entries is not None:
+        writers = [PackWriter(shard_list(prefix, k)) for k in range(shards)]
+        for n, (name, output, text) in enumerate(entries):
+            writers[n % shards].add(name, output, text)
+        return [w.close() for w in writers]
+
+    outs = [open(shard_list(prefix, k), 'w') for k in range(shards)]
+    counts = [0] * shards
+    n = 0
+    with open(configList, 'U') as cfgin:
+        for line in cfgin:
+            if len(line.split()) < 2:
+                continue
+            outs[n % shards].write(line if line.endswith("\n") else line + "\n")
+            counts[n % shards] += 1
+            n += 1
+    for o in outs:
+        o.close()
+    return counts
+
+
+def shard_arguments(argv, config):
+    """Get the command line arguments passed through to each shard.
+
+    Args:
+        argv (list): Coordinator command line arguments (without the program name).
+        config (str): Coordinator config list, removed from the arguments.
+
+    Returns:
+        list: Arguments without the config list and the options in SHARD_OPTIONS.
+
+    """
+    passed = []
+    skip = False
+    removed_config = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        name = arg.split("=", 1)[0]
+        if name in SHARD_OPTIONS:
+            skip = SHARD_OPTIONS[name] and "=" not in arg
+            continue
+        if arg == config and not removed_config:
+            removed_config = True
+            continue
+        passed.append(arg)
+    return passed
+
+
+def read_shard_metrics(prefix, shards):
+    """Read the latest metrics snapshot of each shard, or None for a shard that has not written one."""
+    snapshots = []
+    for k in range(shards):
+        try:
+            with open(shard_metrics(prefix, k), 'r') as m:
+                snapshots.append(json.load(m))
+        except (IOError, OSError, ValueError):
+            snapshots.append(None)
+    return snapshots
+
+
+def merge_metrics(snapshots):
+    """Merge shard metrics.
+
+    Counts, throughputs and bytes are summed, the mean wall time is weighted by returned tasks, and the p95 wall time
+    and ETA are the largest of any shard (the p95 is an upper bound, as shards only publish their quantiles).
+
+    Args:
+        snapshots (list): Shard metrics snapshots (see findr_metrics.Metrics.update()), None for missing shards.
+
+    Returns:
+        dict: Merged snapshot, in the same format, plus a "shards" list of per-shard task counts and ETAs.
+
+    """
+    merged = {"workers": {"connected": 0, "busy": 0, "idle": 0, "lost": 0},
+              "tasks": {"waiting": 0, "running": 0, "returned": 0, "done": 0, "failed": 0, "total": 0},
+              "completions_per_minute": 0.0, "bytes_transferred": 0, "wall_time": {"mean": None, "p95": None},
+              "eta_seconds": None, "elapsed": 0.0, "time": 0.0, "shards": []}
+    weighted = 0.0
+    weights = 0
+    for k, s in enumerate(snapshots):
+        if s is None:
+            merged["tasks"]["total"] = None
+            merged["shards"].append({"shard": k, "reporting": False})
+            continue
+        for group in ["workers", "tasks"]:
+            for key in merged[group]:
+                if merged[group][key] is None or s[group].get(key) is None:
+                    merged[group][key] = None
+                else:
+                    merged[group][key] += s[group][key]
+        merged["completions_per_minute"] += s["completions_per_minute"]
+        merged["bytes_transferred"] += s["bytes_transferred"]
+        if s["wall_time"]["mean"] is not None:
+            weighted += s["wall_time"]["mean"] * s["tasks"]["returned"]
+            weights += s["tasks"]["returned"]
+        if s["wall_time"]["p95"] is not None:
+            merged["wall_time"]["p95"] = max(s["wall_time"]["p95"], merged["wall_time"]["p95"] or 0)
+        if s["eta_seconds"] is not None:
+            merged["eta_seconds"] = max(s["eta_seconds"], merged["eta_seconds"] or 0)
+        merged["elapsed"] = max(merged["elapsed"], s["elapsed"])
+        merged["time"] = max(merged["time"], s["time"])
+        merged["shards"].append({"shard": k, "reporting": True, "done": s["tasks"]["done"],
+                                 "total": s["tasks"]["total"], "failed": s["tasks"]["failed"],
+                                 "running": s["tasks"]["running"], "eta_seconds": s["eta_seconds"]})
+    if weights > 0:
+        merged["wall_time"]["mean"] = weighted / weights
+    return merged
+
+
+class MergedMetrics(object):
+    """ Merged metrics of a sharded run, served by findr_metrics.MetricsServer like a findr_metrics.Metrics.
+
+    Args:
+        prefix (str): Log prefix of the sharded run.
+        shards (int): Number of shards.
+
+    """
+    def __init__(self, prefix, shards):
+        self.prefix = prefix
+        self.shards = shards
+        self._snapshot = {}
+
+    def __repr__(self):
+        return '<MergedMetrics %s shards=%s>' % (self.prefix, self.shards)
+
+    def update(self):
+        """Re-read and merge every shard's metrics. Returns the merged snapshot."""
+        self._snapshot = merge_metrics(read_shard_metrics(self.prefix, self.shards))
+        return self._snapshot
+
+    def snapshot(self):
+        """Get the latest merged snapshot (safe to call from other threads)."""
+        return self._snapshot
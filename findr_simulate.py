@@ -0,0 +1,524 @@
+#!/usr/bin/env python
+
+from collections import deque
+from findr_config import COST_KEYS, category_key, read_config
+from findr_executors import LocalStats, LocalTask
+from findr_reduce import build_parser, read_config_list, run_options, runFindr, write_message
+from findr_usage import BUNDLE_MARKER, configs_in_command, read_usage_log
+
+import argparse
+import heapq
+import math
+import os
+import random
+import shlex
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+# # # # USE INSTRUCTIONS  # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                             #
+# Discrete-event simulator for findr_reduce scheduling policies.              #
+# i.e. "python findr_simulate.py configs.list -u run1_usage.log -n 200        #
+#       -p '' -p '--bundle 4' -p '--retry-failed 2 --speculate 95'"           #
+#                                                                             #
+# Replays a config list through findr_reduce's own master (runFindr) on a     #
+# simulated pool of workers and a virtual clock: task durations and exit      #
+# codes are sampled from recorded usage logs, and workers join, are lost and  #
+# run at different speeds. Each policy (findr_reduce options) is reported by  #
+# makespan, worker utilization and task latency, in simulated time.           #
+# Quote each policy: its options are taken as a whole, dashes and all.        #
+#                                                                             #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# findr_reduce options a simulated policy cannot use.
+UNSUPPORTED_OPTIONS = ["-r", "--resume", "--store", "--shards", "--status", "--result-cache", "--metrics-port", "-o",
+                       "--output", "-e", "--executor"]
+
+# Shortest simulated sleep, in seconds.
+TICK = 1e-6
+
+
+class VirtualClock(object):
+    """ Simulated clock, standing in for the time module in the master's scheduling (see runFindr()).
+
+    Args:
+        start (float, optional): Start time, in seconds. Default = 0.0.
+
+    """
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __repr__(self):
+        return '<VirtualClock %.3f>' % self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # Time always moves on, as it would for a real sleep, even when float rounding would swallow a tiny one.
+        self.now += max(TICK, seconds)
+
+
+class DurationModel(object):
+    """ Task durations & exit codes sampled from usage logs.
+
+    Every task of a usage log contributes a (per-config wall time, exit code) sample, keyed by its resource category if
+    it was recorded with one. Samples are drawn from the config's category where it has been measured, otherwise from
+    every sample, so failures are replayed at their recorded rate.
+
+    Args:
+        seed (int -or- None, optional): Random seed. Default = None.
+
+    """
+    def __init__(self, seed=None):
+        self.samples = []
+        self.categories = {}
+        self.random = random.Random(seed)
+
+    def __repr__(self):
+        return '<DurationModel samples=%s categories=%s>' % (len(self.samples), len(self.categories))
+
+    def add(self, category, seconds, exit_status):
+        """Add a sample: a config's category (or None), wall time in seconds, and exit code."""
+        self.samples.append((seconds, exit_status))
+        if category is not None:
+            self.categories.setdefault(category, []).append((seconds, exit_status))
+
+    def add_usage_log(self, filename):
+        """Add every task in a usage log, with bundle wall times spread over their configs."""
+        for row in read_usage_log(filename):
+            try:
+                wall = float(row["WallTime"]) / 1000000.0
+                configs = configs_in_command(row["Command"])
+                category = row.get("Category", "-") if configs == 1 else "-"
+                if wall > 0:
+                    self.add(None if category in ("", "-") else category, wall / configs, int(row["ExitStatus"]))
+            except (KeyError, ValueError):
+                continue
+        return self
+
+    def sample(self, category=None):
+        """Sample a config's (wall time in seconds, exit code)."""
+        return self.random.choice(self.categories.get(category) or self.samples)
+
+
+class SimulatedWorker(object):
+    """ A simulated worker: one task at a time, at a relative speed (2.0 runs tasks in half their sampled time)."""
+    def __init__(self, index, speed):
+        self.index = index
+        self.speed = speed
+        self.task = None
+        self.connected = None
+
+    def __repr__(self):
+        return '<SimulatedWorker %s speed=%.2f>' % (self.index, self.speed)
+
+
+class SimulatedExecutor(object):
+    """ Executor simulating a pool of workers on a virtual clock.
+
+    Implements the queue interface used by runFindr (submit, wait, cancel, empty, stats, port, new_task, shutdown,
+    clock), so the real master schedules against it. Tasks run for the sampled wall times of the configs they carry
+    (see DurationModel), divided by their worker's speed, plus a fixed dispatch overhead. Workers join over an arrival
+    window and are lost at random (their running tasks return to the queue, as with WorkQueue), to be replaced after a
+    delay. On completion, a task's outputs are written as empty placeholders, so the master's checks and archiving run
+    as usual.
+
+    Args:
+        durations (DurationModel): Task duration model.
+        workers (int): Number of workers.
+        speed_spread (float, optional): Standard deviation of log worker speed. Default = 0.0 (all speed 1).
+        arrival (float, optional): Seconds over which workers join, uniformly at random. Default = 0.0 (all at once).
+        loss_rate (float, optional): Mean worker losses per worker-hour. Default = 0.0.
+        replace_delay (float, optional): Seconds before a lost worker is replaced. Default = 300.0.
+        overhead (float, optional): Seconds of dispatch & transfer overhead per task. Default = 0.5.
+        categories (dict -or- None, optional): {config basename: resource category} to sample durations by.
+            Default = None.
+        seed (int -or- None, optional): Random seed. Default = None.
+
+    """
+    name = "simulated"
+
+    def __init__(self, durations, workers, speed_spread=0.0, arrival=0.0, loss_rate=0.0, replace_delay=300.0,
+                 overhead=0.5, categories=None, seed=None):
+        self.clock = VirtualClock()
+        self.port = 0
+        self.monitoring = True
+        self.workers = workers
+        self.durations = durations
+        self.loss_rate = loss_rate
+        self.replace_delay = replace_delay
+        self.overhead = overhead
+        self.categories = categories or {}
+        self.stats = LocalStats(0)
+        self.latencies = []
+        self.busy_time = 0.0
+        self.connected_time = 0.0
+        self.random = random.Random(seed)
+
+        self._next_id = 1
+        self._events = []
+        self._count = 0
+        self._pending = deque()
+        self._running = {}
+        self._finished = deque()
+        self._idle = []
+        self._submitted = {}
+        self._samples = {}
+        self._accounted = 0.0
+        for i in range(workers):
+            worker = SimulatedWorker(i, math.exp(self.random.gauss(0.0, speed_spread)) if speed_spread > 0 else 1.0)
+            self._schedule(self.random.uniform(0.0, arrival) if arrival > 0 else 0.0, "join", worker)
+
+    def __repr__(self):
+        return '<SimulatedExecutor workers=%s time=%.1f>' % (self.workers, self.clock.now)
+
+    @staticmethod
+    def new_task(cmd):
+        return LocalTask(cmd)
+
+    def submit(self, task):
+        # Catch up on events (e.g. workers joining) while the master slept.
+        self._advance(self.clock.now)
+        task.id = self._next_id
+        self._next_id += 1
+        if task.priority > 0:
+            self._pending.appendleft(task)
+        else:
+            self._pending.append(task)
+        self._submitted[task.id] = self.clock.now
+        self.stats.tasks_waiting += 1
+        self._dispatch()
+        return task.id
+
+    def wait(self, timeout):
+        deadline = self.clock.now + timeout
+        while not self._finished:
+            if not self._pending and not self._running:
+                return None
+            if not self._events or self._events[0][0] > deadline:
+                self._advance(deadline)
+                return None
+            self._step()
+        return self._finished.popleft()
+
+    def cancel(self, taskid):
+        """Cancel a waiting or running task. Returns the task, or None if not found."""
+        self._advance(self.clock.now)
+        for task in self._pending:
+            if task.id == taskid:
+                self._pending.remove(task)
+                self.stats.tasks_waiting -= 1
+                return task
+        worker = self._running.pop(taskid, None)
+        if worker is None:
+            return None
+        task = worker.task
+        self._release(worker)
+        self._dispatch()
+        return task
+
+    def empty(self):
+        return not self._pending and not self._running and not self._finished
+
+    def shutdown(self):
+        self._account(self.clock.now)
+        return 1
+
+    def utilization(self):
+        """Fraction of connected worker time spent running tasks."""
+        return self.busy_time / self.connected_time if self.connected_time > 0 else 0.0
+
+    def _schedule(self, when, kind, payload):
+        heapq.heappush(self._events, (when, self._count, kind, payload))
+        self._count += 1
+
+    def _advance(self, until):
+        # Process every event due by 'until', then move the clock to it.
+        while self._events and self._events[0][0] <= until:
+            self._step()
+        self._account(until)
+        self.clock.now = max(self.clock.now, until)
+
+    def _account(self, now):
+        # Accumulate connected & busy worker time up to now.
+        elapsed = now - self._accounted
+        if elapsed > 0:
+            self.connected_time += elapsed * self.stats.total_workers_connected
+            self.busy_time += elapsed * self.stats.workers_busy
+            self._accounted = now
+
+    def _step(self):
+        when, count, kind, payload = heapq.heappop(self._events)
+        self._account(when)
+        self.clock.now = max(self.clock.now, when)
+        if kind == "join":
+            payload.connected = when
+            self.stats.total_workers_connected += 1
+            self.stats.workers_idle += 1
+            self._idle.append(payload)
+            if self.loss_rate > 0:
+                self._schedule(when + self.random.expovariate(self.loss_rate / 3600.0), "lose", payload)
+        elif kind == "lose":
+            self.stats.total_workers_connected -= 1
+            self.stats.total_workers_removed += 1
+            if payload.task is not None:
+                # The running task goes back to the queue, as WorkQueue resubmits tasks of lost workers.
+                task = payload.task
+                del self._running[task.id]
+                payload.task = None
+                self.stats.workers_busy -= 1
+                self.stats.tasks_running -= 1
+                self.stats.tasks_waiting += 1
+                self._pending.appendleft(task)
+            else:
+                self._idle.remove(payload)
+                self.stats.workers_idle -= 1
+            self._schedule(when + self.replace_delay, "join", SimulatedWorker(payload.index, payload.speed))
+        elif kind == "done":
+            worker, task = payload
+            if worker.task is task and self._running.get(task.id) is worker:
+                del self._running[task.id]
+                self._release(worker)
+                self._complete(task)
+                self._finished.append(task)
+        self._dispatch()
+
+    def _release(self, worker):
+        worker.task = None
+        self.stats.workers_busy -= 1
+        self.stats.workers_idle += 1
+        self.stats.tasks_running -= 1
+        self._idle.append(worker)
+
+    def _dispatch(self):
+        while self._pending and self._idle:
+            task = self._pending.popleft()
+            worker = self._idle.pop(0)
+            worker.task = task
+            self._running[task.id] = worker
+            self.stats.tasks_waiting -= 1
+            self.stats.tasks_running += 1
+            self.stats.workers_busy += 1
+            self.stats.workers_idle -= 1
+            self._samples[task.id], wall = self._run(task)
+            r = task.resources_measured
+            r.start = int(self.clock.now * 1000000)
+            r.wall_time = int((self.overhead + wall / worker.speed) * 1000000)
+            r.end = r.start + r.wall_time
+            r.cpu_time = r.wall_time
+            self._schedule(self.clock.now + r.wall_time / 1000000.0, "done", (worker, task))
+
+    def _run(self, task):
+        # Sample each config a task carries: [(output, exit code, wall time)] and the task's total wall time.
+        if BUNDLE_MARKER in task.command:
+            options, pairs = task.command.split(BUNDLE_MARKER, 1)
+            pairs = pairs.split()
+            options = options.split()
+            jobs = int(options[options.index("-j") + 1]) if "-j" in options else 1
+        else:
+            pairs = [task.command.rsplit(" -c ", 1)[1].strip(), None]
+            jobs = 1
+        results = []
+        slots = [0.0] * max(1, jobs)
+        for cfg, outf in zip(pairs[0::2], pairs[1::2]):
+            seconds, status = self.durations.sample(self.categories.get(os.path.basename(cfg)))
+            results.append((outf, status, seconds))
+            heapq.heappush(slots, heapq.heappop(slots) + seconds)
+        return results, max(slots)
+
+    def _complete(self, task):
+        # Write placeholder outputs (and any driver status file & archive), and record the task's result.
+        r = task.resources_measured
+        results = self._samples.pop(task.id)
+        single = BUNDLE_MARKER not in task.command or len(results) == 1
+        task.return_status = results[0][1] if single else 0
+        task.result = 0
+        r.exit_status = task.return_status
+        self.stats.tasks_complete += 1
+        self.stats.total_execute_time += r.wall_time
+        self.latencies.append(self.clock.now - self._submitted.pop(task.id))
+        for local, remote in task.output_files:
+            if remote.endswith(".status"):
+                with open(local, 'w') as s:
+                    for outf, status, seconds in results:
+                        s.write("%s\t%d\t%d\t-\t-\t-\n" % (outf, status, int(seconds * 1000000)))
+            elif remote.endswith(".tar"):
+                tar = tarfile.open(local, "w")
+                for outf, status, seconds in results:
+                    if status == 0:
+                        tar.addfile(tarfile.TarInfo(outf))
+                tar.close()
+            elif single and task.return_status == 0:
+                open(local, 'w').close()
+
+
+def percentile(values, q):
+    """Get the q percentile (0-100) of a list of values, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q / 100.0 * len(ordered))) - 1)]
+
+
+def config_categories(configList, keys=None):
+    """Get {config basename: resource category} of every config in a config list."""
+    return dict([(os.path.basename(cfg), category_key(read_config(cfg), keys)) for cfg, outf in
+                 read_config_list(configList)])
+
+
+def simulate(configList, policy, durations, workers, speed_spread=0.0, arrival=0.0, loss_rate=0.0,
+             replace_delay=300.0, overhead=0.5, categories=None, seed=None, keep=False):
+    """ Simulate a policy.
+
+    Runs findr_reduce's master (runFindr()) with a policy's options over a config list, against a SimulatedExecutor, in
+    a scratch directory.
+
+    Args:
+        configList (str): Path to config list.
+        policy (str): findr_reduce options (e.g. "--bundle 4 --retry-failed 2").
+        durations (DurationModel): Task duration model.
+        workers (int): Number of workers.
+        speed_spread (float, optional): Standard deviation of log worker speed. Default = 0.0.
+        arrival (float, optional): Seconds over which workers join. Default = 0.0.
+        loss_rate (float, optional): Mean worker losses per worker-hour. Default = 0.0.
+        replace_delay (float, optional): Seconds before a lost worker is replaced. Default = 300.0.
+        overhead (float, optional): Seconds of overhead per task. Default = 0.5.
+        categories (dict -or- None, optional): {config basename: resource category} (see config_categories()).
+            Default = None.
+        seed (int -or- None, optional): Random seed. Default = None.
+        keep (bool, optional): Keep the scratch directory (logs of the simulated run). Default = False.
+
+    Returns:
+        dict: Simulated makespan, utilization and task latencies (seconds of simulated time), tasks, failed configs,
+            and the CPU seconds the simulation took.
+
+    """
+    argv = shlex.split(policy)
+    unsupported = [a for a in argv if a.split("=", 1)[0] in UNSUPPORTED_OPTIONS]
+    if unsupported:
+        raise ValueError("option(s) %s cannot be simulated" % ", ".join(unsupported))
+    args = build_parser().parse_args(argv + [os.path.abspath(configList)])
+    if args.history is not None:
+        args.history = [os.path.abspath(h) for h in args.history]
+    if args.metrics is not None:
+        args.metrics = os.path.abspath(args.metrics)
+
+    # Replay the config list from a scratch directory, with absolute config paths.
+    scratch = tempfile.mkdtemp(prefix="findr_simulate.")
+    simulated = os.path.join(scratch, "configs.list")
+    with open(simulated, 'w') as s:
+        for cfg, outf in read_config_list(configList):
+            s.write("%s %s\n" % (os.path.abspath(cfg), outf))
+
+    queue = SimulatedExecutor(durations, workers, speed_spread, arrival, loss_rate, replace_delay, overhead,
+                              categories, seed)
+    cwd = os.getcwd()
+    cpu = time.clock()
+    try:
+        os.chdir(scratch)
+        options = run_options(args)
+        options["executor"] = queue.name
+        options["report_interval"] = max(args.report_interval, 3600.0)
+        with open("messages.log", 'w') as messages:
+            runFindr(configList=simulated, logPrefix="configs", logfile=messages, queue=queue, **options)
+        with open("configs_failed.log", 'r') as f:
+            failed = set([line.split("\t")[0] for line in f])
+        with open("configs_complete.log", 'r') as c:
+            failed -= set([line.split("\t")[0] for line in c])
+    finally:
+        os.chdir(cwd)
+        if keep:
+            write_message("i", "Simulated run of '%s' kept in %s." % (policy, scratch))
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return {"policy": policy, "makespan": queue.clock.now, "utilization": queue.utilization(),
+            "latency": {"p50": percentile(queue.latencies, 50), "p95": percentile(queue.latencies, 95),
+                        "p99": percentile(queue.latencies, 99), "max": percentile(queue.latencies, 100)},
+            "tasks": len(queue.latencies), "failed": len(failed), "cpu_seconds": time.clock() - cpu}
+
+
+def write_simulation_report(results, destination=None):
+    """Write a table of simulated policies (see simulate())."""
+    lines = ["%-40s %12s %6s %10s %10s %10s %8s %7s %7s" % ("Policy", "Makespan(s)", "Util", "p50(s)", "p95(s)",
+                                                             "p99(s)", "Tasks", "Failed", "CPU(s)")]
+    for r in results:
+        lines.append("%-40s %12.1f %5.1f%% %10.1f %10.1f %10.1f %8d %7d %7.1f"
+                     % ((r["policy"] or "(defaults)")[:40], r["makespan"], 100 * r["utilization"],
+                        r["latency"]["p50"] or 0, r["latency"]["p95"] or 0, r["latency"]["p99"] or 0, r["tasks"],
+                        r["failed"], r["cpu_seconds"]))
+    text = "\n".join(lines) + "\n"
+    if destination is None:
+        print(text)
+    else:
+        destination.write(text)
+    return 1
+
+
+def policy_argv(argv):
+    """Join each -p/--policy option to the value that follows it ("--policy=<value>"), so argparse takes a quoted
+    policy starting with a dash (e.g. -p "--bundle 4") as the policy rather than as an option of its own."""
+    joined = []
+    i = 0
+    while i < len(argv):
+        if argv[i] in ("-p", "--policy") and i + 1 < len(argv):
+            joined.append("--policy=" + argv[i + 1])
+            i += 2
+        else:
+            joined.append(argv[i])
+            i += 1
+    return joined
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # ... required argument(s).
+    parser.add_argument("config", type=str, help="Configuration/outputs list (e.g. configs.list).")
+    parser.add_argument("-u", "--usage", type=str, nargs="+", required=True,
+                        help="Usage logs of earlier runs (<prefix>_usage.log) to sample task durations from.")
+    # ... optional argument(s).
+    parser.add_argument("-p", "--policy", type=str, action="append", default=None,
+                        help="findr_reduce options of a policy to simulate, as one quoted string (e.g. -p '--bundle "
+                             "4'), repeatable (default '', the defaults).")
+    parser.add_argument("-n", "--workers", type=int, default=100, help="Number of simulated workers (default 100).")
+    parser.add_argument("--speed-spread", type=float, default=0.0,
+                        help="Standard deviation of log worker speed (default 0, identical workers).")
+    parser.add_argument("--arrival", type=float, default=0.0,
+                        help="Seconds over which workers join (default 0, all at the start).")
+    parser.add_argument("--loss-rate", type=float, default=0.0,
+                        help="Mean worker losses per worker-hour (default 0).")
+    parser.add_argument("--replace-delay", type=float, default=300.0,
+                        help="Seconds before a lost worker is replaced (default 300).")
+    parser.add_argument("--overhead", type=float, default=0.5,
+                        help="Seconds of dispatch & transfer overhead per task (default 0.5).")
+    parser.add_argument("--category-keys", type=str, nargs="+", default=None,
+                        help="Config parameters of the usage logs' categories (default %s)." % " ".join(COST_KEYS))
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, shared by every policy (default 0).")
+    parser.add_argument("--keep", action="store_true", help="Keep each simulated run's logs.")
+    args = parser.parse_args(policy_argv(sys.argv[1:]))
+
+    if not os.path.isfile(args.config):
+        write_message("e", "Config file does not exist.")
+        exit(1)
+    durations = DurationModel(args.seed)
+    for u in args.usage:
+        durations.add_usage_log(u)
+    if not durations.samples:
+        write_message("e", "No task durations found in usage log(s).")
+        exit(1)
+    categories = config_categories(args.config, args.category_keys) if durations.categories else None
+
+    results = []
+    for policy in args.policy or [""]:
+        write_message("i", "Simulating '%s'." % policy)
+        durations.random.seed(args.seed)
+        try:
+            results.append(simulate(args.config, policy, durations, args.workers, args.speed_spread, args.arrival,
+                                    args.loss_rate, args.replace_delay, args.overhead, categories, args.seed,
+                                    args.keep))
+        except ValueError as e:
+            write_message("e", "Policy '%s' could not be simulated: %s." % (policy, str(e)))
+    write_simulation_report(results)
@@ -0,0 +1,534 @@
+from findr_pack import PackWriter, PackedConfigs, is_pack
+
+import bisect
+import itertools
+import multiprocessing
+import operator
+import os
+import types
+
+# # # # SWEEP SPECS # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                             #
+# A sweep spec (see Config_Generator/example.cfg) fully determines a sweep:   #
+# every combination of its parameters' values, in itertools.product order     #
+# (the last parameter varying fastest). Sweep point i is decoded from i in    #
+# mixed radix over the value lists, so any config can be generated on demand  #
+# without generating the others.                                              #
+#                                                                             #
+# CONSTRAINT lines prune combinations before anything is generated. Each is   #
+# evaluated once per combination of only the parameters it names, keeping    #
+# the surviving combinations of each group of constrained parameters. Points #
+# are still numbered in itertools.product order, skipping pruned points, and  #
+# decoded by counting the valid completions of each parameter's values, so    #
+# pruned points are never generated, scheduled or counted.                    #
+#                                                                             #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# Bytes read from the start of a file when checking whether it is a sweep spec.
+SPEC_PROBE = 65536
+
+# Sweep points per contiguous range rendered at a time (and per unit of work of a parallel generation).
+GENERATE_CHUNK = 10000
+
+# Configs per subdirectory of a loose layout (e.g. configs/000/), 0 for a single flat directory.
+SHARD_SIZE = 1000
+
+
+def is_sweep(filename):
+    """Check whether a file is a sweep spec (has an OUTPUT_PARAMETER line near its start), rather than a config list."""
+    try:
+        with open(filename, 'U') as f:
+            head = f.read(SPEC_PROBE)
+    except (IOError, OSError):
+        return False
+    for line in head.splitlines():
+        parts = line.split("=", 1)
+        if len(parts) == 2 and parts[0].strip() == "OUTPUT_PARAMETER":
+            return True
+    return False
+
+
+def sweep_entries(filename):
+    """Get the configs of a generated sweep, a packed config store (see findr_pack) or a sweep spec, as an iterable of
+    (config name, expected output, config text), or None if filename is a config list."""
+    if is_pack(filename):
+        return pack_entries(filename)
+    if is_sweep(filename):
+        return read_sweep(filename)
+    return None
+
+
+def pack_entries(filename):
+    """Iterate over the configs of a packed config store, closing it once done."""
+    pack = PackedConfigs(filename)
+    try:
+        for entry in pack:
+            yield entry
+    finally:
+        pack.close()
+
+
+def count_entries(filename):
+    """Count the configs of a packed config store (from its index) or sweep spec, or None for a config list."""
+    if is_pack(filename):
+        pack = PackedConfigs(filename)
+        pack.close()
+        return pack.count
+    if is_sweep(filename):
+        return len(read_sweep(filename))
+    return None
+
+
+def read_sweep(specf):
+    """Read a sweep spec.
+
+    Lines are "parameter=<Python expression of the list of values>", evaluated as ConfigGenerator.py does (so specs
+    must be trusted). Lines prefixed with '|' are linked to the closest parameter above them that is not linked: they
+    take the value at the same position in their own list, rather than adding a dimension. OUTPUT_PARAMETER and
+    OUTPUT_EXTENSION name the config parameter holding each expected output, and its extension. CONSTRAINT lines (any
+    number of them) are Python expressions over parameter names, e.g. "CONSTRAINT=minRadius < maxRadius": points for
+    which any constraint is false are pruned from the sweep (see prune()).
+
+    Args:
+        specf (str): Path to sweep spec.
+
+    Returns:
+        Sweep: The sweep.
+
+    Raises:
+        ValueError: If a linked parameter has no parent, or a different number of values than its parent, or a
+            constraint cannot be evaluated.
+
+    """
+    parameters = []
+    values = []
+    linked = []
+    output_parameter = ''
+    output_extension = ''
+    constraints = []
+    with open(specf, 'U') as spec:
+        for line in spec:
+            line = line.strip()
+            if len(line) == 0 or line[0] == '#':
+                continue
+            if line[0] == '|':
+                name, expression = [p.strip() for p in line.lstrip('|').split("=", 1)]
+                if not parameters:
+                    raise ValueError("linked property %s has no parent" % name)
+                linked_values = eval(expression)
+                if len(linked_values) != len(values[-1]):
+                    raise ValueError("linked property %s has different number of elements than parent %s"
+                                     % (name, parameters[-1]))
+                linked[-1].append((name, linked_values))
+            else:
+                name, expression = [p.strip() for p in line.split("=", 1)]
+                if name == 'OUTPUT_PARAMETER':
+                    output_parameter = expression
+                elif name == 'OUTPUT_EXTENSION':
+                    output_extension = expression
+                elif name == 'CONSTRAINT':
+                    constraints.append(expression)
+                else:
+                    parameters.append(name)
+                    values.append(eval(expression))
+                    linked.append([])
+    return Sweep(parameters, values, linked, output_parameter, output_extension, constraints)
+
+
+def prune(parameters, values, linked, constraints):
+    """Evaluate a sweep's constraints, grouping the parameters they constrain into blocks.
+
+    Constraints naming parameters in common are grouped, and each group is evaluated in bulk over the product of the
+    values of only the parameters it names (a linked parameter names its parent's dimension), keeping the combinations
+    satisfying every constraint of the group. The sweep is then the product of the blocks' combinations, so the cost
+    depends on the size of each block rather than of the whole sweep. A name set more than once (e.g. a parameter and
+    a linked parameter of the same name) takes its last value, as in the generated config.
+
+    Args:
+        parameters (list): Parameter names.
+        values (list): List of values of each parameter.
+        linked (list): [(linked parameter name, values)] of each parameter.
+        constraints (list): Constraint expressions.
+
+    Returns:
+        tuple: Parameter indices of each block, ordered by their first parameter, and the combinations (tuples of value
+            indices, in order) of each block satisfying its constraints, or None for an unconstrained parameter.
+
+    Raises:
+        ValueError: If a constraint cannot be compiled or evaluated.
+
+    """
+    names = {}
+    for k, name in enumerate(parameters):
+        names[name] = (k, values[k])
+        for link, link_values in linked[k]:
+            names[link] = (k, link_values)
+
+    # Group constrained parameters sharing a constraint (union-find over parameter indices).
+    group = list(range(len(parameters)))
+
+    def root(k):
+        while group[k] != k:
+            group[k] = group[group[k]]
+            k = group[k]
+        return k
+
+    compiled = []
+    for expression in constraints:
+        try:
+            code = compile(expression, "<constraint>", "eval")
+        except SyntaxError as e:
+            raise ValueError("constraint %s: %s" % (expression, e))
+        used = sorted(code_names(code) & set(names))
+        dims = sorted(set(names[n][0] for n in used))
+        if not dims:
+            # Names no parameter, so it holds for every point or none.
+            if not evaluate(expression, code, dict(globals())):
+                return [list(range(len(parameters)))], [[]]
+            continue
+        for k in dims[1:]:
+            group[root(k)] = root(dims[0])
+        compiled.append((expression, code, used))
+
+    blocks = {}
+    for k in range(len(parameters)):
+        blocks.setdefault(root(k), []).append(k)
+    constrained = {}
+    for expression, code, used in compiled:
+        constrained.setdefault(root(names[used[0]][0]), []).append((expression, code, used))
+
+    order = sorted(blocks.values())
+    choices = []
+    for block in order:
+        block_constraints = constrained.get(root(block[0]))
+        if block_constraints is None:
+            choices.append(None)
+            continue
+        position = dict((k, p) for p, k in enumerate(block))
+        bindings = [(name, position[names[name][0]], names[name][1])
+                    for name in sorted(set(n for c in block_constraints for n in c[2]))]
+        namespace = dict(globals())
+        valid = []
+        for combination in itertools.product(*[range(len(values[k])) for k in block]):
+            for name, p, name_values in bindings:
+                namespace[name] = name_values[combination[p]]
+            for expression, code, used in block_constraints:
+                if not evaluate(expression, code, namespace):
+                    break
+            else:
+                valid.append(combination)
+        choices.append(valid)
+    return order, choices
+
+
+def code_names(code):
+    """Get the names a compiled constraint may refer to, including within its generator expressions, comprehensions
+    and lambdas."""
+    names = set(code.co_names) | set(code.co_freevars)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= set(const.co_varnames) | code_names(const)
+    return names
+
+
+def evaluate(expression, code, namespace):
+    """Evaluate a compiled constraint with parameter values bound in namespace (its globals, so nested scopes see them
+    too), raising ValueError if it fails."""
+    try:
+        return eval(code, namespace)
+    except Exception as e:
+        raise ValueError("constraint %s: %s" % (expression, e))
+
+
+class Sweep(object):
+    """ Cartesian sweep over a spec's parameters, pruned by its constraints.
+
+    Config lines are precomputed for every value of every parameter (with its linked parameters' lines), so generating
+    a config is a mixed-radix decode and a join. Contiguous ranges of points (see configs()) share the lines of all but
+    the last parameter across each run of the last parameter's values.
+
+    With constraints, sweep points are numbered from 0 to total - 1 over the points satisfying every constraint, in the
+    same (itertools.product) order. The valid combinations of each block of parameters grouped by constraints (see
+    prune()) are sorted, so the valid values of a parameter given those before it are found by bisection, and point i
+    is decoded by counting the valid completions of each value.
+
+    Args:
+        parameters (list): Parameter names.
+        values (list): List of values of each parameter.
+        linked (list): [(linked parameter name, values)] of each parameter.
+        output_parameter (str): Config parameter holding the expected output.
+        output_extension (str): Extension of expected outputs.
+        constraints (list -or- None, optional): Constraint expressions (see prune()). Default = None.
+
+    """
+    def __init__(self, parameters, values, linked, output_parameter, output_extension, constraints=None):
+        self.parameters = parameters
+        self.values = values
+        self.linked = linked
+        self.output_parameter = output_parameter
+        self.output_extension = output_extension
+        self.constraints = constraints or []
+        self.radices = [len(v) for v in values]
+        self.blocks, self.choices = prune(parameters, values, linked, self.constraints)
+        self.sizes = [self.radices[block[0]] if choices is None else len(choices)
+                      for block, choices in zip(self.blocks, self.choices)]
+        self.total = reduce(operator.mul, self.sizes, 1)
+        self.pruned = reduce(operator.mul, self.radices, 1) - self.total
+        # Block of each parameter, and its position in the block.
+        self.where = [None] * len(parameters)
+        for b, block in enumerate(self.blocks):
+            for m, k in enumerate(block):
+                self.where[k] = (b, m)
+        # Config lines of each value of each parameter: [parameter][value index].
+        self.lines = [["".join(["%s=%s\n" % (name, value)] +
+                               ["%s=%s\n" % (link, link_values[d]) for link, link_values in linked[k]])
+                       for d, value in enumerate(values[k])] for k, name in enumerate(parameters)]
+
+    def __repr__(self):
+        return '<Sweep parameters=%s total=%s pruned=%s>' % (len(self.parameters), self.total, self.pruned)
+
+    def __len__(self):
+        return self.total
+
+    def digits(self, i):
+        """Decode sweep point i into the index of each parameter's value (last parameter fastest)."""
+        if not 0 <= i < self.total:
+            raise IndexError("sweep point %s out of range" % i)
+        if not self.constraints:
+            digits = [0] * len(self.radices)
+            for k in range(len(self.radices) - 1, -1, -1):
+                i, digits[k] = divmod(i, self.radices[k])
+            return digits
+        # Choose each parameter's value in turn, skipping the valid points of the values before it.
+        fixed = [() for _ in self.blocks]
+        counts = [self.matching(b, ()) for b in range(len(self.blocks))]
+        digits = []
+        for k in range(len(self.radices)):
+            b = self.where[k][0]
+            rest = reduce(operator.mul, counts[:b] + counts[b + 1:], 1)
+            for d in range(self.radices[k]):
+                n = self.matching(b, fixed[b] + (d,)) * rest
+                if i < n:
+                    break
+                i -= n
+            digits.append(d)
+            fixed[b] += (d,)
+            counts[b] = self.matching(b, fixed[b])
+        return digits
+
+    def matching(self, b, prefix):
+        """Count the valid combinations of block b whose values of the block's first parameters are prefix."""
+        choices = self.choices[b]
+        if choices is None:
+            return 1 if prefix else self.sizes[b]
+        if not prefix:
+            return len(choices)
+        return bisect.bisect_left(choices, prefix[:-1] + (prefix[-1] + 1,)) - bisect.bisect_left(choices, prefix)
+
+    def advance(self, digits):
+        """Step digits (see digits()) to the next sweep point, in place. Returns False if there is none."""
+        for k in range(len(digits) - 1, -1, -1):
+            if self.next_value(digits, k, digits[k] + 1):
+                for j in range(k + 1, len(digits)):
+                    self.next_value(digits, j, 0)
+                return True
+        return False
+
+    def next_value(self, digits, k, first):
+        """Set parameter k of digits to its first value from first on of a valid point, given the values of the
+        parameters before it. Returns False if there is none."""
+        b, m = self.where[k]
+        choices = self.choices[b]
+        if choices is None:
+            if first < self.radices[k]:
+                digits[k] = first
+                return True
+            return False
+        prefix = tuple([digits[j] for j in self.blocks[b][:m]])
+        c = bisect.bisect_left(choices, prefix + (first,))
+        if c < len(choices) and choices[c][:m] == prefix:
+            digits[k] = choices[c][m]
+            return True
+        return False
+
+    def block_digits(self, positions):
+        """Get the index of each parameter's value from the index of each block's combination."""
+        digits = [0] * len(self.radices)
+        for b, p in enumerate(positions):
+            if self.choices[b] is None:
+                digits[self.blocks[b][0]] = p
+            else:
+                for k, d in zip(self.blocks[b], self.choices[b][p]):
+                    digits[k] = d
+        return digits
+
+    def point(self, i):
+        """Get the value of each parameter at sweep point i."""
+        return [self.values[k][d] for k, d in enumerate(self.digits(i))]
+
+    def output(self, i):
+        """Get the config name & expected output of sweep point i (e.g. output_1.cfg, output_1.fits for i = 0)."""
+        return "output_%d.cfg" % (i + 1), "output_%d%s" % (i + 1, self.output_extension)
+
+    def configs(self, start, stop):
+        """Get sweep points [start, stop) as a list of (config name, expected output, config text)."""
+        stop = min(stop, self.total)
+        if start >= stop:
+            return []
+        if not self.lines:
+            return [self.config(i) for i in range(start, stop)]
+        digits = self.digits(start)
+        configs = []
+        i = start
+        # Runs of the last parameter's values share a prefix only if it is unconstrained.
+        if self.choices[self.where[-1][0]] is not None:
+            while i < stop:
+                configs.append(self.config(i, digits))
+                i += 1
+                if i < stop:
+                    self.advance(digits)
+            return configs
+        lines = self.lines
+        last = lines[-1]
+        radix = self.radices[-1]
+        extension = self.output_extension
+        output_line = self.output_parameter + "="
+        while i < stop:
+            prefix = "".join([lines[k][d] for k, d in enumerate(digits[:-1])])
+            for d in range(digits[-1], min(radix, digits[-1] + stop - i)):
+                i += 1
+                output = "output_%d%s" % (i, extension)
+                configs.append(("output_%d.cfg" % i, output, prefix + last[d] + output_line + output + "\n"))
+            # Step to the next valid values of the other parameters once the last parameter's values are exhausted.
+            digits[-1] = radix - 1
+            if not self.advance(digits):
+                break
+        return configs
+
+    def config(self, i, digits=None):
+        """Get sweep point i as (config name, expected output, config text), from its digits if already decoded."""
+        name, output = self.output(i)
+        lines = self.lines
+        return name, output, "".join([lines[k][d] for k, d in enumerate(self.digits(i) if digits is None else digits)] +
+                                     ["%s=%s\n" % (self.output_parameter, output)])
+
+    def __iter__(self):
+        """Iterate over sweep points in order, as (config name, expected output, config text)."""
+        start = 0
+        while start < self.total:
+            for config in self.configs(start, start + GENERATE_CHUNK):
+                yield config
+            start += GENERATE_CHUNK
+
+
+def shard_directory(directory, i, total, shard_size=SHARD_SIZE):
+    """Get the subdirectory of a loose layout holding sweep point i (e.g. configs/000), or directory if not sharded."""
+    if shard_size <= 0:
+        return directory
+    width = max(3, len(str(max(0, total - 1) // shard_size)))
+    return os.path.join(directory, "%0*d" % (width, i // shard_size))
+
+
+# Sweep & settings of a generation, set in each worker process by init_generator().
+_generator = {}
+
+
+def init_generator(sweep, layout, directory, shard_size):
+    """Set the sweep & settings rendered by generate_range() in this process."""
+    _generator.update(sweep=sweep, layout=layout, directory=directory, shard_size=shard_size)
+
+
+def generate_range(bounds):
+    """Generate sweep points [start, stop) (see generate()).
+
+    Args:
+        bounds (tuple): (start, stop) sweep point indices.
+
+    Returns:
+        tuple: Number of configs and, for a packed layout, (entries, entry sizes) to append to the store, or for a loose
+            layout, (config list lines, None) once the configs are written.
+
+    """
+    sweep = _generator["sweep"]
+    configs = sweep.configs(*bounds)
+    if _generator["layout"] == "packed":
+        entries = ["%s %s\n%s" % c for c in configs]
+        return len(configs), "".join(entries), [len(e) for e in entries]
+    lines = []
+    made = set()
+    for i, (name, outf, text) in enumerate(configs, bounds[0]):
+        shard = shard_directory(_generator["directory"], i, sweep.total, _generator["shard_size"])
+        if shard not in made:
+            try:
+                os.makedirs(shard)
+            except OSError:
+                if not os.path.isdir(shard):
+                    raise
+            made.add(shard)
+        path = os.path.join(shard, name)
+        with open(path, 'w') as cfg:
+            cfg.write(text)
+        lines.append("%s %s\n" % (path, outf))
+    return len(configs), "".join(lines), None
+
+
+def generate(sweep, output, layout="packed", jobs=None, shard_size=SHARD_SIZE, chunk=GENERATE_CHUNK, progress=None):
+    """Generate every config of a sweep.
+
+    Splits the sweep into contiguous ranges of sweep points, rendered (and, for a loose layout, written) by a pool of
+    processes, and appends the results in order to the packed store or config list.
+
+    Args:
+        sweep (Sweep): Sweep to generate.
+        output (str): Output name: the packed store is <output>.pack, or a loose layout's configs are written under the
+            <output> directory and listed in <output>.list.
+        layout (str, optional): "packed" or "loose". Default = "packed".
+        jobs (int -or- None, optional): Processes generating configs. Default = None (all cores).
+        shard_size (int, optional): Configs per subdirectory of a loose layout (<output>/000/, <output>/001/, ...), or
+            0 to write every config to <output>. Default = SHARD_SIZE.
+        chunk (int, optional): Sweep points per unit of work. Default = GENERATE_CHUNK.
+        progress (callable -or- None, optional): Called with the number of configs generated so far after each unit of
+            work. Default = None.
+
+    Returns:
+        int: Number of configs generated.
+
+    """
+    if jobs is None or jobs < 1:
+        try:
+            jobs = multiprocessing.cpu_count()
+        except NotImplementedError:
+            jobs = 1
+    # Units of work of a loose layout cover whole subdirectories, so no two processes write to the same one.
+    if layout == "loose" and shard_size > 0:
+        chunk = max(1, chunk // shard_size) * shard_size
+    ranges = [(start, min(start + chunk, sweep.total)) for start in range(0, sweep.total, chunk)]
+
+    if layout == "packed":
+        writer = PackWriter(output + ".pack")
+    else:
+        writer = open(output + ".list", 'w')
+    pool = None
+    if jobs > 1 and len(ranges) > 1:
+        pool = multiprocessing.Pool(min(jobs, len(ranges)), init_generator, (sweep, layout, output, shard_size))
+        results = pool.imap(generate_range, ranges)
+    else:
+        init_generator(sweep, layout, output, shard_size)
+        results = (generate_range(bounds) for bounds in ranges)
+
+    done = 0
+    try:
+        for count, data, sizes in results:
+            if sizes is not None:
+                writer.add_block(data, sizes)
+            else:
+                writer.write(data)
+            done += count
+            if progress is not None:
+                progress(done)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        writer.close()
+    return done
@@ -0,0 +1,275 @@
+from findr_config import category_key, read_config
+
+import csv
+import math
+import os
+
+# Marker separating a bundle command's options from its config/output pairs (see findr_worker.py).
+BUNDLE_MARKER = " -- "
+
+# Wall time histogram bucket ratio: quantiles are exact to within this factor.
+BUCKET_RATIO = 1.05
+
+
+def read_usage_log(filename, speculative=False):
+    """Read a usage log.
+
+    Lazily reads a findr_reduce usage log (<prefix>_usage.log, see write_task_report()). Header lines (including those
+    repeated by resumed runs) are skipped. Columns missing from older logs (e.g. "Category") are absent from rows.
+    Speculative duplicates (see runFindr()) are skipped unless asked for, so they do not skew statistics.
+
+    Args:
+        filename (str): Usage log path.
+        speculative (bool, optional): Include speculative duplicate tasks. Default = False.
+
+    Yields:
+        dict: Usage values keyed by header name (e.g. "Command", "WallTime"), as strings.
+
+    """
+    with open(filename, 'U') as u:
+        header = None
+        for row in csv.reader(u, delimiter='\t'):
+            if len(row) == 0:
+                continue
+            if row[0] == "TaskID":
+                header = row
+                continue
+            if header is None:
+                continue
+            values = dict(zip(header, row))
+            if not speculative and values.get("Speculative") == "1":
+                continue
+            yield values
+
+
+def configs_in_command(command):
+    """Get the number of configs run by a task command: the pair count for a bundle, otherwise 1."""
+    if BUNDLE_MARKER in command:
+        return max(1, len(command.split(BUNDLE_MARKER, 1)[1].split()) // 2)
+    return 1
+
+
+def command_config(command):
+    """Get the config name of a single-config task command (klipReduce's -c config, or a worker-side driver's only
+    pair), or None for a bundle of several configs."""
+    if BUNDLE_MARKER in command:
+        pairs = command.split(BUNDLE_MARKER, 1)[1].split()
+        return pairs[0] if len(pairs) == 2 else None
+    parts = command.split()
+    return parts[parts.index("-c") + 1] if "-c" in parts[:-1] else None
+
+
+def row_category(row, directories=None, keys=None):
+    """Get the resource category of a usage log row.
+
+    Rows of runs with categories record theirs in the "Category" column. For other rows (that column missing or "-"),
+    the category is derived from the config the task ran (see findr_config.category_key()), found in the first of the
+    directories holding it, since the log only records its name.
+
+    Args:
+        row (dict): Usage log row (see read_usage_log()).
+        directories (list -or- None, optional): Directories to look for configs in, or None to only use the
+            "Category" column. Default = None.
+        keys (list -or- None, optional): Config keys the category is made of, or None for
+            findr_config.COST_KEYS. Default = None.
+
+    Returns:
+        str -or- None: Category, or None if unrecorded and the config is not found.
+
+    """
+    category = row.get("Category", "-")
+    if category not in ("", "-"):
+        return category
+    name = command_config(row.get("Command", ""))
+    if name is None:
+        return None
+    for d in directories or []:
+        cfgf = os.path.join(d, name)
+        if os.path.isfile(cfgf):
+            return category_key(read_config(cfgf), keys)
+    return None
+
+
+def read_wall_times(filename, directories=None, keys=None):
+    """Read the wall times of successful single-config tasks in a usage log.
+
+    Args:
+        filename (str): Usage log path.
+        directories (list -or- None, optional): Directories to look for the configs of uncategorized rows in (see
+            row_category()). Default = None.
+        keys (list -or- None, optional): Config keys categories are made of. Default = None (COST_KEYS).
+
+    Yields:
+        tuple: (resource category, or None if uncategorized, wall time in microseconds) for each task.
+
+    """
+    for row in read_usage_log(filename):
+        try:
+            if int(row["ExitStatus"]) != 0 or configs_in_command(row["Command"]) != 1:
+                continue
+            yield row_category(row, directories, keys), int(float(row["WallTime"]))
+        except (KeyError, ValueError):
+            continue
+
+
+class WallTimeStats(object):
+    """ Running per-config wall time statistics.
+
+    Accumulates measured wall times (microseconds, as recorded by WorkQueue) of tasks, divided over the configs each
+    task ran, so single-config tasks and bundles contribute alike.
+
+    """
+    def __init__(self):
+        self.configs = 0
+        self.wall_time = 0
+
+    def __repr__(self):
+        return '<WallTimeStats configs=%s mean=%ss>' % (self.configs, self.mean())
+
+    def add(self, wall_time, configs=1):
+        """Add a task's wall time (microseconds), spread over the number of configs it ran."""
+        if wall_time > 0 and configs > 0:
+            self.configs += configs
+            self.wall_time += wall_time
+
+    def add_usage_log(self, filename):
+        """Add every task in a usage log. Failed tasks are skipped."""
+        for row in read_usage_log(filename):
+            try:
+                if int(row["ExitStatus"]) != 0:
+                    continue
+                self.add(int(float(row["WallTime"])), configs_in_command(row["Command"]))
+            except (KeyError, ValueError):
+                continue
+        return self
+
+    def mean(self):
+        """Mean wall time per config in seconds, or None before any measurement."""
+        if self.configs == 0:
+            return None
+        return self.wall_time / 1000000.0 / self.configs
+
+
+class WallTimeHistogram(object):
+    """ Log-bucketed wall time histogram.
+
+    Accumulates wall times in constant time and memory bounded by the range of times seen, and answers quantile
+    queries exact to within BUCKET_RATIO.
+
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self._buckets = {}
+
+    def __repr__(self):
+        return '<WallTimeHistogram count=%s>' % self.count
+
+    def add(self, wall_time):
+        """Add a wall time in microseconds (ignored if unmeasured)."""
+        if wall_time > 0:
+            seconds = wall_time / 1000000.0
+            self.count += 1
+            self.total += seconds
+            b = int(math.floor(math.log(seconds) / math.log(BUCKET_RATIO)))
+            self._buckets[b] = self._buckets.get(b, 0) + 1
+
+    def mean(self):
+        """Mean wall time in seconds, or None before any measurement."""
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def quantile(self, q):
+        """Get the q quantile (0-1) of wall times in seconds, or None before any measurement."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for b in sorted(self._buckets):
+            seen += self._buckets[b]
+            if seen >= rank:
+                return BUCKET_RATIO ** (b + 1)
+        return BUCKET_RATIO ** (max(self._buckets) + 1)
+
+
+class CostModel(object):
+    """ Per-category task cost model.
+
+    Learns the mean wall time of tasks of each resource category (see findr_config.category_key()) from usage logs
+    (categorized as by row_category()), to predict the cost of new configs of a measured category.
+
+    """
+    def __init__(self):
+        self.categories = {}
+
+    def __repr__(self):
+        return '<CostModel categories=%s>' % len(self.categories)
+
+    def add(self, category, wall_time):
+        """Add a measured task: its category and wall time (microseconds)."""
+        if wall_time > 0:
+            c = self.categories.setdefault(category, [0, 0])
+            c[0] += 1
+            c[1] += wall_time
+
+    def add_usage_log(self, filename, directories=None, keys=None):
+        """Add every successful single-config task of a known category in a usage log (see row_category() for the
+        directories and keys)."""
+        for category, wall in read_wall_times(filename, directories, keys):
+            if category is not None:
+                self.add(category, wall)
+        return self
+
+    def predict(self, category):
+        """Predict the wall time of a category in seconds, or None for a category never measured."""
+        if category not in self.categories:
+            return None
+        count, wall_time = self.categories[category]
+        return wall_time / 1000000.0 / count
+
+
+class ResourceModel(object):
+    """ Per-category task resource model.
+
+    Learns the cores and memory used by tasks of each resource category (see findr_config.category_key()) from usage
+    logs, and predicts the resources to request for new tasks of a category: the most cores, and the most memory plus
+    a MEMORY_HEADROOM margin, of any successful task of that category.
+
+    """
+    MEMORY_HEADROOM = 0.1
+
+    def __init__(self):
+        self.categories = {}
+
+    def __repr__(self):
+        return '<ResourceModel categories=%s>' % len(self.categories)
+
+    def add(self, category, cores, memory):
+        """Add a measured task: its category, cores used and memory used (MB)."""
+        c = self.categories.setdefault(category, [0, 0, 0])
+        c[0] += 1
+        c[1] = max(c[1], cores)
+        c[2] = max(c[2], memory)
+
+    def add_usage_log(self, filename, directories=None, keys=None):
+        """Add every successful single-config task of a known category in a usage log (see row_category() for the
+        directories and keys)."""
+        for row in read_usage_log(filename):
+            try:
+                if int(row["ExitStatus"]) != 0 or configs_in_command(row["Command"]) != 1:
+                    continue
+                category = row_category(row, directories, keys)
+                if category is None:
+                    continue
+                self.add(category, float(row["Cores"]), float(row["VirtualMemory"]))
+            except (KeyError, ValueError):
+                continue
+        return self
+
+    def predict(self, category):
+        """Predict the resources of a category as (cores, memory in MB), or None for a category never measured."""
+        if category not in self.categories:
+            return None
+        count, cores, memory = self.categories[category]
+        return max(1, int(math.ceil(cores))), int(math.ceil(memory * (1 + self.MEMORY_HEADROOM)))
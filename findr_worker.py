@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+import argparse
+import hashlib
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+
+# # # # USE INSTRUCTIONS  # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                             #
+# Worker-side driver for Findr task bundles. Shipped to workers by            #
+# findr_reduce and run in the task sandbox; not normally run by hand.         #
+# i.e. "python findr_worker.py -k klipReduce -j 2 -a bundle.tar               #
+#       -s bundle.status -- a.cfg a.fits b.cfg b.fits"                        #
+#                                                                             #
+# Runs klipReduce for each config/output pair, then packs every output that   #
+# was produced into one (uncompressed) tar archive, and writes a status file  #
+# of "<output> <return code> <wall time (microseconds)> <checksum> <size>     #
+# <stored location>" lines (tab separated, "-" where not applicable).         #
+# Without '-a', outputs are left as they are.                                 #
+#                                                                             #
+# With '--validate', each output's FITS structure is checked before it is     #
+# returned: invalid outputs are removed, with return code VALIDATION_FAILED.  #
+#                                                                             #
+# With '--store DIR', outputs are published to a shared store directory       #
+# instead of being returned, so only the status file goes back to the master. #
+#                                                                             #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+
+# Return code of a config whose output failed validation.
+VALIDATION_FAILED = 65
+
+# FITS block size, and valid BITPIX values.
+FITS_BLOCK = 2880
+FITS_BITPIX = (8, 16, 32, 64, -32, -64)
+
+
+def read_fits_header(f):
+    """Read one FITS header from an open file, as {keyword: value string}, or None at end of file."""
+    cards = {}
+    first = True
+    while True:
+        block = f.read(FITS_BLOCK)
+        if len(block) == 0 and first:
+            return None
+        if len(block) != FITS_BLOCK:
+            raise ValueError("truncated header")
+        for i in range(0, FITS_BLOCK, 80):
+            card = block[i:i + 80].decode("ascii")
+            keyword = card[:8].strip()
+            if first and i == 0 and keyword not in ("SIMPLE", "XTENSION"):
+                raise ValueError("header does not start with SIMPLE or XTENSION")
+            if any(c < " " or c > "~" for c in card):
+                raise ValueError("non-ASCII header card")
+            if keyword == "END":
+                return cards
+            if card[8:10] == "= ":
+                cards[keyword] = card[10:].split("/", 1)[0].strip()
+        first = False
+
+
+def validate_fits(path):
+    """Validate a FITS file's structure.
+
+    Checks every HDU's header (80-character ASCII cards, ending with END), the mandatory SIMPLE/XTENSION, BITPIX and
+    NAXIS/NAXISn keywords, and that the file holds exactly the data they describe, padded to whole 2880 byte blocks.
+
+    Args:
+        path (str): FITS file path.
+
+    Returns:
+        str -or- None: Reason the file is invalid, or None if it is valid.
+
+    """
+    try:
+        size = os.path.getsize(path)
+        if size == 0 or size % FITS_BLOCK:
+            return "size %d is not a positive multiple of %d" % (size, FITS_BLOCK)
+        with open(path, 'rb') as f:
+            hdus = 0
+            while True:
+                cards = read_fits_header(f)
+                if cards is None:
+                    break
+                if hdus == 0 and cards.get("SIMPLE") != "T":
+                    return "SIMPLE is not T"
+                bitpix = int(cards["BITPIX"])
+                if bitpix not in FITS_BITPIX:
+                    return "invalid BITPIX %d" % bitpix
+                naxis = int(cards["NAXIS"])
+                if not 0 <= naxis <= 999:
+                    return "invalid NAXIS %d" % naxis
+                elements = 0
+                if naxis > 0:
+                    elements = 1
+                    for n in range(1, naxis + 1):
+                        length = int(cards["NAXIS%d" % n])
+                        if length < 0:
+                            return "negative NAXIS%d" % n
+                        elements *= length
+                gcount = int(cards.get("GCOUNT", "1"))
+                pcount = int(cards.get("PCOUNT", "0"))
+                data = abs(bitpix) // 8 * gcount * (pcount + elements)
+                padded = (data + FITS_BLOCK - 1) // FITS_BLOCK * FITS_BLOCK
+                if f.tell() + padded > size:
+                    return "HDU %d data truncated (%d of %d bytes)" % (hdus, size - f.tell(), padded)
+                f.seek(padded, os.SEEK_CUR)
+                hdus += 1
+    except KeyError as e:
+        return "missing mandatory keyword %s" % str(e)
+    except (IOError, OSError, ValueError, UnicodeDecodeError) as e:
+        return str(e)
+    return None
+
+
+def checksum(path):
+    """Get the SHA-1 hex digest of a file's content."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def store_output(outf, store):
+    """Publish an output to a store directory.
+
+    The output is moved (or copied and synced, across filesystems) to a temporary name in the store, then renamed into
+    place, so a partial output is never visible under its final name.
+
+    Args:
+        outf (str): Output path.
+        store (str): Store directory.
+
+    Returns:
+        str: Stored path.
+
+    """
+    dest = os.path.join(store, os.path.basename(outf))
+    tmp = os.path.join(store, ".%s.%s.%d" % (os.path.basename(outf), socket.gethostname(), os.getpid()))
+    try:
+        os.rename(outf, tmp)
+    except OSError:
+        with open(outf, 'rb') as src, open(tmp, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.remove(outf)
+    os.rename(tmp, dest)
+    return dest
+
+
+def run_config(klip, cfg, outf, results, index, validate=False, store=None):
+    """Run klipReduce on one config, recording (output, return code, wall time, checksum, size, stored location) in
+    results[index]."""
+    start = time.time()
+    try:
+        status = subprocess.call("%s -c %s" % (klip, cfg), shell=True)
+    except OSError:
+        status = -1
+    wall = int((time.time() - start) * 1000000)
+    digest = "-"
+    size = "-"
+    location = "-"
+    if status == 0 and os.path.exists(outf):
+        reason = validate_fits(outf) if validate else None
+        if reason is not None:
+            # Fail on the worker, so an invalid output is never transferred.
+            sys.stderr.write("%s failed validation: %s\n" % (outf, reason))
+            os.remove(outf)
+            status = VALIDATION_FAILED
+        else:
+            digest = checksum(outf)
+            size = str(os.path.getsize(outf))
+            if store is not None:
+                try:
+                    location = store_output(outf, store)
+                except (IOError, OSError) as e:
+                    sys.stderr.write("%s could not be stored: %s\n" % (outf, str(e)))
+                    status = -1
+    results[index] = (outf, status, wall, digest, size, location)
+
+
+def run_bundle(klip, pairs, jobs, archive, statusf, validate=False, store=None):
+    """Run a bundle of configs, 'jobs' at a time, then archive (if archive) or store (if store) outputs and write the
+    status file."""
+    results = [None] * len(pairs)
+    pending = list(enumerate(pairs))
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                index, (cfg, outf) = pending.pop(0)
+            run_config(klip, cfg, outf, results, index, validate, store)
+
+    threads = [threading.Thread(target=work) for _ in range(max(1, min(jobs, len(pairs))))]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    # Pack outputs, write status.
+    if archive is not None:
+        tar = tarfile.open(archive, "w")
+        for result in results:
+            if result[1] == 0 and os.path.exists(result[0]):
+                tar.add(result[0])
+        tar.close()
+    with open(statusf, "w") as s:
+        for result in results:
+            s.write("%s\t%d\t%d\t%s\t%s\t%s\n" % result)
+    # A single config's return code is the task's, so failures show as failed tasks.
+    if archive is None and len(results) == 1:
+        return results[0][1]
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-k", "--klip", type=str, default="klipReduce", help="klipReduce path.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Configs to run concurrently (default 1).")
+    parser.add_argument("-a", "--archive", type=str, default=None,
+                        help="Output archive of produced outputs (default none, outputs are left as they are).")
+    parser.add_argument("--validate", action="store_true", help="Validate outputs' FITS structure.")
+    parser.add_argument("--store", type=str, default=None, help="Store directory to publish outputs to.")
+    parser.add_argument("-s", "--status", type=str, required=True, help="Output status file.")
+    parser.add_argument("pairs", nargs="+", help="Alternating config and expected output names.")
+    args = parser.parse_args()
+
+    if len(args.pairs) % 2:
+        parser.error("configs and outputs must be given in pairs")
+    exit(run_bundle(args.klip, list(zip(args.pairs[0::2], args.pairs[1::2])), args.jobs, args.archive, args.status,
+                    args.validate, args.store))
@@ -0,0 +1,63 @@
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from findr_reduce import runShards, write_merged_report
+
+# Stub klipReduce: writes the config's outputFile.
+STUB_KLIP = """#!/bin/sh
+out=$(grep '^outputFile=' "$2" | cut -d= -f2)
+head -c 2880 /dev/zero > "$out"
+"""
+
+
+class MergedReportTest(unittest.TestCase):
+
+    def test_empty_snapshot(self):
+        log = StringIO()
+        self.assertEqual(write_merged_report({}, log), 1)
+        self.assertEqual(log.getvalue(), "")
+
+
+class RunShardsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.scratch = tempfile.mkdtemp(prefix="findr_test.")
+        os.chdir(self.scratch)
+        with open("klip", 'w') as k:
+            k.write(STUB_KLIP)
+        os.chmod("klip", os.stat("klip").st_mode | stat.S_IXUSR)
+        os.mkdir("configs")
+        with open("configs.list", 'w') as l:
+            for i in range(1, 7):
+                with open("configs/output_%d.cfg" % i, 'w') as cfg:
+                    cfg.write("Nmodes=%d\noutputFile=output_%d.fits\n" % (i, i))
+                l.write("configs/output_%d.cfg output_%d.fits\n" % (i, i))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def test_report_before_first_metrics(self):
+        # Reports are due before the first metrics update, so must not rely on one.
+        log = StringIO()
+        argv = ["configs.list", "-k", os.path.abspath("klip"), "-e", "local", "--shards", "2"]
+        failed = runShards("configs.list", "configs", 2, argv, port=0, logfile=log, report_interval=0.2,
+                           metrics_interval=10.0)
+        self.assertEqual(failed, 0)
+        self.assertIn("Sharded Status Report", log.getvalue())
+        self.assertIn("All shards complete!", log.getvalue())
+        for i in range(1, 7):
+            self.assertTrue(any(os.path.isfile("configs_shard%d_complete.log" % k) and
+                                "output_%d.fits" % i in open("configs_shard%d_complete.log" % k).read()
+                                for k in range(2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
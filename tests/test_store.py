@@ -0,0 +1,57 @@
+import glob
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+
+# Stub klipReduce: writes the config's outputFile.
+STUB_KLIP = """#!/bin/sh
+out=$(grep '^outputFile=' "$2" | cut -d= -f2)
+head -c 2880 /dev/zero > "$out"
+"""
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.scratch = tempfile.mkdtemp(prefix="findr_test.")
+        os.chdir(self.scratch)
+        with open("klip", 'w') as k:
+            k.write(STUB_KLIP)
+        os.chmod("klip", os.stat("klip").st_mode | stat.S_IXUSR)
+        os.mkdir("configs")
+        with open("configs.list", 'w') as l:
+            for i in range(1, 6):
+                with open("configs/output_%d.cfg" % i, 'w') as cfg:
+                    cfg.write("Nmodes=%d\noutputFile=output_%d.fits\n" % (i, i))
+                l.write("configs/output_%d.cfg output_%d.fits\n" % (i, i))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def test_stored_outputs_stay_in_store(self):
+        cmd = [sys.executable, os.path.join(ROOT, "findr_reduce.py"), "configs.list", "-k", os.path.abspath("klip"),
+               "-e", "local", "-w", "1", "--store", "store"]
+        self.assertEqual(subprocess.call(cmd, stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT), 0)
+        locations = [line.rstrip("\n").split("\t")[4] for line in open("configs_complete.log")]
+        self.assertEqual(len(locations), 5)
+        for location in locations:
+            self.assertTrue(os.path.isfile(location))
+        self.assertEqual(glob.glob("batch*"), [])
+
+        # A resumed run leaves them there too.
+        self.assertEqual(subprocess.call(cmd + ["-r"], stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT), 0)
+        for location in locations:
+            self.assertTrue(os.path.isfile(location))
+        self.assertEqual(glob.glob("batch*"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
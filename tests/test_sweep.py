@@ -0,0 +1,77 @@
+import itertools
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from findr_sample import sample
+from findr_sweep import Sweep
+
+
+def expected_configs(parameters, values, predicate):
+    """Render the configs of a sweep by filtering itertools.product, numbered in product order."""
+    configs = []
+    for point in itertools.product(*values):
+        if predicate(*point):
+            i = len(configs) + 1
+            configs.append(("output_%d.cfg" % i, "output_%d.fits" % i,
+                            "".join(["%s=%s\n" % (p, v) for p, v in zip(parameters, point)]) +
+                            "outputFile=output_%d.fits\n" % i))
+    return configs
+
+
+class ConstraintTest(unittest.TestCase):
+
+    def sweep(self, parameters, values, constraints):
+        return Sweep(parameters, values, [[] for _ in parameters], "outputFile", ".fits", constraints)
+
+    def test_product_order(self):
+        # A constraint joining non-adjacent parameters keeps the numbering of the filtered product.
+        parameters = ["a", "b", "c", "d"]
+        values = [range(5), range(3), ["x", "y"], range(7)]
+        sweep = self.sweep(parameters, values, ["a + d < 9"])
+        expected = expected_configs(parameters, values, lambda a, b, c, d: a + d < 9)
+        self.assertEqual(len(sweep), len(expected))
+        self.assertEqual(list(sweep), expected)
+        for start in range(0, len(expected), 7):
+            self.assertEqual(sweep.configs(start, start + 11), expected[start:start + 11])
+        self.assertEqual([sweep.config(i) for i in range(len(expected))], expected)
+
+    def test_product_order_constrained_last(self):
+        parameters = ["a", "b", "c"]
+        values = [range(4), range(6), range(5)]
+        sweep = self.sweep(parameters, values, ["a < c", "b % 2 == 0"])
+        expected = expected_configs(parameters, values, lambda a, b, c: a < c and b % 2 == 0)
+        self.assertEqual(list(sweep), expected)
+        self.assertEqual(sweep.configs(5, 13), expected[5:13])
+
+    def test_generator_expression(self):
+        parameters = ["Nmodes", "maxRadius", "minRadius"]
+        values = [[[1, 2], [3, 5], [8]], [2, 4, 6], [0, 1]]
+        sweep = self.sweep(parameters, values, ["all(n < maxRadius for n in Nmodes)"])
+        expected = expected_configs(parameters, values, lambda nm, mr, r: all(n < mr for n in nm))
+        self.assertEqual(list(sweep), expected)
+
+    def test_nested_names_group_parameters(self):
+        # Parameters only named within a lambda are still grouped by the constraint.
+        parameters = ["a", "b", "d"]
+        values = [range(4), range(2), range(4)]
+        sweep = self.sweep(parameters, values, ["(lambda: a < d)()"])
+        self.assertEqual(sweep.blocks, [[0, 2], [1]])
+        self.assertEqual(list(sweep), expected_configs(parameters, values, lambda a, b, d: a < d))
+
+    def test_sample_respects_constraints(self):
+        parameters = ["a", "b", "d"]
+        values = [range(6), range(3), range(6)]
+        sweep = self.sweep(parameters, values, ["a + d < 6"])
+        for method in ["random", "lhs", "sobol"]:
+            drawn = sample(sweep, method, 12, seed=1)
+            self.assertEqual(len(drawn), 12)
+            self.assertEqual(len(set([tuple(p) for p in drawn.points])), 12)
+            for name, output, text in drawn:
+                config = dict([line.split("=", 1) for line in text.splitlines()])
+                self.assertTrue(int(config["a"]) + int(config["d"]) < 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import signal
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir)
+sys.path.insert(0, ROOT)
+from findr_usage import CostModel, ResourceModel, read_usage_log, read_wall_times
+
+# Stub klipReduce: writes the config's outputFile after a short delay.
+STUB_KLIP = """#!/bin/sh
+sleep 0.2
+out=$(grep '^outputFile=' "$2" | cut -d= -f2)
+head -c 2880 /dev/zero > "$out"
+"""
+
+CONFIGS = 12
+
+
+class UsageLogResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.scratch = tempfile.mkdtemp(prefix="findr_test.")
+        os.chdir(self.scratch)
+        with open("klip", 'w') as k:
+            k.write(STUB_KLIP)
+        os.chmod("klip", os.stat("klip").st_mode | stat.S_IXUSR)
+        os.mkdir("configs")
+        with open("configs.list", 'w') as l:
+            for i in range(1, CONFIGS + 1):
+                with open("configs/output_%d.cfg" % i, 'w') as cfg:
+                    cfg.write("Nmodes=%d\noutputFile=output_%d.fits\n" % (i, i))
+                l.write("configs/output_%d.cfg output_%d.fits\n" % (i, i))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def run_findr(self, *extra):
+        cmd = [sys.executable, os.path.join(ROOT, "findr_reduce.py"), "configs.list", "-k", os.path.abspath("klip"),
+               "-e", "local", "-w", "1"] + list(extra)
+        return subprocess.Popen(cmd, stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT)
+
+    def test_killed_run_resumes_readable_log(self):
+        # Kill the first run once a few tasks are complete, then resume it to completion.
+        p = self.run_findr()
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if os.path.isfile("configs_complete.log") and len(open("configs_complete.log").readlines()) >= 3:
+                break
+            time.sleep(0.05)
+        os.kill(p.pid, signal.SIGKILL)
+        p.wait()
+        self.assertEqual(self.run_findr("-r").wait(), 0)
+
+        rows = list(read_usage_log("configs_usage.log"))
+        commands = set([r["Command"].split()[-1] for r in rows])
+        self.assertEqual(commands, set(["output_%d.cfg" % i for i in range(1, CONFIGS + 1)]))
+
+
+class CategoryFallbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp(prefix="findr_test.")
+        with open(os.path.join(self.scratch, "a.cfg"), 'w') as cfg:
+            cfg.write("Nmodes=5,10\nincludeRefNum=100\noutputFile=a.fits\n")
+        # A log written without categories: no Category column.
+        self.log = os.path.join(self.scratch, "old_usage.log")
+        with open(self.log, 'w') as log:
+            log.write("TaskID\tCommand\tStart\tEnd\tExitStatus\tWallTime\tCores\tVirtualMemory\n")
+            log.write("1\tklip -c a.cfg\t0\t1\t0\t1000000\t2\t300\n")
+            log.write("2\tklip -c missing.cfg\t0\t1\t0\t1000000\t4\t900\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def test_category_from_config(self):
+        model = ResourceModel().add_usage_log(self.log, [self.scratch])
+        self.assertEqual(model.predict("Nmodes=5,10;includeRefNum=100;maxRadius=-"), (2, 330))
+        self.assertEqual(len(model.categories), 1)
+        self.assertEqual(len(ResourceModel().add_usage_log(self.log).categories), 0)
+
+    def test_wall_times_from_config(self):
+        category = "Nmodes=5,10;includeRefNum=100;maxRadius=-"
+        self.assertEqual(list(read_wall_times(self.log, [self.scratch])), [(category, 1000000), (None, 1000000)])
+        self.assertEqual(CostModel().add_usage_log(self.log, [self.scratch]).predict(category), 1.0)
+        self.assertEqual(CostModel().add_usage_log(self.log, [self.scratch], ["Nmodes"]).predict("Nmodes=5,10"), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()